@@ -0,0 +1,694 @@
+# analytics.py
+#
+# Moteurs de calcul du tableau de bord (alertes, tendances, comptages).
+# Aucune dépendance à Streamlit : les fonctions prennent des DataFrames ou
+# le modèle encodé de l'export (data_loader.EncodedExport) et retournent des
+# DataFrames, utilisables sur de gros exports hors de l'app.
+
+import numpy as np
+import pandas as pd
+
+from data_loader import RESULT_VALUES, EncodedExport
+
+# Nom de l'antibiotique déduit du classeur pct*_analyse.xlsx
+# -> colonne correspondante dans l'export des isolats
+WORKBOOK_TO_EXPORT_COLUMN = {
+    "Gentamicin_analyse_2024": "Gentamycine",
+    "Vancomycin_analyse_2024": "Téicoplanine",
+    "Teicoplanin_analyse_2024": "Téicoplanine",
+    "Linezolid_analyse": "Linezolide",
+    "Daptomycin_analyse": "Daptomycine",
+    "Clindamycin_analyse": "Clindamycine",
+    "Oxacillin_analyse_2024": "Oxacilline",
+    "Sxt_analyse": "Cotrimoxazole",
+    "Dalbavancin_analyse": "Dalbavancine"
+}
+
+ALERT_COLUMNS = ["Semaine", "Service", "Antibiotique", "Nb_R", "Alarme"]
+
+
+# --------------------------------------------------
+# 1) Semaines aberrantes issues des classeurs d'analyse
+# --------------------------------------------------
+def outlier_weeks_from_series(series: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construit la table (Antibiotique, Semaine) des semaines marquées OUTLIER
+    dans la table longue des classeurs d'analyse (voir
+    data_loader.load_workbook_series). 'Antibiotique' est le nom de la
+    colonne correspondante dans l'export.
+    """
+    outliers = series[(series["Famille"] == "antibiotique") & (series["OUTLIER"] == True)]
+    outliers = outliers.drop_duplicates(subset=["Indicateur", "Week"])
+    return pd.DataFrame({
+        "Antibiotique": outliers["Indicateur"].map(lambda abx: WORKBOOK_TO_EXPORT_COLUMN.get(abx, abx)),
+        "Semaine": outliers["Week"].astype(int),
+    }).reset_index(drop=True)
+
+
+# --------------------------------------------------
+# 2) Moteur d'alertes croisées semaine / service / antibiotique
+# --------------------------------------------------
+def resistance_counts(export: EncodedExport, outlier_weeks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nombre de résultats 'R' par (semaine, uf, antibiotique), limité aux
+    semaines aberrantes de chaque antibiotique (table Antibiotique, Semaine).
+    Chaque semaine aberrante est une tranche du modèle trié (voir
+    EncodedExport.week_slice) : seuls ses isolats sont lus, et leurs R sont
+    comptés par service en une passe de np.unique.
+    Retourne les colonnes Semaine, Service, Antibiotique, Nb_R ; dans une
+    semaine, les services suivent l'ordre de leur premier isolat R dans l'export.
+    """
+    export = export.sorted_by_week_service()
+    uf_labels = np.array(export.uf_labels, dtype=object)
+    semaines, services, antibiotiques, nb_r = [], [], [], []
+    for abx, weeks in outlier_weeks.groupby("Antibiotique", sort=False)["Semaine"]:
+        if abx not in export.result_columns:
+            continue
+        j = export.column(abx)
+        for week in np.unique(weeks.to_numpy()):
+            rows = export.week_slice(int(week), int(week))
+            resistant = export.r_slice(rows)[j] & (export.uf_codes[rows] >= 0)
+            # tranche triée par service, rangs croissants dans chaque service :
+            # le premier isolat R d'un service est sa première occurrence
+            found, first, counts = np.unique(export.uf_codes[rows][resistant], return_index=True,
+                                             return_counts=True)
+            order = np.argsort(export.rows[rows][resistant][first], kind="stable")
+            semaines.append(np.full(len(found), week, dtype=int))
+            services.append(uf_labels[found[order]])
+            antibiotiques.append(np.full(len(found), abx, dtype=object))
+            nb_r.append(counts[order].astype(int))
+    if not semaines:
+        return pd.DataFrame({
+            "Semaine": pd.Series(dtype=int), "Service": pd.Series(dtype=object),
+            "Antibiotique": pd.Series(dtype=object), "Nb_R": pd.Series(dtype=int),
+        })
+    return pd.DataFrame({
+        "Semaine": np.concatenate(semaines),
+        "Service": np.concatenate(services),
+        "Antibiotique": np.concatenate(antibiotiques),
+        "Nb_R": np.concatenate(nb_r),
+    })
+
+
+def compute_alertes(export: EncodedExport, outlier_weeks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Croise les semaines aberrantes (table Antibiotique, Semaine) avec les
+    résultats R de l'export encodé : une ligne par (semaine, service, antibiotique)
+    ayant au moins un R pendant une semaine aberrante de cet antibiotique.
+    Retourne les colonnes Semaine, Service, Antibiotique, Nb_R, Alarme, dans
+    l'ordre de la table des semaines aberrantes (antibiotiques, puis semaines)
+    et, dans une semaine, dans l'ordre d'apparition des services dans l'export.
+    """
+    if outlier_weeks.empty:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    weeks = outlier_weeks[["Antibiotique", "Semaine"]].copy()
+    weeks["Semaine"] = weeks["Semaine"].astype(int)
+    weeks = weeks.drop_duplicates()
+    weeks["_ordre"] = pd.factorize(weeks["Antibiotique"])[0]
+    weeks["_semaine"] = np.arange(len(weeks))
+
+    counts = resistance_counts(export, weeks)
+    counts["_service"] = np.arange(len(counts))
+    alertes = weeks.merge(counts, on=["Antibiotique", "Semaine"], how="inner")
+    if alertes.empty:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    alertes = alertes.sort_values(["_ordre", "_semaine", "_service"], kind="stable")
+    alertes["Alarme"] = (
+        "Semaine " + alertes["Semaine"].astype(str)
+        + " : Alerte pour " + alertes["Antibiotique"].astype(str)
+        + " dans le service " + alertes["Service"].astype(str)
+    )
+    return alertes[ALERT_COLUMNS].reset_index(drop=True)
+
+
+def alert_rows(export: EncodedExport, week: int, service: str, antibiotique: str) -> np.ndarray:
+    """
+    Rangs dans le magasin (voir data_loader.load_export_rows) des isolats
+    derrière une ligne d'alerte : R à l'antibiotique, dans le service,
+    pendant la semaine. La tranche (semaine, service) est retrouvée par
+    recherche dichotomique.
+    """
+    export = export.sorted_by_week_service()
+    rows = export.week_service_slice(week, service)
+    resistant = export.r_slice(rows)[export.column(antibiotique)]
+    return export.rows[rows][resistant]
+
+
+# --------------------------------------------------
+# 3) Phénotypes déduits de l'export
+#    Classement exclusif : chaque règle (phénotype, colonnes) marque les
+#    isolats R à l'une de ses colonnes, la dernière règle étant prioritaire ;
+#    les autres isolats sont Wild (aucun R) ou Other. Règles par défaut
+#    (Staphylococcus aureus) : VRSA (Vancomycine R) > MRSA (Oxacilline R).
+#    Les règles des autres organismes viennent de organisms.json.
+# --------------------------------------------------
+PHENOTYPE_RULES = [
+    ("MRSA", ["Oxacilline"]),
+    ("VRSA", ["Vancomycine"]),
+]
+
+
+def derive_phenotypes(export: EncodedExport,
+                      rules: list[tuple[str, list[str]]] | None = None) -> pd.Categorical:
+    """
+    Phénotype de chaque isolat. Si l'export contient déjà une colonne
+    phénotype, elle est utilisée telle quelle ; sinon le phénotype est déduit
+    des masques R compactés selon rules (défaut : PHENOTYPE_RULES).
+    """
+    if export.phenotypes is not None:
+        return pd.Categorical.from_codes(export.phenotypes, categories=export.phenotype_labels)
+
+    rules = PHENOTYPE_RULES if rules is None else rules
+    labels = [name for name, _ in rules] + ["Wild", "Other"]
+    any_r = np.bitwise_or.reduce(export.r_bits, axis=0)
+    codes = np.where(export.unpack(any_r), labels.index("Other"), labels.index("Wild"))
+    for i, (_, columns) in enumerate(rules):  # dans l'ordre : la dernière règle l'emporte
+        bits = [export.r_bits[export.column(col)] for col in columns if col in export.result_columns]
+        if bits:
+            codes[export.unpack(np.bitwise_or.reduce(bits, axis=0))] = i
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+# --------------------------------------------------
+# 4) Moteur de tendances hebdomadaires
+#    Toutes les séries (semaines x indicateurs) sont tenues dans des
+#    tableaux NumPy 2-D. Les sommes cumulées sont calculées une fois par
+#    version des données ; changer la fenêtre de la moyenne mobile ou le
+#    niveau de confiance ne coûte ensuite que O(semaines x indicateurs).
+# --------------------------------------------------
+def _cumsum0(values: np.ndarray) -> np.ndarray:
+    """Somme cumulée le long des semaines, précédée d'une ligne de zéros."""
+    out = np.zeros((values.shape[0] + 1,) + values.shape[1:], dtype=np.float64)
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+class TrendEngine:
+    """
+    Séries hebdomadaires de pourcentages pour plusieurs indicateurs à la fois.
+
+    weeks      : semaines (triées), longueur W
+    numerators : effectifs « positifs » (ex. nombre de R), tableau W x A
+    totals     : effectifs de référence (ex. nombre de testés), W x A
+    labels     : noms des A indicateurs
+    """
+
+    def __init__(self, weeks, numerators, totals, labels):
+        self.weeks = np.asarray(weeks)
+        self.numerators = np.asarray(numerators, dtype=np.int64)
+        self.totals = np.asarray(totals, dtype=np.int64)
+        self.labels = list(labels)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(self.totals > 0, 100.0 * self.numerators / self.totals, np.nan)
+        self.percentages = pct
+        valid = ~np.isnan(pct)
+        filled = np.where(valid, pct, 0.0)
+        self._cs_count = _cumsum0(valid.astype(np.float64))
+        self._cs_sum = _cumsum0(filled)
+        self._cs_sq = _cumsum0(filled * filled)
+
+    # -- calcul ------------------------------------------------------------
+    def compute(self, window: int = 8, level: float = 0.95) -> dict[str, np.ndarray]:
+        """
+        Moyenne mobile (fenêtre glissante de `window` semaines, semaine
+        courante incluse), écart type, bornes de l'intervalle au niveau `level`
+        et drapeau OUTLIER (pourcentage > borne supérieure), pour toutes les
+        séries à la fois. Chaque tableau retourné est W x A.
+        """
+        from statistics import NormalDist
+
+        window = max(int(window), 1)
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        end = np.arange(1, len(self.weeks) + 1)
+        start = np.maximum(end - window, 0)
+
+        count = self._cs_count[end] - self._cs_count[start]
+        total = self._cs_sum[end] - self._cs_sum[start]
+        total_sq = self._cs_sq[end] - self._cs_sq[start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+            var = np.where(count > 1, (total_sq - count * mean * mean) / (count - 1), np.nan)
+        std = np.sqrt(np.clip(var, 0.0, None))
+        ic_sup = mean + z * std
+        ic_inf = mean - z * std
+        with np.errstate(invalid="ignore"):
+            outlier = self.percentages > ic_sup
+        return {
+            "Pourcentage": self.percentages,
+            "Moyenne_mobile_8s": mean,
+            "Ecart_type_8s": std,
+            "IC_sup": ic_sup,
+            "IC_inf": ic_inf,
+            "OUTLIER": outlier,
+        }
+
+    def frame(self, label: str, window: int = 8, level: float = 0.95) -> pd.DataFrame:
+        """
+        Série d'un indicateur au format des classeurs d'analyse :
+        Week, <label> (effectif), Total, Pourcentage, Moyenne_mobile_8s,
+        Ecart_type_8s, IC_sup, IC_inf, OUTLIER.
+        """
+        j = self.labels.index(label)
+        stats = self.compute(window, level)
+        df = pd.DataFrame({"Week": self.weeks, label: self.numerators[:, j], "Total": self.totals[:, j]})
+        for name, values in stats.items():
+            df[name] = values[:, j]
+        df[["Pourcentage", "Moyenne_mobile_8s", "Ecart_type_8s", "IC_sup", "IC_inf"]] = (
+            df[["Pourcentage", "Moyenne_mobile_8s", "Ecart_type_8s", "IC_sup", "IC_inf"]].round(2)
+        )
+        return df
+
+    def outlier_weeks(self, window: int = 8, level: float = 0.95) -> pd.DataFrame:
+        """Table (Antibiotique, Semaine) des semaines aberrantes, pour compute_alertes."""
+        flags = self.compute(window, level)["OUTLIER"]
+        a_idx, w_idx = np.nonzero(flags.T)  # trié par indicateur puis par semaine
+        return pd.DataFrame({
+            "Antibiotique": [self.labels[a] for a in a_idx],
+            "Semaine": self.weeks[w_idx].astype(int),
+        })
+
+
+# --------------------------------------------------
+# 5) Cube de comptages avec sommes préfixes sur les semaines
+#    Construit une fois par version des données ; le comptage sur une
+#    plage de semaines quelconque se fait par soustraction de deux lignes
+#    préfixes, en O(nombre de catégories).
+# --------------------------------------------------
+class CountCube:
+    """
+    Comptages indexés par semaine puis par une ou plusieurs dimensions
+    catégorielles (ex. antibiotique x résultat, ou phénotype).
+
+    weeks  : semaines triées, longueur W
+    axes   : pour chaque dimension, la liste de ses libellés
+    counts : tableau W x len(axes[0]) x len(axes[1]) ...
+    """
+
+    def __init__(self, weeks, axes: list[list[str]], counts: np.ndarray):
+        self.weeks = np.asarray(weeks)
+        self.axes = [list(labels) for labels in axes]
+        self.prefix = _cumsum0(np.asarray(counts)).astype(np.int64)
+
+    def range_counts(self, week_min: int, week_max: int) -> np.ndarray:
+        """Comptages cumulés des semaines week_min à week_max incluses."""
+        lo = np.searchsorted(self.weeks, week_min, side="left")
+        hi = np.searchsorted(self.weeks, week_max, side="right")
+        if hi <= lo:
+            return np.zeros_like(self.prefix[0])
+        return self.prefix[hi] - self.prefix[lo]
+
+    def value_counts(self, week_min: int, week_max: int, *selection: str) -> pd.Series:
+        """
+        Équivalent de value_counts() sur la dernière dimension pour une plage
+        de semaines ; les dimensions précédentes sont fixées par `selection`
+        (ex. cube.value_counts(10, 20, "Oxacilline")). Les catégories vides
+        sont omises et le résultat est trié par effectif décroissant.
+        """
+        counts = self.range_counts(week_min, week_max)
+        for axis, label in enumerate(selection):
+            counts = counts[self.axes[axis].index(label)]
+        series = pd.Series(counts, index=self.axes[len(selection)])
+        return series[series > 0].sort_values(ascending=False, kind="stable")
+
+
+# --------------------------------------------------
+# 6) État agrégé hebdomadaire (persisté par ingest.py)
+#    Comptages par semaine des résultats de chaque antibiotique et des
+#    phénotypes. Les moteurs de tendances et les cubes se construisent
+#    directement à partir de cet état, sans relire les isolats ; un lot
+#    ajouté ne met à jour que les semaines qu'il touche.
+# --------------------------------------------------
+def weekly_state(export: EncodedExport,
+                 phenotype_rules: list[tuple[str, list[str]]] | None = None) -> dict[str, np.ndarray]:
+    """
+    Calcule l'état agrégé d'un ensemble d'isolats encodés :
+    weeks (W), results (W x antibiotiques x RESULT_VALUES), phenotypes
+    (W x phénotypes, voir derive_phenotypes), et les libellés
+    result_columns / result_values / phenotype_labels.
+    """
+    valid = export.weeks >= 0
+    weeks, week_codes = np.unique(export.weeks[valid], return_inverse=True)
+    n_weeks, n_values = len(weeks), len(RESULT_VALUES)
+
+    results = np.zeros((n_weeks, len(export.result_columns), n_values), dtype=np.int64)
+    codes = export.codes[valid]
+    for j in range(len(export.result_columns)):
+        col = codes[:, j]
+        tested = col > 0
+        flat = week_codes[tested] * n_values + col[tested].astype(np.int64) - 1
+        results[:, j, :] = np.bincount(flat, minlength=n_weeks * n_values).reshape(n_weeks, n_values)
+
+    pheno = derive_phenotypes(export, phenotype_rules)
+    pheno_codes = np.asarray(pheno.codes)[valid]
+    n_pheno = len(pheno.categories)
+    known = pheno_codes >= 0
+    phenotypes = np.bincount(
+        week_codes[known] * n_pheno + pheno_codes[known], minlength=n_weeks * n_pheno
+    ).reshape(n_weeks, n_pheno)
+    return {
+        "weeks": weeks.astype(np.int64),
+        "results": results,
+        "phenotypes": phenotypes.astype(np.int64),
+        "result_columns": np.array(export.result_columns, dtype=str),
+        "result_values": np.array(RESULT_VALUES, dtype=str),
+        "phenotype_labels": np.array(list(pheno.categories), dtype=str),
+    }
+
+
+def merge_weekly_state(state: dict[str, np.ndarray], batch: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Ajoute l'état d'un lot à l'état existant. Seules les lignes des semaines
+    du lot changent ; les nouvelles semaines et phénotypes sont insérés.
+    """
+    if list(state["result_columns"]) != list(batch["result_columns"]):
+        raise ValueError("Les colonnes de résultats du lot diffèrent de celles du magasin.")
+
+    weeks = np.union1d(state["weeks"], batch["weeks"])
+    labels = list(state["phenotype_labels"]) + [
+        p for p in batch["phenotype_labels"] if p not in list(state["phenotype_labels"])
+    ]
+    merged = dict(state, weeks=weeks, phenotype_labels=np.array(labels, dtype=str))
+
+    results = np.zeros((len(weeks),) + state["results"].shape[1:], dtype=np.int64)
+    results[np.searchsorted(weeks, state["weeks"])] = state["results"]
+    results[np.searchsorted(weeks, batch["weeks"])] += batch["results"]
+    merged["results"] = results
+
+    phenotypes = np.zeros((len(weeks), len(labels)), dtype=np.int64)
+    old_cols = [labels.index(p) for p in state["phenotype_labels"]]
+    new_cols = [labels.index(p) for p in batch["phenotype_labels"]]
+    phenotypes[np.ix_(np.searchsorted(weeks, state["weeks"]), old_cols)] = state["phenotypes"]
+    phenotypes[np.ix_(np.searchsorted(weeks, batch["weeks"]), new_cols)] += batch["phenotypes"]
+    merged["phenotypes"] = phenotypes
+    return merged
+
+
+def engines_from_state(state: dict[str, np.ndarray]) -> tuple[TrendEngine, TrendEngine]:
+    """Moteurs de tendances (antibiotiques, phénotypes) construits depuis l'état agrégé."""
+    results = state["results"]
+    r_index = list(state["result_values"]).index("R")
+    abx_engine = TrendEngine(state["weeks"], results[:, :, r_index], results.sum(axis=2),
+                             list(state["result_columns"]))
+    phenotypes = state["phenotypes"]
+    totals = np.repeat(phenotypes.sum(axis=1, keepdims=True), phenotypes.shape[1], axis=1)
+    pheno_engine = TrendEngine(state["weeks"], phenotypes, totals, list(state["phenotype_labels"]))
+    return abx_engine, pheno_engine
+
+
+def cubes_from_state(state: dict[str, np.ndarray]) -> tuple[CountCube, CountCube]:
+    """Cubes de comptages (antibiotique x résultat, phénotype) construits depuis l'état agrégé."""
+    abx_cube = CountCube(state["weeks"],
+                         [list(state["result_columns"]), list(state["result_values"])],
+                         state["results"])
+    pheno_cube = CountCube(state["weeks"], [list(state["phenotype_labels"])], state["phenotypes"])
+    return abx_cube, pheno_cube
+
+
+# --------------------------------------------------
+# 7) Dédoublonnage : premier isolat par patient
+#    Les isolats sont triés une fois par (patient, semaine, ordre de l'export)
+#    avec un tri lexicographique stable ; le premier isolat de chaque groupe
+#    est repéré en comparant chaque ligne triée à la précédente.
+# --------------------------------------------------
+DEDUP_MODES = {
+    "tous": "Tous les isolats",
+    "patient_semaine": "Premier isolat par patient et par semaine",
+    "patient": "Premier isolat par patient (toute la période)",
+    "phenotype": "Premier isolat par patient et par phénotype",
+}
+
+
+def first_isolate_mask(
+    patients: np.ndarray,
+    weeks: np.ndarray,
+    mode: str,
+    phenotypes: np.ndarray | None = None,
+    ranks: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Masque des isolats retenus par le mode de dédoublonnage (voir DEDUP_MODES) :
+      - patient_semaine : premier isolat de chaque patient dans chaque semaine ;
+      - patient         : premier isolat de chaque patient sur toute la période ;
+      - phenotype       : premier isolat du patient, puis chaque isolat dont le
+                          phénotype diffère de celui de l'isolat précédent.
+    Les isolats sans patient (code -1) sont tous conservés. Les isolats d'une
+    même semaine sont départagés par ranks (rang dans l'export), à défaut par
+    leur ordre dans les tableaux.
+    """
+    n = len(patients)
+    if mode == "tous" or n == 0:
+        return np.ones(n, dtype=bool)
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Mode de dédoublonnage inconnu : {mode}")
+
+    keys = (weeks, patients) if ranks is None else (ranks, weeks, patients)
+    order = np.lexsort(keys)  # stable : l'ordre de l'export départage
+    p = patients[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = p[1:] != p[:-1]
+    if mode == "patient_semaine":
+        w = weeks[order]
+        first[1:] |= w[1:] != w[:-1]
+    elif mode == "phenotype":
+        if phenotypes is None:
+            raise ValueError("Le mode 'phenotype' nécessite le phénotype de chaque isolat.")
+        ph = phenotypes[order]
+        first[1:] |= ph[1:] != ph[:-1]
+
+    keep = np.empty(n, dtype=bool)
+    keep[order] = first | (p < 0)
+    return keep
+
+
+def deduplicate(export: EncodedExport, patients: np.ndarray | None, mode: str,
+                phenotype_rules: list[tuple[str, list[str]]] | None = None) -> EncodedExport:
+    """
+    Export encodé restreint aux isolats retenus par le mode de dédoublonnage ;
+    patients est dans l'ordre du magasin (voir data_loader.load_patient_codes).
+    """
+    if mode == "tous" or patients is None:
+        return export
+    phenotypes = None
+    if mode == "phenotype":
+        phenotypes = np.asarray(derive_phenotypes(export, phenotype_rules).codes)
+    if export.rows is not None:
+        patients = patients[export.rows]
+    return export.subset(first_isolate_mask(patients, export.weeks, mode, phenotypes, export.rows))
+
+
+# --------------------------------------------------
+# 8) Détection par service : séries (semaine x service x antibiotique)
+#    Les effectifs R et testés de toutes les séries sont rangés dans deux
+#    tableaux 3-D ; ligne de base, seuil et drapeau sont calculés pour
+#    toutes les séries en une passe, par sommes cumulées sur les semaines.
+#    Un regroupement limité à un service est ainsi repéré même s'il ne
+#    fait pas bouger le pourcentage de l'hôpital.
+# --------------------------------------------------
+SERVICE_ALERT_COLUMNS = [
+    "Semaine", "Service", "Antibiotique", "Nb_R", "Nb_testes",
+    "Pct_R", "Pct_attendu", "Attendu", "Seuil", "Score",
+]
+
+
+class ServiceCube:
+    """
+    Effectifs hebdomadaires par service et par antibiotique.
+
+    weeks     : semaines triées, longueur W
+    services  : libellés des U services
+    labels    : noms des A antibiotiques
+    resistant : nombre de R, tableau W x U x A
+    tested    : nombre de testés, W x U x A
+    """
+
+    def __init__(self, weeks, services, labels, resistant, tested):
+        self.weeks = np.asarray(weeks)
+        self.services = list(services)
+        self.labels = list(labels)
+        self.resistant = np.asarray(resistant, dtype=np.int32)
+        self.tested = np.asarray(tested, dtype=np.int32)
+
+    @classmethod
+    def from_export(cls, export: EncodedExport) -> "ServiceCube":
+        """Une passe de np.bincount par antibiotique sur les clés (semaine, service)."""
+        valid = (export.weeks >= 0) & (export.uf_codes >= 0)
+        weeks, week_codes = np.unique(export.weeks[valid], return_inverse=True)
+        n_weeks, n_uf = len(weeks), len(export.uf_labels)
+        keys = week_codes.astype(np.int64) * n_uf + export.uf_codes[valid]
+        codes = export.codes[valid]
+        r_code = RESULT_VALUES.index("R") + 1
+
+        shape = (n_weeks, n_uf, len(export.result_columns))
+        resistant = np.zeros(shape, dtype=np.int32)
+        tested = np.zeros(shape, dtype=np.int32)
+        for j in range(len(export.result_columns)):
+            col = codes[:, j]
+            size = n_weeks * n_uf
+            tested[:, :, j] = np.bincount(keys[col > 0], minlength=size).reshape(n_weeks, n_uf)
+            resistant[:, :, j] = np.bincount(keys[col == r_code], minlength=size).reshape(n_weeks, n_uf)
+        return cls(weeks.astype(int), export.uf_labels, export.result_columns, resistant, tested)
+
+    def merge(self, batch: "ServiceCube") -> "ServiceCube":
+        """
+        Cube augmenté des effectifs d'un lot : seules les semaines du lot
+        changent ; les nouvelles semaines et les nouveaux services sont insérés.
+        """
+        if self.labels != batch.labels:
+            raise ValueError("Les antibiotiques du lot diffèrent de ceux du cube.")
+        weeks = np.union1d(self.weeks, batch.weeks)
+        known = set(self.services)
+        services = self.services + [service for service in batch.services if service not in known]
+        index = {service: u for u, service in enumerate(services)}
+        shape = (len(weeks), len(services), len(self.labels))
+        old = np.ix_(np.searchsorted(weeks, self.weeks), np.arange(len(self.services)))
+        new = np.ix_(np.searchsorted(weeks, batch.weeks), [index[service] for service in batch.services])
+        resistant = np.zeros(shape, dtype=np.int32)
+        tested = np.zeros(shape, dtype=np.int32)
+        resistant[old] = self.resistant
+        tested[old] = self.tested
+        resistant[new] += batch.resistant
+        tested[new] += batch.tested
+        return ServiceCube(weeks, services, self.labels, resistant, tested)
+
+    def to_arrays(self) -> tuple[dict[str, np.ndarray], dict]:
+        """Tableaux et libellés, pour data_loader.write_snapshot."""
+        arrays = {"weeks": self.weeks, "resistant": self.resistant, "tested": self.tested}
+        return arrays, {"services": self.services, "labels": self.labels}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray], meta: dict) -> "ServiceCube":
+        return cls(arrays["weeks"], meta["services"], meta["labels"], arrays["resistant"], arrays["tested"])
+
+    def detect(self, window: int = 8, level: float = 0.95, min_r: int = 3,
+               prior_weight: float = 20.0, min_baseline: int = 50) -> dict[str, np.ndarray]:
+        """
+        Pour chaque série et chaque semaine, compare le nombre de R au nombre
+        attendu d'après les `window` semaines précédentes (semaine courante
+        exclue) du même service. Petits effectifs : le taux de base du service
+        est rapproché du taux de l'hôpital sur la même fenêtre, avec un poids
+        équivalent à `prior_weight` tests, et une alerte exige au moins
+        `min_r` résistants ; aucune alerte tant que la fenêtre compte moins de
+        `min_baseline` tests dans l'hôpital (début d'historique). Le seuil est la borne supérieure binomiale
+        (approximation normale avec correction de continuité) au niveau `level`.
+        Chaque tableau retourné est W x U x A.
+        """
+        from statistics import NormalDist
+
+        window = max(int(window), 1)
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        end = np.arange(len(self.weeks))  # fenêtre [t - window, t)
+        start = np.maximum(end - window, 0)
+
+        cs_r = _cumsum0(self.resistant)
+        cs_t = _cumsum0(self.tested)
+        base_r = cs_r[end] - cs_r[start]
+        base_t = cs_t[end] - cs_t[start]
+        hosp_r = base_r.sum(axis=1, keepdims=True)
+        hosp_t = base_t.sum(axis=1, keepdims=True)
+
+        n = self.tested.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hosp_rate = np.where(hosp_t > 0, hosp_r / hosp_t, np.nan)
+            rate = (base_r + prior_weight * hosp_rate) / (base_t + prior_weight)
+            pct = np.where(n > 0, 100.0 * self.resistant / n, np.nan)
+        expected = n * rate
+        sd = np.sqrt(expected * (1.0 - rate))
+        threshold = expected + z * sd + 0.5
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.where(sd > 0, (self.resistant - expected) / sd, np.inf)
+        with np.errstate(invalid="ignore"):
+            outlier = (self.resistant >= min_r) & (self.resistant > threshold) & (hosp_t >= min_baseline)
+        return {
+            "Pct_R": pct,
+            "Pct_attendu": 100.0 * rate,
+            "Attendu": expected,
+            "Seuil": threshold,
+            "Score": score,
+            "OUTLIER": outlier,
+        }
+
+    def anomalies(self, window: int = 8, level: float = 0.95, min_r: int = 3) -> pd.DataFrame:
+        """
+        Table des (semaine, service, antibiotique) en alerte, colonnes
+        SERVICE_ALERT_COLUMNS, triée par semaine puis par score décroissant.
+        """
+        stats = self.detect(window, level, min_r)
+        w_idx, u_idx, a_idx = np.nonzero(stats["OUTLIER"])
+        df = pd.DataFrame({
+            "Semaine": self.weeks[w_idx].astype(int),
+            "Service": np.array(self.services, dtype=object)[u_idx],
+            "Antibiotique": np.array(self.labels, dtype=object)[a_idx],
+            "Nb_R": self.resistant[w_idx, u_idx, a_idx].astype(int),
+            "Nb_testes": self.tested[w_idx, u_idx, a_idx].astype(int),
+        })
+        for name in ("Pct_R", "Pct_attendu", "Attendu", "Seuil", "Score"):
+            df[name] = stats[name][w_idx, u_idx, a_idx].round(2)
+        df = df.sort_values(["Semaine", "Score"], ascending=[True, False], kind="stable")
+        return df[SERVICE_ALERT_COLUMNS].reset_index(drop=True)
+
+    def frame(self, service: str, label: str, window: int = 8, level: float = 0.95,
+              min_r: int = 3) -> pd.DataFrame:
+        """
+        Série d'un service pour un antibiotique : Week, Nb_R, Nb_testes,
+        Pct_R, Pct_attendu, Attendu, Seuil, OUTLIER.
+        """
+        u, a = self.services.index(service), self.labels.index(label)
+        stats = self.detect(window, level, min_r)
+        df = pd.DataFrame({
+            "Week": self.weeks,
+            "Nb_R": self.resistant[:, u, a],
+            "Nb_testes": self.tested[:, u, a],
+        })
+        for name in ("Pct_R", "Pct_attendu", "Attendu", "Seuil", "OUTLIER"):
+            df[name] = stats[name][:, u, a]
+        df[["Pct_R", "Pct_attendu", "Attendu", "Seuil"]] = df[["Pct_R", "Pct_attendu", "Attendu", "Seuil"]].round(2)
+        return df
+
+
+# --------------------------------------------------
+# 9) Co-résistances
+#    Les isolats sélectionnés (plage de semaines, service) sont des tranches
+#    du modèle trié ; les masques R compactés de ces tranches sont
+#    décompactés par blocs : les effectifs de toutes les paires sont obtenus
+#    par produit matriciel (R x Rᵀ), sans boucle sur les paires.
+# --------------------------------------------------
+CO_RESISTANCE_BLOCK = 1 << 16  # octets de masque par bloc (524 288 isolats)
+
+
+def co_resistance(export: EncodedExport, week_min: int, week_max: int,
+                  service: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Co-résistances des antibiotiques parmi les isolats sélectionnés :
+      - "Nb_R"        : nombre d'isolats R aux deux antibiotiques (diagonale :
+                        R à l'antibiotique), tableau antibiotiques x antibiotiques ;
+      - "Nb_testes"   : nombre d'isolats R à l'antibiotique de la ligne et
+                        testés pour celui de la colonne ;
+      - "Pct_R_sachant" : % de R à l'antibiotique de la colonne parmi les
+                        isolats R à celui de la ligne et testés pour la colonne.
+    """
+    export = export.sorted_by_week_service()
+    labels = export.result_columns
+    n_abx = len(labels)
+    both = np.zeros((n_abx, n_abx), dtype=np.float64)
+    tested = np.zeros((n_abx, n_abx), dtype=np.float64)
+    block = CO_RESISTANCE_BLOCK * 8
+    for selected in export.selection_slices(week_min, week_max, service):
+        for lo in range(selected.start, selected.stop, block):
+            rows = slice(lo, min(lo + block, selected.stop))
+            r = export.r_slice(rows)
+            if not r.any():
+                continue
+            r = r.astype(np.float32)
+            t = (export.codes[rows] > 0).astype(np.float32)
+            both += r @ r.T
+            tested += r @ t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(tested > 0, 100.0 * both / tested, np.nan)
+    return {
+        "Nb_R": pd.DataFrame(both.astype(np.int64), index=labels, columns=labels),
+        "Nb_testes": pd.DataFrame(tested.astype(np.int64), index=labels, columns=labels),
+        "Pct_R_sachant": pd.DataFrame(pct, index=labels, columns=labels).round(1),
+    }
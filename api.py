@@ -0,0 +1,326 @@
+# api.py
+#
+# Service HTTP local exposant en JSON les agrégats du tableau de bord, avec
+# le même code de chargement et de calcul que app.py (data_loader, analytics,
+# ingest) :
+#   python api.py [--host 127.0.0.1] [--port 8502] [--organism staph_aureus]
+#
+#   GET /api/version
+#   GET /api/antibiotiques?source=export|classeurs&window=8&level=0.95&dedup=tous
+#   GET /api/phenotypes?source=export|classeurs&window=8&level=0.95&dedup=tous
+#   GET /api/repartition?semaine_min=1&semaine_max=53&antibiotique=Oxacilline&dedup=tous
+#   GET /api/alertes?source=export|classeurs&window=8&level=0.95&dedup=tous
+#   GET /api/alertes/isolats?semaine=36&service=U23&antibiotique=Linezolide&dedup=tous
+#
+# Chaque réponse porte un ETag lié à la version des données et à la requête :
+# une interrogation répétée avec If-None-Match reçoit un 304 sans calcul.
+# Les données sont rafraîchies en arrière-plan (voir refresh.py). Un
+# service expose les données d'un organisme (voir organisms.py).
+
+import argparse
+import hashlib
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import analytics
+import data_loader
+import ingest
+import organisms
+import refresh
+
+REFRESH_INTERVAL = 10
+SOURCES = ("export", "classeurs")
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    """Lignes d'un DataFrame en objets JSON (NaN -> null)."""
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+# --------------------------------------------------
+# 1) Version des données et agrégats associés
+# --------------------------------------------------
+class Snapshot:
+    """
+    Données d'une version : magasin, modèle encodé et séries des classeurs,
+    lus à la construction ; les agrégats dérivés (par mode de dédoublonnage,
+    fenêtre, niveau) sont calculés à la première demande puis conservés.
+    """
+
+    def __init__(self, signatures: dict, organism: organisms.Organism):
+        self.signatures = signatures
+        self.organism = organism
+        self.manifest, self.state = ingest.ensure_store(
+            organism.export_file, organism.store_folder, organism.phenotype_rules
+        )
+        self.export = data_loader.load_encoded_export(organism.export_file, organism.store_folder)
+        self.series, self.series_errors = data_loader.load_workbook_series(
+            data_loader.discover_antibiotiques(organism.workbook_folder), organism.phenotype_workbooks(),
+            store_folder=organism.store_folder
+        )
+        self._patients = None
+        self._memo: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """Identifiant stable de la version (génération du magasin + classeurs)."""
+        folder = hashlib.sha1(repr((self.signatures["folder"], self.signatures["organisms"])).encode()).hexdigest()[:12]
+        return f"{self.manifest['generation']}-{folder}"
+
+    def _memoized(self, key: tuple, compute):
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        value = compute()
+        with self._lock:
+            self._memo[key] = value
+        return value
+
+    def encoded(self, dedup: str) -> data_loader.EncodedExport:
+        def compute():
+            if dedup != "tous" and self._patients is None:
+                self._patients = data_loader.load_patient_codes(self.organism.export_file,
+                                                                self.organism.store_folder)
+            return analytics.deduplicate(self.export, self._patients, dedup, self.organism.phenotype_rules)
+        return self._memoized(("encoded", dedup), compute)
+
+    def weekly_state(self, dedup: str) -> dict:
+        if dedup == "tous":
+            return self.state
+        return self._memoized(("state", dedup), lambda: analytics.weekly_state(
+            self.encoded(dedup), self.organism.phenotype_rules
+        ))
+
+    def engines(self, dedup: str) -> tuple[analytics.TrendEngine, analytics.TrendEngine]:
+        return self._memoized(("engines", dedup), lambda: analytics.engines_from_state(self.weekly_state(dedup)))
+
+    def cubes(self, dedup: str) -> tuple[analytics.CountCube, analytics.CountCube]:
+        return self._memoized(("cubes", dedup), lambda: analytics.cubes_from_state(self.weekly_state(dedup)))
+
+    # -- agrégats exposés ----------------------------------------------------
+    def trend_series(self, family: str, source: str, window: int, level: float, dedup: str) -> dict:
+        """{indicateur: série hebdomadaire} des antibiotiques ou des phénotypes."""
+        if source == "classeurs":
+            famille = "antibiotique" if family == "antibiotiques" else "phenotype"
+            series = self.series[self.series["Famille"] == famille]
+            return {
+                indicator: _records(group.drop(columns=["Indicateur", "Famille"]))
+                for indicator, group in series.groupby("Indicateur", sort=False)
+            }
+        abx_engine, pheno_engine = self.engines(dedup)
+        engine = abx_engine if family == "antibiotiques" else pheno_engine
+        return {label: _records(engine.frame(label, window, level)) for label in engine.labels}
+
+    def repartition(self, week_min: int | None, week_max: int | None, antibiotique: str | None,
+                    dedup: str) -> dict:
+        abx_cube, pheno_cube = self.cubes(dedup)
+        week_min = int(abx_cube.weeks.min()) if week_min is None else week_min
+        week_max = int(abx_cube.weeks.max()) if week_max is None else week_max
+        labels = abx_cube.axes[0] if antibiotique is None else [antibiotique]
+        unknown = [abx for abx in labels if abx not in abx_cube.axes[0]]
+        if unknown:
+            raise ValueError(f"Antibiotique inconnu : {', '.join(unknown)}")
+        return {
+            "semaine_min": week_min,
+            "semaine_max": week_max,
+            "resultats": {
+                abx: {k: int(v) for k, v in abx_cube.value_counts(week_min, week_max, abx).items()}
+                for abx in labels
+            },
+            "phenotypes": {k: int(v) for k, v in pheno_cube.value_counts(week_min, week_max).items()},
+        }
+
+    def alertes(self, source: str, window: int, level: float, dedup: str) -> list[dict]:
+        def compute():
+            if source == "export":
+                outlier_weeks = self.engines(dedup)[0].outlier_weeks(window, level)
+            else:
+                outlier_weeks = analytics.outlier_weeks_from_series(self.series)
+            return _records(analytics.compute_alertes(self.encoded(dedup), outlier_weeks))
+        return self._memoized(("alertes", source, window, level, dedup), compute)
+
+    def alert_isolates(self, week: int, service: str, antibiotique: str, dedup: str) -> list[dict]:
+        """Isolats derrière une ligne d'alerte (voir analytics.alert_rows)."""
+        export = self.encoded(dedup)
+        if antibiotique not in export.result_columns:
+            raise ValueError(f"Antibiotique inconnu : {antibiotique}")
+        rows = analytics.alert_rows(export, week, service, antibiotique)
+        return _records(data_loader.load_export_rows(self.organism.export_file, rows,
+                                                     store_folder=self.organism.store_folder))
+
+
+class DataService:
+    """
+    Snapshot servi, remplacé en arrière-plan quand les fichiers changent.
+    Les requêtes sont servies en parallèle : la table des snapshots n'est
+    lue, complétée et purgée que sous verrou.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, organism: str = organisms.DEFAULT_ORGANISM):
+        self.organism = organism
+        self._snapshots: dict[str, Snapshot] = {}
+        self._lock = threading.Lock()
+        self.refresher = refresh.BackgroundRefresher(self.probe, self._build, interval)
+
+    def probe(self) -> dict:
+        organism = organisms.load_organisms()[self.organism]
+        return {
+            "organisms": organisms.config_signature(),
+            "export": data_loader.file_signature(organism.export_file),
+            "folder": data_loader.folder_signature(organism.workbook_folder),
+        }
+
+    def _build(self, signatures: dict) -> None:
+        snapshot = Snapshot(signatures, organisms.load_organisms()[self.organism])
+        with self._lock:
+            self._snapshots[repr(signatures)] = snapshot
+
+    def current(self) -> tuple[refresh.DataVersion, Snapshot]:
+        """Version servie et son snapshot, lus ensemble (à appeler une fois par requête)."""
+        version = self.refresher.current()
+        key = repr(version.signatures)
+        with self._lock:
+            # la version servie ne fait qu'avancer : une version remplacée
+            # n'est plus demandée, et les requêtes en cours gardent leur
+            # snapshot. La version servie et celle en construction sont relues
+            # ensemble : un snapshot construit mais pas encore publié est gardé.
+            keep = {key} | {repr(s) for s in self.refresher.retained()}
+            for old in list(self._snapshots):
+                if old not in keep:
+                    del self._snapshots[old]
+            snapshot = self._snapshots.get(key)
+        if snapshot is None:  # snapshot purgé entre-temps : reconstruit hors verrou
+            snapshot = Snapshot(version.signatures, organisms.load_organisms()[self.organism])
+            with self._lock:
+                snapshot = self._snapshots.setdefault(key, snapshot)
+        return version, snapshot
+
+
+# --------------------------------------------------
+# 2) Serveur HTTP
+# --------------------------------------------------
+class RouteNotFound(Exception):
+    """Route inconnue (404)."""
+
+
+def _param(query: dict, name: str, cast=str, default=None):
+    values = query.get(name)
+    if not values or values[0] == "":
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise ValueError(f"Paramètre invalide : {name}={values[0]}")
+
+
+def handle(version: refresh.DataVersion, snapshot: Snapshot, path: str, query: dict) -> dict | list:
+    """
+    Calcule la réponse JSON d'une route sur le snapshot d'une version ;
+    lève RouteNotFound (404) ou ValueError (400).
+    """
+    source = _param(query, "source", default="export")
+    window = _param(query, "window", int, 8)
+    level = _param(query, "level", float, 0.95)
+    dedup = _param(query, "dedup", default="tous")
+    if source not in SOURCES:
+        raise ValueError(f"Source inconnue : {source} (attendu : {', '.join(SOURCES)})")
+    if dedup not in analytics.DEDUP_MODES:
+        raise ValueError(f"Mode de dédoublonnage inconnu : {dedup}")
+    if window < 1 or not 0 < level < 1:
+        raise ValueError("window doit être >= 1 et level compris entre 0 et 1.")
+
+    if path == "/api/version":
+        return {
+            "version": snapshot.version,
+            "organism": snapshot.organism.name,
+            "built_at": version.built_at.isoformat(timespec="seconds"),
+            "build_seconds": round(version.build_seconds, 3),
+            "rows": snapshot.manifest["rows"],
+        }
+    if path in ("/api/antibiotiques", "/api/phenotypes"):
+        family = path.rsplit("/", 1)[1]
+        return snapshot.trend_series(family, source, window, level, dedup)
+    if path == "/api/repartition":
+        return snapshot.repartition(
+            _param(query, "semaine_min", int), _param(query, "semaine_max", int),
+            _param(query, "antibiotique"), dedup,
+        )
+    if path == "/api/alertes":
+        return snapshot.alertes(source, window, level, dedup)
+    if path == "/api/alertes/isolats":
+        week, service, antibiotique = (_param(query, "semaine", int), _param(query, "service"),
+                                       _param(query, "antibiotique"))
+        if week is None or service is None or antibiotique is None:
+            raise ValueError("semaine, service et antibiotique sont obligatoires.")
+        return snapshot.alert_isolates(week, service, antibiotique, dedup)
+    raise RouteNotFound(path)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    service: DataService  # renseigné par make_server
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            version, snapshot = self.service.current()  # une seule lecture : ETag et corps concordent
+            canonical = url.path + "?" + "&".join(f"{k}={query[k][0]}" for k in sorted(query))
+            etag = '"' + hashlib.sha1(f"{snapshot.version}|{canonical}".encode()).hexdigest() + '"'
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = handle(version, snapshot, url.path, query)
+            self._send_json(HTTPStatus.OK, body, etag)
+        except RouteNotFound:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Route inconnue : {url.path}"})
+        except ValueError as exc:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+        except Exception as exc:  # erreur interne : pas une route inconnue
+            self.log_error("%s", f"{type(exc).__name__}: {exc}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(exc).__name__}: {exc}"})
+
+    def _send_json(self, status: HTTPStatus, body, etag: str | None = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8502,
+                service: DataService | None = None) -> ThreadingHTTPServer:
+    service = service or DataService()
+    service.current()  # première version construite avant d'accepter des requêtes
+    service.refresher.start()
+    handler = type("Handler", (ApiHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="API JSON des agrégats du tableau de bord.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--organism", default=organisms.DEFAULT_ORGANISM,
+                        help="Organisme servi (slug de organisms.json, défaut : %(default)s)")
+    args = parser.parse_args(argv)
+    if args.organism not in organisms.load_organisms():
+        parser.error(f"Organisme inconnu : {args.organism}")
+    server = make_server(args.host, args.port, DataService(organism=args.organism))
+    print(f"API servie sur http://{args.host}:{args.port}/api/version")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,98 +3,440 @@
 import streamlit as st
 import pandas as pd
 import os
-import plotly.graph_objects as go
-import plotly.express as px
-import unicodedata
+import threading
+
+import analytics
+import data_loader
+import organisms
+import perf
+import refresh
+import tables
+from data_loader import file_signature, folder_signature, read_only
 
 st.set_page_config(page_title="Surveillance bactérienne", layout="wide")
 
-DATA_FOLDER = "data"
-bacteries_file = os.path.join(DATA_FOLDER, "TOUS les bacteries a etudier.xlsx")
-export_file = os.path.join(DATA_FOLDER, "Export_StaphAureus_COMPLET.csv")
+DATA_FOLDER = data_loader.DATA_FOLDER
+bacteries_file = os.path.join(DATA_FOLDER, data_loader.BACTERIES_FILENAME)
+
+REFRESH_INTERVAL = 10  # secondes entre deux relevés des fichiers de données
 
 # --------------------------------------------------
-# 1) Lecture des données "globales"
+# 1) Accès aux données "globales"
+#    Chaque source est lue une seule fois par version de fichier
+#    (clé = chemin + mtime + taille) et partagée entre les sessions ;
+#    les pages reçoivent une copie superficielle en lecture seule.
+#    Les clés utilisées sont celles de la version servie (voir section 13),
+#    pas celles des fichiers sur le disque : une nouvelle version n'est
+#    visible qu'une fois préparée en arrière-plan.
+#    Les données d'un organisme (export, classeurs) sont désignées par son
+#    slug et ne sont lues qu'à l'ouverture d'une page qui l'affiche.
 # --------------------------------------------------
-bacteries_df = pd.read_excel(bacteries_file)
+def probe_signatures() -> dict:
+    """Signatures actuelles des fichiers de données (exports et classeurs par organisme)."""
+    config = organisms.config_signature()
+    orgs = _cached_organisms(config)
+    return {
+        "bacteries": file_signature(bacteries_file),
+        "organisms": config,
+        "export": {slug: file_signature(org.export_file) for slug, org in orgs.items()},
+        "folder": {slug: folder_signature(org.workbook_folder) for slug, org in orgs.items()},
+    }
+
+def served() -> dict:
+    """Signatures de la version servie (ou de celle en construction, dans le fil de rafraîchissement)."""
+    return refresh.building_signatures() or get_refresher().current().signatures
+
+def export_version(org: str) -> tuple:
+    """Clé de cache des données d'export d'un organisme (export et configuration servis)."""
+    return served()["export"][org], served()["organisms"]
+
+def workbook_version(org: str) -> tuple:
+    """Clé de cache des classeurs d'analyse d'un organisme (dossier et configuration servis)."""
+    return served()["folder"][org], served()["organisms"]
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_bacteries(path: str, signature: tuple) -> pd.DataFrame:
+    perf.cache_miss("bacteries")
+    return data_loader.load_bacteries(path)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _cached_store(org: str, version: tuple) -> tuple[dict, dict]:
+    import ingest
+
+    perf.cache_miss("store")
+    organism = get_organism(org)
+    return ingest.ensure_store(organism.export_file, organism.store_folder, organism.phenotype_rules)
+
+@st.cache_resource(show_spinner="Chargement de l'export…", max_entries=16)
+def _cached_encoded_export(org: str, version: tuple, generation: str) -> data_loader.EncodedExport:
+    perf.cache_miss("encoded_export")
+    organism = get_organism(org)
+    return data_loader.load_encoded_export(organism.export_file, organism.store_folder)
+
+@st.cache_resource(show_spinner="Dédoublonnage des isolats…", max_entries=16)
+def _cached_dedup_export(org: str, version: tuple, generation: str, mode: str) -> data_loader.EncodedExport:
+    perf.cache_miss("dedup_export")
+    organism = get_organism(org)
+    patients = data_loader.load_patient_codes(organism.export_file, organism.store_folder)
+    return analytics.deduplicate(get_encoded_export(org), patients, mode, organism.phenotype_rules)
+
+@st.cache_resource(show_spinner="Calcul des comptages…", max_entries=16)
+def _cached_dedup_state(org: str, version: tuple, generation: str, mode: str) -> dict:
+    perf.cache_miss("dedup_state")
+    return analytics.weekly_state(get_encoded_export(org, mode), get_organism(org).phenotype_rules)
+
+@st.cache_resource(show_spinner="Lecture des classeurs d'analyse…", max_entries=16)
+def _cached_workbook_series(org: str, version: tuple) -> tuple[pd.DataFrame, dict[str, str]]:
+    perf.cache_miss("workbook_series")
+    organism = get_organism(org)
+    return data_loader.load_workbook_series(get_antibiotiques(org), organism.phenotype_workbooks(),
+                                            store_folder=organism.store_folder)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _cached_antibiotiques(org: str, version: tuple) -> dict[str, str]:
+    perf.cache_miss("antibiotiques")
+    return data_loader.discover_antibiotiques(get_organism(org).workbook_folder)
+
+def get_bacteries() -> pd.DataFrame:
+    return read_only(_cached_bacteries(bacteries_file, served()["bacteries"]))
+
+def get_export_manifest(org: str) -> dict:
+    """Manifeste du magasin colonnaire : colonnes, colonnes de résultats, nb de lignes."""
+    return _cached_store(org, export_version(org))[0]
+
+def get_weekly_state(org: str, dedup: str = "tous") -> dict:
+    """
+    État agrégé hebdomadaire (comptages par semaine) : celui persisté avec le
+    magasin pour tous les isolats, recalculé sur les isolats retenus sinon.
+    """
+    if dedup == "tous":
+        return _cached_store(org, export_version(org))[1]
+    generation = get_export_manifest(org)["generation"]
+    return _cached_dedup_state(org, export_version(org), generation, dedup)
+
+def get_encoded_export(org: str, dedup: str = "tous") -> data_loader.EncodedExport:
+    """
+    Modèle encodé de l'export (semaine, service, matrice des résultats et
+    masques R compactés), utilisé par tous les comptages des pages,
+    restreint aux isolats retenus par le mode de dédoublonnage.
+    """
+    generation = get_export_manifest(org)["generation"]
+    if dedup == "tous":
+        return _cached_encoded_export(org, export_version(org), generation)
+    return _cached_dedup_export(org, export_version(org), generation, dedup)
 
-# Lecture de l'export Staphylococcus aureus
-df_export = pd.read_csv(export_file)
-df_export.columns = df_export.columns.str.strip()
-if 'semaine' in df_export.columns:
-    df_export['semaine'] = pd.to_numeric(df_export['semaine'], errors='coerce').astype('Int64')
+def get_workbook_series(org: str, indicator: str | None = None) -> tuple[pd.DataFrame | None, str | None]:
+    """
+    Séries des classeurs d'analyse (table longue, voir data_loader.SERIES_COLUMNS).
+    Avec un indicateur, retourne sa seule série ou (None, message d'erreur).
+    """
+    series, errors = _cached_workbook_series(org, workbook_version(org))
+    if indicator is None:
+        return read_only(series), None
+    if indicator in errors:
+        return None, errors[indicator]
+    return series[series["Indicateur"] == indicator].reset_index(drop=True), None
 
 # --------------------------------------------------
 # 2) Dictionnaire des fichiers antibiotiques
 # --------------------------------------------------
-antibiotiques = {}
-for file in os.listdir(DATA_FOLDER):
-    if file.startswith("pct") and file.endswith(".xlsx"):
-        abx_name = (
-            file.replace("pctR_", "")
-                .replace("pct_R_", "")
-                .replace("pct", "")
-                .replace(".xlsx", "")
-                .capitalize()
-        )
-        antibiotiques[abx_name] = os.path.join(DATA_FOLDER, file)
+def get_antibiotiques(org: str) -> dict[str, str]:
+    return dict(_cached_antibiotiques(org, workbook_version(org)))
 
 # --------------------------------------------------
-# 3) Chemins vers les fichiers de phénotypes
-#    (pour VRSA, on lira VRSA_analyse.xlsx directement)
+# 3) Organismes surveillés (voir organisms.py)
+#    Les pages des organismes sont générées depuis la configuration, dans
+#    l'ordre du classeur des bactéries à surveiller ; seuls les organismes
+#    dont l'export est présent ont une page.
 # --------------------------------------------------
-phenotypes = {
-    "MRSA": os.path.join(DATA_FOLDER, "MRSA_analyse.xlsx"),
-    "VRSA": None,
-    "Wild": os.path.join(DATA_FOLDER, "Wild_analyse.xlsx"),
-    "Other": os.path.join(DATA_FOLDER, "Other_analyse.xlsx")
-}
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_organisms(signature: tuple) -> dict[str, organisms.Organism]:
+    return organisms.load_organisms()
+
+def get_organism(org: str) -> organisms.Organism:
+    return _cached_organisms(served()["organisms"])[org]
+
+def monitored_organisms() -> list[organisms.Organism]:
+    """Organismes de la version servie dont l'export existe, dans l'ordre du classeur des bactéries."""
+    orgs = _cached_organisms(served()["organisms"])
+    present = {slug: org for slug, org in orgs.items() if served()["export"][slug][2] >= 0}
+    return organisms.in_reference_order(present, get_bacteries()["Category"])
+
+@st.cache_resource
+def _opened_organisms() -> tuple[set[str], threading.Lock]:
+    return set(), threading.Lock()
+
+def mark_opened(org: str):
+    """Note l'ouverture d'une page de l'organisme (l'ensemble est partagé entre les sessions)."""
+    slugs, lock = _opened_organisms()
+    with lock:
+        slugs.add(org)
+
+def opened_organisms() -> list[str]:
+    """
+    Organismes dont une page a été ouverte depuis le démarrage (préparés au
+    rafraîchissement) : copie triée, prise sous le verrou, que le fil de
+    rafraîchissement parcourt pendant que les sessions en ajoutent.
+    """
+    slugs, lock = _opened_organisms()
+    with lock:
+        return sorted(slugs)
 
 # --------------------------------------------------
-# 4) Fonctions utilitaires pour la détection domaine global
-#    (uniquement utiles pour MRSA/Wild/Other ou onglet "Répartition globale")
+# 4) Résultats dérivés (recalculés seulement si une source change)
 # --------------------------------------------------
-def normalize_column_name(col_name: str) -> str:
+SOURCE_EXPORT = "Calcul direct depuis l'export"
+SOURCE_CLASSEURS = "Classeurs d'analyse (Excel)"
+
+@st.cache_resource(show_spinner="Calcul des tendances…", max_entries=16)
+def _cached_trend_engines(org: str, version: tuple, dedup: str) -> tuple[analytics.TrendEngine, analytics.TrendEngine]:
+    perf.cache_miss("trend_engines")
+    return analytics.engines_from_state(get_weekly_state(org, dedup))
+
+def get_trend_engines(org: str, dedup: str = "tous") -> tuple[analytics.TrendEngine, analytics.TrendEngine]:
+    """Moteurs de tendances (antibiotiques, phénotypes) de la version courante de l'export."""
+    return _cached_trend_engines(org, export_version(org), dedup)
+
+@st.cache_resource(show_spinner="Calcul des comptages…", max_entries=16)
+def _cached_count_cubes(org: str, version: tuple, dedup: str) -> tuple[analytics.CountCube, analytics.CountCube]:
+    perf.cache_miss("count_cubes")
+    return analytics.cubes_from_state(get_weekly_state(org, dedup))
+
+def get_count_cubes(org: str, dedup: str = "tous") -> tuple[analytics.CountCube, analytics.CountCube]:
+    """
+    Cubes de comptages (semaine x antibiotique x résultat) et (semaine x phénotype)
+    de la version courante de l'export, pour les comptages sur une plage de semaines.
+    """
+    return _cached_count_cubes(org, export_version(org), dedup)
+
+@st.cache_resource(show_spinner="Calcul des alertes…", max_entries=32)
+def _cached_alertes(org: str, version: tuple, workbooks: tuple, source: str,
+                    window: int, level: float, dedup: str) -> pd.DataFrame:
+    perf.cache_miss("alertes")
+    export = get_encoded_export(org, dedup)
+    if source == SOURCE_EXPORT:
+        outlier_weeks = get_trend_engines(org, dedup)[0].outlier_weeks(window, level)
+    else:
+        outlier_weeks = analytics.outlier_weeks_from_series(get_workbook_series(org)[0])
+    return analytics.compute_alertes(export, outlier_weeks)
+
+def get_alertes(settings: dict) -> pd.DataFrame:
+    org = settings["organism"]
+    return read_only(_cached_alertes(
+        org, export_version(org), workbook_version(org),
+        settings["source"], settings["window"], settings["level"], settings["dedup"]
+    ))
+
+@st.cache_resource(show_spinner="Calcul des séries par service…", max_entries=16)
+def _cached_service_cube(org: str, version: tuple, dedup: str) -> analytics.ServiceCube:
+    import ingest
+
+    perf.cache_miss("service_cube")
+    if dedup == "tous":
+        organism = get_organism(org)
+        return ingest.load_service_cube(organism.export_file, organism.store_folder)
+    return analytics.ServiceCube.from_export(get_encoded_export(org, dedup))
+
+def get_service_cube(org: str, dedup: str = "tous") -> analytics.ServiceCube:
+    """Séries (semaine x service x antibiotique) de la version courante de l'export."""
+    return _cached_service_cube(org, export_version(org), dedup)
+
+@st.cache_resource(show_spinner="Détection par service…", max_entries=32)
+def _cached_service_alertes(org: str, version: tuple, window: int, level: float, min_r: int,
+                            dedup: str) -> pd.DataFrame:
+    perf.cache_miss("service_alertes")
+    return get_service_cube(org, dedup).anomalies(window, level, min_r)
+
+def get_service_alertes(settings: dict, min_r: int) -> pd.DataFrame:
+    org = settings["organism"]
+    return read_only(_cached_service_alertes(
+        org, export_version(org), settings["window"], settings["level"], min_r, settings["dedup"]
+    ))
+
+@st.cache_resource(show_spinner="Calcul des co-résistances…", max_entries=64)
+def _cached_co_resistance(org: str, version: tuple, dedup: str, week_min: int, week_max: int,
+                          service: str | None) -> dict[str, pd.DataFrame]:
+    perf.cache_miss("co_resistance")
+    return analytics.co_resistance(get_encoded_export(org, dedup), week_min, week_max, service)
+
+def get_co_resistance(org: str, dedup: str, week_min: int, week_max: int,
+                      service: str | None = None) -> dict[str, pd.DataFrame]:
+    """Matrices de co-résistance d'une plage de semaines et d'un service (None : tous)."""
+    return {
+        name: read_only(df)
+        for name, df in _cached_co_resistance(org, export_version(org), dedup, week_min, week_max, service).items()
+    }
+
+@st.cache_resource(show_spinner="Lecture des isolats…", max_entries=64)
+def _cached_alert_isolates(org: str, version: tuple, dedup: str, week: int, service: str,
+                           antibiotique: str) -> pd.DataFrame:
+    perf.cache_miss("alert_isolates")
+    organism = get_organism(org)
+    rows = analytics.alert_rows(get_encoded_export(org, dedup), week, service, antibiotique)
+    return data_loader.load_export_rows(organism.export_file, rows, store_folder=organism.store_folder)
+
+def get_alert_isolates(org: str, dedup: str, week: int, service: str, antibiotique: str) -> pd.DataFrame:
+    """
+    Isolats derrière une ligne d'alerte (R à l'antibiotique dans le service
+    pendant la semaine), toutes colonnes de l'export, lus ligne à ligne dans le magasin.
+    """
+    return read_only(_cached_alert_isolates(org, export_version(org), dedup, week, service, antibiotique))
+
+@st.cache_resource
+def get_figure_cache() -> "charts.FigureCache":
+    """Cache LRU des figures, partagé par toutes les sessions du serveur."""
+    import charts
+
+    return charts.FigureCache(maxsize=64)
+
+def figure_options(settings: dict) -> tuple:
+    """
+    Partie de la clé de cache d'une figure commune à tous les graphiques :
+    organisme, source, fenêtre, niveau et version des données affichées.
+    """
+    org = settings["organism"]
+    if settings["source"] == SOURCE_EXPORT:
+        version = get_export_manifest(org)["generation"]
+    else:
+        version = workbook_version(org)
+    return (org, settings["source"], settings["window"], settings["level"], settings["max_points"],
+            settings["dedup"], version)
+
+def dedup_setting(org: str) -> str:
     """
-    Enlève les accents et met en minuscules pour comparer aux noms attendus
-    (ex. 'Phénotype' -> 'phenotype', '  Phenotype ' -> 'phenotype').
+    Mode de dédoublonnage (barre latérale), appliqué avant tout comptage :
+    tous les isolats ou premier isolat par patient (voir analytics.DEDUP_MODES).
     """
-    nfkd = unicodedata.normalize('NFKD', col_name)
-    no_accent = "".join(c for c in nfkd if not unicodedata.combining(c))
-    return no_accent.strip().lower()
+    if data_loader.PATIENT_COLUMN not in get_export_manifest(org)["columns"]:
+        return "tous"
+    return st.sidebar.selectbox(
+        "Isolats comptés",
+        list(analytics.DEDUP_MODES),
+        format_func=analytics.DEDUP_MODES.get,
+        key="dedup",
+        help="Premier isolat par patient : un patient prélevé plusieurs fois n'est compté qu'une fois "
+             "par période (semaine ou toute la période) ou par changement de phénotype."
+    )
 
-@st.cache_data
-def detect_phenotype_column(df: pd.DataFrame) -> str | None:
+def trend_settings(org: str, dedup: str = "tous") -> dict:
+    """
+    Réglages des séries hebdomadaires (barre latérale) : source des séries,
+    fenêtre de la moyenne mobile et niveau de confiance du seuil d'alerte.
+    Fenêtre et niveau ne s'appliquent qu'au calcul direct depuis l'export.
+    """
+    import charts
+
+    st.sidebar.markdown("### Tendances hebdomadaires")
+    source = st.sidebar.radio("Source des séries", [SOURCE_EXPORT, SOURCE_CLASSEURS])
+    from_export = source == SOURCE_EXPORT
+    window = st.sidebar.slider(
+        "Fenêtre de la moyenne mobile (semaines)", min_value=2, max_value=26, value=8,
+        disabled=not from_export
+    )
+    level = st.sidebar.select_slider(
+        "Niveau de confiance du seuil", options=[0.80, 0.90, 0.95, 0.99], value=0.95,
+        format_func=lambda v: f"{v:.0%}", disabled=not from_export
+    )
+    if not from_export:
+        window, level = 8, 0.95
+    fast = st.sidebar.checkbox(
+        "Rendu allégé des longues séries",
+        help=f"Au-delà de {charts.FAST_RENDER_POINTS} semaines : tracé WebGL et courbes "
+             "sous-échantillonnées (les semaines en alerte sont toujours affichées)."
+    )
+    max_points = charts.FAST_RENDER_POINTS if fast else None
+    if not from_export and dedup != "tous":
+        st.sidebar.caption("Les séries des classeurs sont précalculées : le dédoublonnage ne s'applique qu'aux alertes.")
+    return {"organism": org, "source": source, "window": window, "level": level, "max_points": max_points,
+            "dedup": dedup}
+
+@st.cache_resource(max_entries=32)
+def _cached_table_index(name: str, version: tuple, _df: pd.DataFrame) -> tables.TableIndex:
+    perf.cache_miss("table_index")
+    return tables.TableIndex(_df)
+
+def paged_table(df: pd.DataFrame, name: str, version: tuple,
+                file_name: str | None = None, download_label: str = "📥 Télécharger (CSV)"):
     """
-    Parcourt toutes les colonnes de df et retourne le nom exact
-    de la colonne qui correspond à 'phenotype' (après normalisation),
-    ou None si aucune colonne n'est trouvée.
+    Table paginée : recherche, filtres et tri sont appliqués côté serveur
+    sur l'index de df (mis en cache par (name, version)) ; seule la page
+    visible est envoyée au navigateur. Le CSV des lignes retenues est produit
+    par blocs, au clic sur le bouton de téléchargement.
     """
-    for col in df.columns:
-        if normalize_column_name(col) == "phenotype":
-            return col
-    return None
+    index = _cached_table_index(name, version, df)
+    columns = list(df.columns)
+
+    c_search, c_sort, c_order, c_size = st.columns([3, 2, 1, 1])
+    search = c_search.text_input("Rechercher", key=f"{name}_search")
+    sort_by = c_sort.selectbox("Trier par", [None] + columns, key=f"{name}_sort",
+                               format_func=lambda c: "—" if c is None else c)
+    descending = c_order.toggle("Décroissant", key=f"{name}_desc")
+    page_size = c_size.selectbox("Lignes", [25, 50, 100, 500], key=f"{name}_size")
+
+    filters = {}
+    if index.values:
+        with st.expander("Filtres"):
+            for col, values in index.values.items():
+                filters[col] = st.multiselect(col, values, key=f"{name}_filter_{col}")
+
+    with perf.stage(f"table {name} : requête") as info:
+        positions = index.query(search, filters, sort_by, ascending=not descending)
+        info["rows"] = len(positions)
+    n_pages = tables.page_count(len(positions), page_size)
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key=f"{name}_page")
+    page = min(int(page), n_pages)
+
+    with perf.stage(f"table {name} : rendu", rows=min(page_size, len(positions))):
+        st.dataframe(index.page(positions, page, page_size), use_container_width=True)
+    first = (page - 1) * page_size
+    st.caption(
+        f"Lignes {min(first + 1, len(positions))}–{min(first + page_size, len(positions))} "
+        f"sur {len(positions)} (table complète : {len(index)})"
+    )
+    if file_name is not None and len(positions):
+        st.download_button(
+            download_label,
+            data=lambda: tables.csv_bytes(df, positions),
+            file_name=file_name,
+            mime="text/csv",
+            key=f"{name}_download"
+        )
 
 # --------------------------------------------------
 # 5) Onglet "Vue globale"
 # --------------------------------------------------
 def page_vue_globale():
     st.title("📋 Bactéries à surveiller")
-    st.dataframe(bacteries_df, use_container_width=True)
+    with perf.stage("chargement") as info:
+        df = get_bacteries()
+        info["rows"] = len(df)
+    paged_table(df, "bacteries", served()["bacteries"])
 
 # --------------------------------------------------
 # 6) Onglet "Répartition globale"
 # --------------------------------------------------
-def page_repartition_globale():
-    st.title("🥧 Répartition globale (camemberts)")
+def organism_setting(orgs: list[organisms.Organism]) -> organisms.Organism:
+    """Organisme affiché par une page commune à tous les organismes (barre latérale)."""
+    names = [org.name for org in orgs]
+    name = st.sidebar.selectbox("Organisme", names, key="organism")
+    return orgs[names.index(name)]
 
+def page_repartition_globale(org: str, dedup: str = "tous"):
+    import charts
+
+    st.title(f"🥧 Répartition globale (camemberts) : {get_organism(org).name}")
     # Filtrer par plage de semaines
-    if 'semaine' not in df_export.columns:
-        st.error("Le fichier Export_StaphAureus_COMPLET.csv doit contenir une colonne 'semaine' (entier).")
+    if 'semaine' not in get_export_manifest(org)["columns"]:
+        st.error(f"Le fichier {os.path.basename(get_organism(org).export_file)} "
+                 "doit contenir une colonne 'semaine' (entier).")
         return
 
-    semaine_min = int(df_export["semaine"].min())
-    semaine_max = int(df_export["semaine"].max())
+    # Les comptages sont lus dans les cubes préfixés : chaque déplacement du
+    # curseur ne coûte qu'une soustraction de deux lignes.
+    with perf.stage("chargement", rows=get_export_manifest(org)["rows"]):
+        abx_cube, pheno_cube = get_count_cubes(org, dedup)
+    semaine_min = int(abx_cube.weeks.min())
+    semaine_max = int(abx_cube.weeks.max())
     semaine_range = st.slider(
         "Filtrer par plage de semaines :",
         min_value=semaine_min,
@@ -103,482 +445,456 @@ def page_repartition_globale():
         step=1
     )
 
-    filtered_df = df_export[
-        (df_export["semaine"] >= semaine_range[0]) &
-        (df_export["semaine"] <= semaine_range[1])
-    ]
-
     # 6.a) Camembert des résultats antibiotiques
     st.subheader("🦠 Camembert des résultats antibiotiques")
-    abx_to_plot = [
-        col for col in filtered_df.columns
-        if col not in ["semaine", "uf"] and filtered_df[col].dtype == object
-    ]
+    abx_to_plot = abx_cube.axes[0]
     selected_abx = st.selectbox("Choisir un antibiotique à visualiser :", abx_to_plot)
 
-    if selected_abx in filtered_df.columns:
-        abx_counts = (
-            filtered_df[selected_abx]
-            .value_counts()
-            .reset_index()
-        )
-        abx_counts.columns = ["Résultat", "Nombre"]
-        fig_abx_pie = px.pie(
-            abx_counts,
-            names="Résultat",
-            values="Nombre",
-            title=f"Distribution de {selected_abx}"
-        )
-        st.plotly_chart(fig_abx_pie, use_container_width=True)
+    if selected_abx in abx_to_plot:
+        with perf.stage("calcul : résultats"):
+            abx_counts = abx_cube.value_counts(*semaine_range, selected_abx)
+        with perf.stage("rendu : résultats"):
+            fig_abx_pie = charts.pie_figure(abx_counts, "Résultat", f"Distribution de {selected_abx}")
+            st.plotly_chart(fig_abx_pie, use_container_width=True)
 
     # 6.b) Camembert des phénotypes
     st.subheader("🧬 Camembert des phénotypes")
-    pheno_col_global = detect_phenotype_column(filtered_df)
-    if pheno_col_global:
-        pheno_counts = (
-            filtered_df[pheno_col_global]
-            .value_counts()
-            .reset_index()
-        )
-        pheno_counts.columns = ["Phénotype", "Nombre"]
-        fig_pheno_pie = px.pie(
-            pheno_counts,
-            names="Phénotype",
-            values="Nombre",
-            title="Distribution des phénotypes"
-        )
-        st.plotly_chart(fig_pheno_pie, use_container_width=True)
+    if pheno_cube.axes[0]:
+        with perf.stage("calcul : phénotypes"):
+            pheno_counts = pheno_cube.value_counts(*semaine_range)
+        with perf.stage("rendu : phénotypes"):
+            fig_pheno_pie = charts.pie_figure(pheno_counts, "Phénotype", "Distribution des phénotypes")
+            st.plotly_chart(fig_pheno_pie, use_container_width=True)
     else:
-        st.info("Aucune colonne 'Phenotype' (ou 'phénotype') trouvée dans le CSV d’export.")
+        st.info("Aucun phénotype disponible dans le CSV d’export.")
 
 # --------------------------------------------------
-# 7) Onglet "Staphylococcus aureus" - onglet Antibiotiques
+# 7) Page d'un organisme - onglet Antibiotiques
 # --------------------------------------------------
-def onglet_antibiotiques():
-    st.subheader("📈 Évolution hebdomadaire de la résistance")
-    abx = st.selectbox("Choisir un antibiotique", sorted(antibiotiques.keys()))
-    if not antibiotiques[abx]:
-        st.error(f"Fichier pour l’antibiotique {abx} introuvable.")
-        return
+def onglet_antibiotiques(settings: dict):
+    import charts
 
-    df_abx = pd.read_excel(antibiotiques[abx])
-    week_col = "Week" if "Week" in df_abx.columns else "Semaine"
-    if week_col not in df_abx.columns or "Pourcentage" not in df_abx.columns:
-        st.error(f"Le fichier {antibiotiques[abx]} doit contenir les colonnes '{week_col}' et 'Pourcentage'.")
-        return
-
-    df_abx[week_col] = pd.to_numeric(df_abx[week_col], errors='coerce')
-    df_abx = df_abx.dropna(subset=[week_col, "Pourcentage"])
-    df_abx["Pourcentage"] = df_abx["Pourcentage"].round(2)
-
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df_abx[week_col],
-        y=df_abx["Pourcentage"],
-        mode="lines+markers",
-        name="% Résistance",
-        line=dict(width=3),
-        marker=dict(color="blue")
-    ))
-    if "Moyenne_mobile_8s" in df_abx.columns:
-        fig.add_trace(go.Scatter(
-            x=df_abx[week_col],
-            y=df_abx["Moyenne_mobile_8s"],
-            mode="lines",
-            name="Moyenne mobile",
-            line=dict(dash="dash", color="orange")
-        ))
-    if "IC_sup" in df_abx.columns:
-        fig.add_trace(go.Scatter(
-            x=df_abx[week_col],
-            y=df_abx["IC_sup"],
-            mode="lines",
-            name="Seuil IC 95%",
-            line=dict(dash="dot", color="gray")
-        ))
-    if "OUTLIER" in df_abx.columns:
-        outliers = df_abx[df_abx["OUTLIER"] == True]
-        fig.add_trace(go.Scatter(
-            x=outliers[week_col],
-            y=outliers["Pourcentage"],
-            mode="markers",
-            name="🔴 Alerte",
-            marker=dict(color="red", size=10)
-        ))
-
-    fig.update_layout(
-        title=dict(text=f"Évolution de la résistance à {abx}", font=dict(size=24, family="Arial Black")),
-        legend=dict(font=dict(size=20, family="Arial Black")),
-        xaxis=dict(
-            title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
-            tickfont=dict(size=18, family="Arial Black")
-        ),
-        yaxis=dict(
-            title=dict(text="% Résistance", font=dict(size=22, family="Arial Black")),
-            tickfont=dict(size=18, family="Arial Black")
-        ),
-        hovermode="x unified"
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    st.subheader("📈 Évolution hebdomadaire de la résistance")
+    org = settings["organism"]
+    if settings["source"] == SOURCE_EXPORT:
+        with perf.stage("chargement"):
+            abx_engine, _ = get_trend_engines(org, settings["dedup"])
+        abx = st.selectbox("Choisir un antibiotique", abx_engine.labels)
+        with perf.stage("calcul") as info:
+            df_abx = abx_engine.frame(abx, settings["window"], settings["level"])
+            info["rows"] = len(df_abx)
+    else:
+        antibiotiques = get_antibiotiques(org)
+        abx = st.selectbox("Choisir un antibiotique", sorted(antibiotiques.keys()))
+        if abx is None:
+            st.info("Aucun classeur d'analyse d'antibiotique pour cet organisme.")
+            return
+        with perf.stage("chargement") as info:
+            df_abx, error = get_workbook_series(org, abx)
+            info["rows"] = None if df_abx is None else len(df_abx)
+        if df_abx is None:
+            st.error(f"Fichier pour l’antibiotique {abx} inutilisable ({error}).")
+            return
+
+    df_abx = charts.prepare_trend_frame(df_abx)
+
+    with perf.stage("figure", rows=len(df_abx)):
+        fig = get_figure_cache().get_or_build(
+            ("antibiotique", abx) + figure_options(settings),
+            lambda: charts.antibiotic_trend_figure(
+                df_abx, abx, ic_label=f"Seuil IC {settings['level']:.0%}", max_points=settings["max_points"]
+            )
+        )
+    with perf.stage("rendu", rows=len(df_abx)):
+        st.plotly_chart(fig, use_container_width=True)
 
 # --------------------------------------------------
-# 8) Onglet "Staphylococcus aureus" - onglet Phénotypes
+# 8) Page d'un organisme - onglet Phénotypes
+#    Phénotypes et phénotypes suivis en nombre (VRSA, ...) : voir organisms.json.
 # --------------------------------------------------
-def onglet_phenotypes():
-    st.subheader("🧬 Évolution des phénotypes (sur 4 graphiques ou 1)")
+def load_phenotype_series(pheno: str, settings: dict) -> tuple[pd.DataFrame | None, str | None]:
+    """
+    Série hebdomadaire d'un phénotype (colonnes 'Week', 'Pourcentage', ...
+    et, pour un phénotype suivi en nombre comme VRSA, le nombre de souches
+    dans la colonne du phénotype), calculée depuis l'export ou lue dans son
+    classeur selon la source choisie.
+    Retourne (DataFrame, None) ou (None, message d'erreur).
+    """
+    import charts
+
+    org = settings["organism"]
+    with perf.stage(f"chargement {pheno}") as info:
+        if settings["source"] == SOURCE_EXPORT:
+            _, pheno_engine = get_trend_engines(org, settings["dedup"])
+            if pheno not in pheno_engine.labels:
+                return None, f"Aucun isolat de phénotype {pheno} dans l'export."
+            df_ph = pheno_engine.frame(pheno, settings["window"], settings["level"])
+        else:
+            # Série lue dans la table consolidée des classeurs (effectif -> colonne du phénotype)
+            df_ph, error = get_workbook_series(org, pheno)
+            if df_ph is None:
+                return None, error
+            df_ph = df_ph.rename(columns={"Nombre": pheno})
+        info["rows"] = len(df_ph)
+
+    if pheno in get_organism(org).count_phenotypes:
+        return charts.prepare_count_frame(df_ph, pheno), None
+    return charts.prepare_trend_frame(df_ph), None
+
+def onglet_phenotypes(settings: dict):
+    import charts
+
+    organism = get_organism(settings["organism"])
+    phenotypes = organism.phenotype_labels
+    st.subheader(f"🧬 Évolution des phénotypes (sur {len(phenotypes)} graphiques ou 1)")
 
     show_all = st.checkbox("Afficher tous les phénotypes dans le même graphique", value=False)
 
     if show_all:
-        # Si vous voulez superposer MRSA, VRSA (nombre), Wild, Other dans un seul graph
-        fig_all = go.Figure()
-        couleurs = {"MRSA": "blue", "VRSA": "red", "Wild": "green", "Other": "purple"}
-
-        for pheno, path in phenotypes.items():
-            if pheno == "VRSA":
-                # Lecture du fichier VRSA_analyse.xlsx
-                path_vrsa = os.path.join(DATA_FOLDER, "VRSA_analyse.xlsx")
-                if not os.path.isfile(path_vrsa):
-                    continue
-                df_v = pd.read_excel(path_vrsa)
-                if "Week" not in df_v.columns or "VRSA" not in df_v.columns:
-                    continue
-                df_v["Week"] = pd.to_numeric(df_v["Week"], errors="coerce").astype("Int64")
-                df_v = df_v.dropna(subset=["Week", "VRSA"])
-                df_v["VRSA"] = df_v["VRSA"].astype(int)
-
-                # Tracé de la courbe “nombre VRSA”
-                fig_all.add_trace(go.Scatter(
-                    x=df_v["Week"],
-                    y=df_v["VRSA"],
-                    mode="lines+markers",
-                    name=f"<b>Nombre VRSA</b>",
-                    line=dict(color=couleurs[pheno], width=3),
-                    marker=dict(size=8)
-                ))
-                # Alertes rouges si VRSA > 0
-                df_alert = df_v[df_v["VRSA"] > 0]
-                fig_all.add_trace(go.Scatter(
-                    x=df_alert["Week"],
-                    y=df_alert["VRSA"],
-                    mode="markers",
-                    name=f"<b>🔴 Alerte VRSA</b>",
-                    marker=dict(color="darkred", size=12),
-                    hovertemplate="VRSA > 0 (Semaine %{x})<extra></extra>"
-                ))
-
-            else:
-                # Affichage % pour MRSA, Wild, Other
-                if not path or not os.path.isfile(path):
-                    continue
-                df_ph = pd.read_excel(path)
-                if "Week" not in df_ph.columns or "Pourcentage" not in df_ph.columns:
-                    continue
-                df_ph["Week"] = pd.to_numeric(df_ph["Week"], errors="coerce")
-                df_ph = df_ph.dropna(subset=["Week", "Pourcentage"])
-                df_ph["Pourcentage"] = df_ph["Pourcentage"].round(2)
-
-                fig_all.add_trace(go.Scatter(
-                    x=df_ph["Week"],
-                    y=df_ph["Pourcentage"],
-                    mode="lines+markers",
-                    name=f"<b>% {pheno}</b>",
-                    line=dict(width=3, color=couleurs[pheno]),
-                    marker=dict(size=8)
-                ))
-
-                if "Moyenne_mobile_8s" in df_ph.columns:
-                    fig_all.add_trace(go.Scatter(
-                        x=df_ph["Week"],
-                        y=df_ph["Moyenne_mobile_8s"],
-                        mode="lines",
-                        name=f"<b>Moyenne {pheno}</b>",
-                        line=dict(dash="dash", color=couleurs[pheno])
-                    ))
-                if "IC_sup" in df_ph.columns:
-                    fig_all.add_trace(go.Scatter(
-                        x=df_ph["Week"],
-                        y=df_ph["IC_sup"],
-                        mode="lines",
-                        name=f"<b>IC sup {pheno}</b>",
-                        line=dict(dash="dot", color="lightgray")
-                    ))
-                if "OUTLIER" in df_ph.columns:
-                    outliers = df_ph[df_ph["OUTLIER"] == True]
-                    fig_all.add_trace(go.Scatter(
-                        x=outliers["Week"],
-                        y=outliers["Pourcentage"],
-                        mode="markers",
-                        name=f"<b>🔴 Alerte {pheno}</b>",
-                        marker=dict(color="black", size=12, symbol="circle-open")
-                    ))
-
-        fig_all.update_layout(
-            title=dict(text="Évolution comparée des 4 phénotypes", font=dict(size=26, family="Arial Black")),
-            legend=dict(font=dict(size=20, family="Arial Black")),
-            xaxis=dict(
-                title=dict(text="Semaine", font=dict(size=24, family="Arial Black")),
-                tickfont=dict(size=18, family="Arial Black")
-            ),
-            yaxis=dict(
-                title=dict(text="Valeur", font=dict(size=24, family="Arial Black")),
-                tickfont=dict(size=18, family="Arial Black")
-            ),
-            hovermode="x unified"
-        )
-        st.plotly_chart(fig_all, use_container_width=True)
+        # Superposer tous les phénotypes (ex. MRSA, VRSA en nombre, Wild, Other) dans un seul graph
+        def build_overview():
+            series = {}
+            for pheno in phenotypes:
+                df_ph, _ = load_phenotype_series(pheno, settings)
+                if df_ph is not None:
+                    series[pheno] = df_ph
+            return charts.phenotypes_overview_figure(
+                series, max_points=settings["max_points"], count_phenotypes=tuple(organism.count_phenotypes)
+            )
+
+        with perf.stage("figure"):
+            fig_all = get_figure_cache().get_or_build(("phenotypes",) + figure_options(settings), build_overview)
+        with perf.stage("rendu"):
+            st.plotly_chart(fig_all, use_container_width=True)
 
     else:
         # Affichage d'un seul phénotype
-        pheno = st.selectbox("Choisir un phénotype", list(phenotypes.keys()))
-
-        if pheno == "VRSA":
-            st.write("### Nombre de souches VRSA par semaine")
+        pheno = st.selectbox("Choisir un phénotype", phenotypes)
 
-            path_vrsa = os.path.join(DATA_FOLDER, "VRSA_analyse.xlsx")
-            if not os.path.isfile(path_vrsa):
-                st.error("Impossible de trouver le fichier `data/VRSA_analyse.xlsx`.")
-                return
+        if pheno in organism.count_phenotypes:
+            st.write(f"### Nombre de souches {pheno} par semaine")
 
-            df_pheno = pd.read_excel(path_vrsa)
-            # Vérifier que les colonnes "Week" et "VRSA" existent
-            if "Week" not in df_pheno.columns or "VRSA" not in df_pheno.columns:
-                st.error("Le fichier `VRSA_analyse.xlsx` doit contenir au moins les colonnes : 'Week' et 'VRSA'.")
+            df_pheno, error = load_phenotype_series(pheno, settings)
+            if df_pheno is None:
+                st.error(error)
                 return
 
-            df_pheno["Week"] = pd.to_numeric(df_pheno["Week"], errors="coerce").astype("Int64")
-            df_pheno = df_pheno.dropna(subset=["Week", "VRSA"])
-            df_pheno["VRSA"] = df_pheno["VRSA"].astype(int)
-
-            # On récupère les bornes X
-            semaine_min = int(df_pheno["Week"].min())
-            semaine_max = int(df_pheno["Week"].max())
-
-            # 1) Tracé du graphique du nombre de VRSA
-            fig_vrsa = go.Figure()
-            fig_vrsa.add_trace(go.Scatter(
-                x=df_pheno["Week"],
-                y=df_pheno["VRSA"],
-                mode="lines+markers",
-                name="Nombre VRSA",
-                line=dict(color="blue", width=3),
-                marker=dict(color="blue", size=8),
-                hovertemplate="Semaine %{x}<br>Nombre VRSA %{y}<extra></extra>"
-            ))
-
-            # 2) Points rouges (alerte) pour VRSA > 0
-            df_alert_vrsa = df_pheno[df_pheno["VRSA"] > 0]
-            if not df_alert_vrsa.empty:
-                fig_vrsa.add_trace(go.Scatter(
-                    x=df_alert_vrsa["Week"],
-                    y=df_alert_vrsa["VRSA"],
-                    mode="markers",
-                    name="🔴 Alerte VRSA",
-                    marker=dict(color="red", size=12),
-                    hovertemplate="⚠ Alerte VRSA !<br>Semaine %{x}<br>Nombre VRSA %{y}<extra></extra>"
-                ))
-
-            # 3) Configuration de l'axe X pour 0,10,20,30,...
-            fig_vrsa.update_layout(
-                title=dict(
-                    text="Évolution hebdomadaire du nombre de souches VRSA",
-                    font=dict(size=26, family="Arial Black")
-                ),
-                legend=dict(
-                    font=dict(size=18, family="Arial Black"),
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                xaxis=dict(
-                    title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
-                    tickfont=dict(size=18, family="Arial Black"),
-                    tickmode="linear",
-                    tick0=semaine_min,
-                    dtick=10,
-                    range=[semaine_min - 0.5, semaine_max + 0.5]
-                ),
-                yaxis=dict(
-                    title=dict(text="Nombre de VRSA", font=dict(size=22, family="Arial Black")),
-                    tickfont=dict(size=18, family="Arial Black"),
-                    rangemode="tozero"
-                ),
-                hovermode="x unified",
-                margin=dict(l=60, r=40, t=100, b=60),
-                height=600
-            )
-            st.plotly_chart(fig_vrsa, use_container_width=True)
+            with perf.stage("figure", rows=len(df_pheno)):
+                fig_count = get_figure_cache().get_or_build(
+                    ("phenotype", pheno) + figure_options(settings),
+                    lambda: charts.phenotype_count_figure(df_pheno, pheno, max_points=settings["max_points"])
+                )
+            with perf.stage("rendu", rows=len(df_pheno)):
+                st.plotly_chart(fig_count, use_container_width=True)
 
-            # 4) Tableau récapitulatif + téléchargement CSV
-            st.subheader("Tableau récapitulatif : Nb VRSA par semaine")
+            # Tableau récapitulatif + téléchargement CSV
+            st.subheader(f"Tableau récapitulatif : Nb {pheno} par semaine")
             df_table = (
-                df_pheno[["Week", "VRSA"]]
-                .rename(columns={"Week": "Semaine", "VRSA": "Nb VRSA"})
+                df_pheno[["Week", pheno]]
+                .rename(columns={"Week": "Semaine", pheno: f"Nb {pheno}"})
                 .sort_values("Semaine")
                 .reset_index(drop=True)
             )
-            st.dataframe(df_table, use_container_width=True)
-
-            csv_data = df_table.to_csv(index=False)
-            st.download_button(
-                label="📥 Télécharger le tableau VRSA (CSV)",
-                data=csv_data,
-                file_name="decompte_VRSA_par_semaine.csv",
-                mime="text/csv"
+            paged_table(
+                df_table, pheno.lower(), figure_options(settings),
+                file_name=f"decompte_{pheno}_par_semaine.csv",
+                download_label=f"📥 Télécharger le tableau {pheno} (CSV)"
             )
 
         else:
-            # MRSA / Wild / Other : affichage du % + moyenne mobile + IC
-            path_pheno = phenotypes[pheno]
-            if not path_pheno or not os.path.isfile(path_pheno):
-                st.error(f"Impossible de trouver le fichier `{path_pheno}`.")
+            # MRSA / Wild / Other, ... : affichage du % + moyenne mobile + IC
+            df_ph, error = load_phenotype_series(pheno, settings)
+            if df_ph is None:
+                st.error(error)
                 return
 
-            df_ph = pd.read_excel(path_pheno)
-            if "Week" not in df_ph.columns or "Pourcentage" not in df_ph.columns:
-                st.error(f"Le fichier `{path_pheno}` doit contenir au moins les colonnes 'Week' et 'Pourcentage'.")
-                return
+            with perf.stage("figure", rows=len(df_ph)):
+                fig2 = get_figure_cache().get_or_build(
+                    ("phenotype", pheno) + figure_options(settings),
+                    lambda: charts.phenotype_trend_figure(
+                        df_ph, pheno, ic_label=f"Seuil IC {settings['level']:.0%}", max_points=settings["max_points"]
+                    )
+                )
+            with perf.stage("rendu", rows=len(df_ph)):
+                st.plotly_chart(fig2, use_container_width=True)
+
+# --------------------------------------------------
+# 9) Page d'un organisme - onglet Alertes
+# --------------------------------------------------
+def onglet_alertes(settings: dict):
+    st.subheader("🚨 Alertes croisées par semaine et service")
+    with perf.stage("calcul") as info:
+        df_final_alertes = get_alertes(settings)
+        info["rows"] = len(df_final_alertes)
+    # les alertes croisent toujours l'export, quelle que soit la source des semaines aberrantes
+    version = figure_options(settings) + (get_export_manifest(settings["organism"])["generation"],)
+    paged_table(
+        df_final_alertes, "alertes", version,
+        file_name="alertes_detectees.csv", download_label="📅 Télécharger les alertes"
+    )
+    if df_final_alertes.empty:
+        return
+
+    st.markdown("#### 🔎 Isolats d'une alerte")
+    labels = df_final_alertes["Alarme"].tolist()
+    choice = st.selectbox("Alerte", range(len(labels)), format_func=labels.__getitem__, key="alert_drilldown")
+    alerte = df_final_alertes.iloc[choice]
+    week, service, abx = int(alerte["Semaine"]), str(alerte["Service"]), str(alerte["Antibiotique"])
+    with perf.stage("chargement") as info:
+        isolats = get_alert_isolates(settings["organism"], settings["dedup"], week, service, abx)
+        info["rows"] = len(isolats)
+    paged_table(
+        isolats, "alerte_isolats", version + (week, service, abx),
+        file_name=f"isolats_S{week}_{service}_{abx}.csv", download_label="📅 Télécharger les isolats"
+    )
+
+# --------------------------------------------------
+# 10) Page d'un organisme - onglet Alertes par service
+#     Détection sur toutes les séries (service x antibiotique) de l'export,
+#     indépendante des semaines aberrantes de l'hôpital.
+# --------------------------------------------------
+def onglet_alertes_services(settings: dict):
+    import charts
+
+    st.subheader("🏥 Alertes par service")
+    min_r = st.number_input(
+        "Nombre minimal de R pour une alerte", min_value=1, max_value=20, value=3, step=1,
+        key="service_min_r",
+        help="Les petits effectifs ne déclenchent pas d'alerte en dessous de ce nombre de résistants."
+    )
+    with perf.stage("calcul") as info:
+        cube = get_service_cube(settings["organism"], settings["dedup"])
+        df_alertes = get_service_alertes(settings, int(min_r))
+        info["rows"] = len(df_alertes)
+    st.caption(
+        f"{len(cube.services)} services x {len(cube.labels)} antibiotiques x {len(cube.weeks)} semaines. "
+        f"Nombre de R comparé au nombre attendu d'après les {settings['window']} semaines précédentes "
+        f"du service (seuil {settings['level']:.0%})."
+    )
+    if settings["source"] != SOURCE_EXPORT:
+        st.caption("Cette détection est toujours calculée depuis l'export (fenêtre 8 semaines, niveau 95 %).")
+    if df_alertes.empty:
+        st.info("Aucune alerte par service pour ces réglages.")
+        return
+    version = (settings["organism"], settings["window"], settings["level"], int(min_r), settings["dedup"],
+               get_export_manifest(settings["organism"])["generation"])
+    paged_table(
+        df_alertes, "alertes_services", version,
+        file_name="alertes_services.csv", download_label="📅 Télécharger les alertes par service"
+    )
 
-            df_ph["Week"] = pd.to_numeric(df_ph["Week"], errors="coerce")
-            df_ph = df_ph.dropna(subset=["Week", "Pourcentage"])
-            df_ph["Pourcentage"] = df_ph["Pourcentage"].round(2)
-
-            semaine_min_mrsa = int(df_ph["Week"].min())
-            semaine_max_mrsa = int(df_ph["Week"].max())
-
-            fig2 = go.Figure()
-            fig2.add_trace(go.Scatter(
-                x=df_ph["Week"],
-                y=df_ph["Pourcentage"],
-                mode="lines+markers",
-                name=f"% {pheno}",
-                line=dict(width=3, color="blue")
-            ))
-
-            if "Moyenne_mobile_8s" in df_ph.columns:
-                fig2.add_trace(go.Scatter(
-                    x=df_ph["Week"],
-                    y=df_ph["Moyenne_mobile_8s"],
-                    mode="lines",
-                    name="Moyenne mobile",
-                    line=dict(dash="dash", color="orange")
-                ))
-            if "IC_sup" in df_ph.columns:
-                fig2.add_trace(go.Scatter(
-                    x=df_ph["Week"],
-                    y=df_ph["IC_sup"],
-                    mode="lines",
-                    name="Seuil IC 95 %",
-                    line=dict(dash="dot", color="gray")
-                ))
-            if "OUTLIER" in df_ph.columns:
-                outliers = df_ph[df_ph["OUTLIER"] == True]
-                fig2.add_trace(go.Scatter(
-                    x=outliers["Week"],
-                    y=outliers["Pourcentage"],
-                    mode="markers",
-                    name="🔴 Alerte",
-                    marker=dict(color="red", size=10)
-                ))
-
-            fig2.update_layout(
-                title=dict(text=f"Évolution du phénotype {pheno}", font=dict(size=24, family="Arial Black")),
-                legend=dict(font=dict(size=20, family="Arial Black")),
-                xaxis=dict(
-                    title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
-                    tickfont=dict(size=18, family="Arial Black"),
-                    tickmode="linear",
-                    tick0=semaine_min_mrsa,
-                    dtick=10
-                ),
-                yaxis=dict(
-                    title=dict(text=f"% {pheno}", font=dict(size=22, family="Arial Black")),
-                    tickfont=dict(size=18, family="Arial Black")
-                ),
-                hovermode="x unified"
+    pairs = list(df_alertes[["Service", "Antibiotique"]].drop_duplicates().itertuples(index=False, name=None))
+    labels = [f"{service} — {abx}" for service, abx in pairs]
+    choice = st.selectbox("Série à afficher", labels, key="service_series")
+    service, abx = pairs[labels.index(choice)]
+    with perf.stage("figure"):
+        fig = get_figure_cache().get_or_build(
+            ("service", service, abx, settings["max_points"]) + version,
+            lambda: charts.service_alert_figure(
+                cube.frame(service, abx, settings["window"], settings["level"], int(min_r)),
+                service, abx, max_points=settings["max_points"]
             )
-            st.plotly_chart(fig2, use_container_width=True)
+        )
+    with perf.stage("rendu"):
+        st.plotly_chart(fig, use_container_width=True)
 
 # --------------------------------------------------
-# 9) Onglet "Staphylococcus aureus" - onglet Alertes
+# 11) Page d'un organisme - onglet Co-résistances
 # --------------------------------------------------
-def onglet_alertes():
-    st.subheader("🚨 Alertes croisées par semaine et service")
-    alertes = []
-    correspondance = {
-        "Gentamicin_analyse_2024": "Gentamycine",
-        "Vancomycin_analyse_2024": "Téicoplanine",
-        "Teicoplanin_analyse_2024": "Téicoplanine",
-        "Linezolid_analyse": "Linezolide",
-        "Daptomycin_analyse": "Daptomycine",
-        "Clindamycin_analyse": "Clindamycine",
-        "Oxacillin_analyse_2024": "Oxacilline",
-        "Sxt_analyse": "Cotrimoxazole",
-        "Dalbavancin_analyse": "Dalbavancine"
-    }
+ALL_SERVICES = "Tous les services"
+
+def onglet_co_resistances(settings: dict):
+    import charts
+
+    st.subheader("🧩 Co-résistances entre antibiotiques")
+    org = settings["organism"]
+    with perf.stage("chargement"):
+        export = get_encoded_export(org, settings["dedup"])
+    valid = export.weeks[export.weeks >= 0]
+    if not len(valid):
+        st.info("Aucun isolat daté dans l'export.")
+        return
+    semaine_min, semaine_max = int(valid.min()), int(valid.max())
+    c_weeks, c_service = st.columns([2, 1])
+    week_min, week_max = c_weeks.slider(
+        "Plage de semaines", min_value=semaine_min, max_value=semaine_max,
+        value=(semaine_min, semaine_max), step=1, key="co_r_weeks"
+    )
+    service = c_service.selectbox(
+        "Service", [ALL_SERVICES] + sorted(export.uf_labels), key="co_r_service"
+    )
+    service = None if service == ALL_SERVICES else service
 
-    for abx, path in antibiotiques.items():
-        if not os.path.isfile(path):
-            continue
-        df_out = pd.read_excel(path)
-        week_col = "Week" if "Week" in df_out.columns else "Semaine"
-        if "OUTLIER" not in df_out.columns or week_col not in df_out.columns:
-            continue
-        df_out[week_col] = pd.to_numeric(df_out[week_col], errors='coerce')
-        weeks = df_out[df_out["OUTLIER"] == True][week_col].dropna().unique()
-
-        col_export = correspondance.get(abx, abx)
-        for w in weeks:
-            if col_export not in df_export.columns:
-                continue
-            mask = (df_export['semaine'] == w)
-            resist = (df_export[col_export] == 'R')
-            df_alert = df_export[mask & resist]
-            for srv in df_alert['uf'].unique():
-                nb_r = df_alert[df_alert['uf'] == srv].shape[0]
-                alertes.append({
-                    "Semaine": int(w),
-                    "Service": srv,
-                    "Antibiotique": col_export,
-                    "Nb_R": nb_r,
-                    "Alarme": f"Semaine {int(w)} : Alerte pour {col_export} dans le service {srv}"
-                })
-
-    df_final_alertes = pd.DataFrame(alertes)
-    st.dataframe(df_final_alertes, use_container_width=True)
-
-    if not df_final_alertes.empty:
+    with perf.stage("calcul", rows=len(export)):
+        matrices = get_co_resistance(org, settings["dedup"], week_min, week_max, service)
+    counts = matrices["Nb_R"]
+    if not counts.to_numpy().diagonal().any():
+        st.info("Aucun isolat résistant pour cette sélection.")
+        return
+
+    version = (org, week_min, week_max, service, settings["dedup"], get_export_manifest(org)["generation"])
+    title = f"Semaines {week_min}–{week_max} · {service or ALL_SERVICES.lower()}"
+    with perf.stage("figure"):
+        fig = get_figure_cache().get_or_build(
+            ("co_resistance",) + version,
+            lambda: charts.co_resistance_figure(matrices["Pct_R_sachant"], counts, title)
+        )
+    with perf.stage("rendu"):
+        st.plotly_chart(fig, use_container_width=True)
+    st.caption(
+        "Case (ligne A, colonne B) : % d'isolats R à B parmi les isolats R à A et testés pour B. "
+        "La diagonale vaut 100 % pour tout antibiotique ayant au moins un R."
+    )
+    with st.expander("Effectifs"):
+        st.dataframe(counts, use_container_width=True)
         st.download_button(
-            "📅 Télécharger les alertes",
-            data=df_final_alertes.to_csv(index=False),
-            file_name="alertes_detectees.csv"
+            "📥 Télécharger les effectifs (CSV)",
+            data=counts.to_csv().encode("utf-8"),
+            file_name=f"co_resistances_S{week_min}-S{week_max}.csv",
+            mime="text/csv",
+            key="co_r_download"
         )
 
 # --------------------------------------------------
-# 10) Lancement de l'application
+# 12) Mesures de performance
+#     Chaque page est chronométrée (voir perf.py) ; l'enregistrement est
+#     ajouté au journal perf.PERF_LOG et conservé pour le panneau de la
+#     barre latérale (dernières exécutions de la session).
+# --------------------------------------------------
+PERF_HISTORY = 50
+
+def timed(page: str, render, *args, figures: bool = True):
+    """
+    Exécute la fonction de page render(*args) sous un chronomètre perf.
+    figures=False pour une page sans graphique : ni le cache des figures ni
+    Plotly (charts) ne sont chargés pour elle.
+    """
+    figure_cache = get_figure_cache() if figures else None
+
+    def counters() -> dict[str, int]:
+        if figure_cache is None:
+            return {"figure_hits": 0, "figure_misses": 0}
+        return {"figure_hits": figure_cache.hits, "figure_misses": figure_cache.misses}
+
+    def keep(record: dict):
+        history = st.session_state.setdefault("perf_records", [])
+        history.append(record)
+        del history[:-PERF_HISTORY]
+
+    with perf.page_timer(page, counters=counters, sink=keep):
+        render(*args)
+
+def perf_panel():
+    """Panneau de débogage : étapes chronométrées des dernières pages exécutées."""
+    if not st.sidebar.checkbox("Mesures de performance", key="perf_panel"):
+        return
+    history = st.session_state.get("perf_records", [])
+    if not history:
+        return
+    rows = [
+        {
+            "Page": record["page"],
+            "Étape": step["stage"],
+            "ms": step["ms"],
+            "Lignes": step["rows"],
+        }
+        for record in reversed(history[-10:])
+        for step in record["stages"] + [{"stage": "total", "ms": record["total_ms"], "rows": None}]
+    ]
+    last = history[-1]
+    st.sidebar.caption(
+        f"Pic mémoire : {last['peak_rss_mb']} Mo · "
+        f"défauts de cache : {sum(last['cache_misses'].values())} · "
+        f"figures (succès/défauts) : {last['counters']['figure_hits']}/{last['counters']['figure_misses']}"
+    )
+    st.sidebar.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    st.sidebar.caption(f"Journal : {perf.PERF_LOG}")
+
+# --------------------------------------------------
+# 13) Rafraîchissement en arrière-plan
+#     Quand un fichier de data/ change, le fil de rafraîchissement remplit
+#     les caches ci-dessus pour la nouvelle version (lecture, magasin,
+#     agrégats, alertes par défaut) des seuls organismes dont une page a été
+#     ouverte ; les sessions restent sur la version précédente jusqu'à la
+#     bascule. Au démarrage, la première version est servie aussitôt et
+#     préparée de la même façon en arrière-plan.
+# --------------------------------------------------
+def warm_caches(signatures: dict):
+    """Prépare la version décrite par signatures (appelé hors requête par le fil de rafraîchissement)."""
+    get_bacteries()
+    for org in opened_organisms():
+        if signatures["export"].get(org, (None, 0, -1))[2] < 0:
+            continue
+        get_antibiotiques(org)
+        get_weekly_state(org)
+        get_encoded_export(org)
+        get_trend_engines(org)
+        get_count_cubes(org)
+        get_service_cube(org)
+        get_workbook_series(org)
+        for source in (SOURCE_EXPORT, SOURCE_CLASSEURS):
+            get_alertes({"organism": org, "source": source, "window": 8, "level": 0.95, "dedup": "tous"})
+
+@st.cache_resource
+def get_refresher() -> refresh.BackgroundRefresher:
+    """
+    Fil de rafraîchissement unique du serveur. La première version est
+    servie sans attendre : la page affichée charge seulement ce dont elle a
+    besoin, le reste des caches est préparé en arrière-plan.
+    """
+    return refresh.BackgroundRefresher(probe_signatures, warm_caches, REFRESH_INTERVAL, lazy_start=True).start()
+
+def data_version_panel():
+    """Version des données servie (barre latérale)."""
+    refresher = get_refresher()
+    version = refresher.current()
+    st.sidebar.caption(
+        f"Données : version {version.token} · construite le {version.built_at:%d/%m/%Y à %H:%M:%S} "
+        f"({version.build_seconds:.1f} s)"
+    )
+    if refresher.building:
+        st.sidebar.caption("⏳ Nouvelle version des données en préparation…")
+    if refresher.last_error:
+        st.sidebar.warning(f"Échec de la préparation des nouvelles données : {refresher.last_error}")
+
+# --------------------------------------------------
+# 14) Lancement de l'application
 # --------------------------------------------------
 def main():
+    orgs = monitored_organisms()
     page = st.sidebar.radio(
         "Navigation",
-        ["Vue globale", "Staphylococcus aureus", "Répartition globale"]
+        ["Vue globale"] + [org.name for org in orgs] + ["Répartition globale"]
     )
     if page == "Vue globale":
-        page_vue_globale()
+        timed("page_vue_globale", page_vue_globale, figures=False)
     elif page == "Répartition globale":
-        page_repartition_globale()
-    elif page == "Staphylococcus aureus":
-        st.title("🥠 Surveillance : Staphylococcus aureus")
-        tab1, tab2, tab3 = st.tabs(
-            ["Antibiotiques", "Phénotypes", "Alertes semaine/service"]
+        if not orgs:
+            st.info("Aucun export d'organisme dans le dossier des données.")
+        else:
+            org = organism_setting(orgs).slug
+            mark_opened(org)
+            timed("page_repartition_globale", page_repartition_globale, org, dedup_setting(org))
+    else:
+        organism = orgs[[org.name for org in orgs].index(page)]
+        mark_opened(organism.slug)
+        st.title(organism.title)
+        settings = trend_settings(organism.slug, dedup_setting(organism.slug))
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(
+            ["Antibiotiques", "Phénotypes", "Alertes semaine/service", "Alertes par service", "Co-résistances"]
         )
         with tab1:
-            onglet_antibiotiques()
+            timed("onglet_antibiotiques", onglet_antibiotiques, settings)
         with tab2:
-            onglet_phenotypes()
+            timed("onglet_phenotypes", onglet_phenotypes, settings)
         with tab3:
-            onglet_alertes()
+            timed("onglet_alertes", onglet_alertes, settings)
+        with tab4:
+            timed("onglet_alertes_services", onglet_alertes_services, settings)
+        with tab5:
+            timed("onglet_co_resistances", onglet_co_resistances, settings)
+    data_version_panel()
+    perf_panel()
 
 if __name__ == "__main__":
     main()
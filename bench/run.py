@@ -0,0 +1,215 @@
+# bench/run.py
+#
+# Banc d'essai sans navigateur : pour chaque taille d'export, génère un jeu
+# synthétique (bench/synthetic.py), construit le magasin colonnaire puis
+# exécute chaque page de app.py avec Streamlit AppTest, chacune dans un
+# processus neuf. Mesures : temps du premier affichage (caches vides) et
+# d'une réexécution (caches chauds), pic mémoire du processus, et détail
+# par étape issu du journal perf (voir perf.py).
+# La mesure « startup » est le démarrage à froid d'un processus redémarré
+# (instantanés déjà sur disque) : du lancement de l'interpréteur à la fin
+# du premier affichage, comparé à l'objectif STARTUP_TARGET_MS.
+#
+#   python -m bench.run                        # 10k, 1M et 10M lignes
+#   python -m bench.run --sizes 10000 --budgets budgets.json
+#   python -m bench.run --sizes 1000000 --startup-target 2000
+#
+# Les résultats sont ajoutés en JSON lines à bench/results/<date>.jsonl.
+# Fichier de budgets (optionnel, code de sortie 1 si dépassé) :
+#   {"10000": {"Vue globale": {"warm_ms": 300, "peak_rss_mb": 400}}}
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import data_loader
+import perf
+from bench import synthetic
+
+BENCH_FOLDER = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_FOLDER)
+APP_PATH = os.path.join(ROOT, "app.py")
+PAGES = ["Vue globale", "Répartition globale", "Staphylococcus aureus"]
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+APPTEST_TIMEOUT = 3600
+STARTUP_TARGET_MS = 2500  # premier affichage après redémarrage, import compris
+
+
+# --------------------------------------------------
+# 1) Mesures dans un processus neuf
+# --------------------------------------------------
+def measure_build(data_folder: str) -> dict:
+    import ingest
+    import organisms
+
+    t0 = time.perf_counter()
+    ingest.main([
+        "--csv", os.path.join(data_folder, data_loader.EXPORT_FILENAME),
+        "--store", os.path.join(data_folder, ".store", organisms.DEFAULT_ORGANISM),
+        "build",
+    ])
+    return {"cold_ms": round((time.perf_counter() - t0) * 1000, 1), "peak_rss_mb": perf.peak_rss_mb()}
+
+
+def measure_startup() -> dict:
+    """Premier affichage de la page d'accueil, compté depuis le lancement du processus (BENCH_T0)."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=APPTEST_TIMEOUT)
+    at.run()
+    first_paint = time.time() - float(os.environ["BENCH_T0"])
+    errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    return {
+        "first_paint_ms": round(first_paint * 1000, 1),
+        "peak_rss_mb": perf.peak_rss_mb(),
+        "errors": errors,
+    }
+
+
+def measure_page(page: str) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=APPTEST_TIMEOUT)
+    at.run()
+    t0 = time.perf_counter()
+    if page != PAGES[0]:
+        at.sidebar.radio[0].set_value(page)
+    at.run()
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    at.run()
+    warm = time.perf_counter() - t0
+
+    errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    return {
+        "cold_ms": round(cold * 1000, 1),
+        "warm_ms": round(warm * 1000, 1),
+        "peak_rss_mb": perf.peak_rss_mb(),
+        "errors": errors,
+    }
+
+
+def run_worker(data_folder: str, page: str) -> dict:
+    """Exécute une mesure dans un sous-processus pointé sur data_folder."""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "perf.jsonl")
+        env = dict(os.environ, SURVEILLANCE_DATA=data_folder, PERF_LOG=log_path, BENCH_T0=repr(time.time()))
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench.run", "--worker", page],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            return {"errors": [proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "échec"]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        records = perf.read_log(log_path)
+    if records:
+        # Détail par fonction de page de la dernière exécution (cache chaud)
+        last = {}
+        for record in records:
+            last[record["page"]] = {
+                "total_ms": record["total_ms"],
+                "stages": {s["stage"]: s["ms"] for s in record["stages"]},
+            }
+        result["page_functions"] = last
+    return result
+
+
+# --------------------------------------------------
+# 2) Campagne de mesures
+# --------------------------------------------------
+def check_budgets(results: list[dict], budgets: dict) -> list[str]:
+    """Messages des mesures qui dépassent leur budget."""
+    failures = []
+    for result in results:
+        budget = budgets.get(str(result["rows"]), {}).get(result["page"], {})
+        for metric, limit in budget.items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                failures.append(f"{result['rows']} lignes, {result['page']} : {metric} = {value} > {limit}")
+    return failures
+
+
+def check_startup(results: list[dict], target_ms: float) -> list[str]:
+    """Messages des démarrages plus lents que l'objectif."""
+    return [
+        f"{result['rows']} lignes : premier affichage {result['first_paint_ms']} ms > {target_ms} ms"
+        for result in results
+        if result["page"] == "startup" and result.get("first_paint_ms", 0) > target_ms
+    ]
+
+
+def run_bench(sizes: list[int], weeks: int, n_uf: int, data_root: str, results_path: str) -> list[dict]:
+    results = []
+    for rows in sizes:
+        folder = os.path.join(data_root, str(rows))
+        t0 = time.perf_counter()
+        synthetic.generate_dataset(folder, rows, weeks, n_uf)
+        print(f"[{rows} lignes] jeu de données prêt ({time.perf_counter() - t0:.1f} s)", flush=True)
+
+        for page in ["build", "startup"] + PAGES:
+            result = run_worker(os.path.abspath(folder), page)
+            result.update(rows=rows, page=page, weeks=weeks, uf=n_uf,
+                          ts=datetime.now().isoformat(timespec="seconds"))
+            results.append(result)
+            with open(results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if page == "startup":
+                print(f"[{rows} lignes] {page:<22} premier affichage depuis le lancement "
+                      f"{result.get('first_paint_ms', '-'):>10} ms  pic {result.get('peak_rss_mb', '-')} Mo"
+                      + (f"  ERREURS : {result['errors']}" if result.get("errors") else ""), flush=True)
+                continue
+            print(
+                f"[{rows} lignes] {page:<22} premier affichage {result.get('cold_ms', '-'):>10} ms  "
+                f"réexécution {result.get('warm_ms', '-'):>9} ms  pic {result.get('peak_rss_mb', '-')} Mo"
+                + (f"  ERREURS : {result['errors']}" if result.get("errors") else ""),
+                flush=True,
+            )
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Banc d'essai des pages du tableau de bord.")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES,
+                        help="Nombres de lignes, séparés par des virgules")
+    parser.add_argument("--weeks", type=int, default=104)
+    parser.add_argument("--uf", type=int, default=375, help="Nombre de services")
+    parser.add_argument("--data-root", default=os.path.join(BENCH_FOLDER, ".data"),
+                        help="Dossier des jeux synthétiques (réutilisés d'une campagne à l'autre)")
+    parser.add_argument("--budgets", help="Fichier JSON des budgets de performance")
+    parser.add_argument("--startup-target", type=float, default=STARTUP_TARGET_MS,
+                        help="Objectif de premier affichage après redémarrage, en ms (défaut : %(default)s)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        if args.worker == "build":
+            result = measure_build(data_loader.DATA_FOLDER)
+        elif args.worker == "startup":
+            result = measure_startup()
+        else:
+            result = measure_page(args.worker)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    os.makedirs(os.path.join(BENCH_FOLDER, "results"), exist_ok=True)
+    results_path = os.path.join(BENCH_FOLDER, "results", f"{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    results = run_bench(args.sizes, args.weeks, args.uf, args.data_root, results_path)
+    print(f"Résultats : {results_path}")
+
+    failures = check_startup(results, args.startup_target)
+    if args.budgets:
+        with open(args.budgets, encoding="utf-8") as f:
+            failures += check_budgets(results, json.load(f))
+    for failure in failures:
+        print(f"Budget dépassé — {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# bench/synthetic.py
+#
+# Générateur de jeux de données synthétiques au format exact de
+# Export_StaphAureus_COMPLET.csv (mêmes colonnes, CSV en CRLF), accompagnés
+# des classeurs d'analyse correspondants (pct*_analyse.xlsx, <phénotype>_analyse.xlsx)
+# et du classeur des bactéries à surveiller.
+#
+#   python -m bench.synthetic data_bench --rows 1000000 --weeks 104 --uf 400
+#
+# L'export est écrit par blocs : la mémoire reste bornée même à 10M lignes.
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_loader
+
+EXPORT_COLUMNS = [
+    "id_demand", "ipp_pastel", "uf", "num_specimen", "semaine", "unnamed: 5",
+    "nature", "code_germe", "lib_germe",
+]
+RESULT_COLUMNS = [
+    "Vancomycine", "Teicoplanine", "Gentamycine", "Oxacilline", "Daptomycine",
+    "Dalbavancine", "Clindamycine", "Cotrimoxazole", "Linezolide",
+]
+
+# Taux de résistance des antibiotiques hors phénotype, parmi les isolats non
+# sauvages (Vancomycine et Oxacilline découlent du mélange de phénotypes)
+RESISTANCE_RATES = {
+    "Teicoplanine": 0.15, "Gentamycine": 0.13, "Daptomycine": 0.03,
+    "Dalbavancine": 0.0, "Clindamycine": 0.32, "Cotrimoxazole": 0.23, "Linezolide": 0.01,
+}
+# Proportion de résultats non renseignés par antibiotique (défaut : MISSING_RATE)
+MISSING_RATES = {"Oxacilline": 0.002, "Dalbavancine": 0.9998, "Daptomycine": 0.11}
+MISSING_RATE = 0.07
+PHENOTYPE_MIX = {"Wild": 0.78, "MRSA": 0.12, "VRSA": 0.001, "Other": 0.099}
+
+# Classeur d'analyse de chaque antibiotique (mêmes noms que dans data/)
+WORKBOOK_FILES = {
+    "Vancomycine": "pctR_Vancomycin_analyse_2024.xlsx",
+    "Teicoplanine": "pct_R_Teicoplanin_analyse_2024.xlsx",
+    "Gentamycine": "pct_R_Gentamicin_analyse_2024.xlsx",
+    "Oxacilline": "pct_R_Oxacillin_analyse_2024.xlsx",
+    "Daptomycine": "pct_R_Daptomycin_analyse.xlsx",
+    "Clindamycine": "pctR_Clindamycin_analyse.xlsx",
+    "Cotrimoxazole": "pctSXT_analyse.xlsx",
+    "Linezolide": "pct_R_Linezolid_analyse.xlsx",
+}
+
+CHUNK_ROWS = 500_000
+REPO_DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+# --------------------------------------------------
+# 1) Isolats synthétiques
+# --------------------------------------------------
+def week_counts(rows: int, weeks: int, rng: np.random.Generator) -> np.ndarray:
+    """Nombre d'isolats de chaque semaine 1..weeks (activité légèrement saisonnière)."""
+    t = np.arange(weeks)
+    weight = 1 + 0.2 * np.sin(2 * np.pi * t / 52)
+    return rng.multinomial(rows, weight / weight.sum())
+
+
+def generate_chunk(
+    start: int,
+    semaine: np.ndarray,
+    n_uf: int,
+    rng: np.random.Generator,
+    resistance_rates: dict[str, float] = RESISTANCE_RATES,
+    phenotype_mix: dict[str, float] = PHENOTYPE_MIX,
+) -> pd.DataFrame:
+    """
+    Isolats start .. start + len(semaine) - 1, au schéma de l'export.
+    Le phénotype de chaque isolat est tiré selon phenotype_mix puis imposé
+    aux résultats (VRSA : Vancomycine R ; MRSA : Oxacilline R ; Other : au
+    moins une autre résistance ; Wild : aucune résistance), de sorte que
+    analytics.derive_phenotypes retrouve le mélange demandé.
+    """
+    n = len(semaine)
+    ids = np.arange(start, start + n).astype(str)
+    specimen = np.char.add("A", ids)
+
+    # Services : quelques gros services, une longue traîne de petits
+    uf_weight = 1 / np.arange(1, n_uf + 1) ** 0.8
+    uf = np.char.add("U", (rng.choice(n_uf, size=n, p=uf_weight / uf_weight.sum()) + 1).astype(str))
+
+    labels = list(phenotype_mix)
+    mix = np.array([phenotype_mix[p] for p in labels], dtype=float)
+    pheno = np.array(labels)[rng.choice(len(labels), size=n, p=mix / mix.sum())]
+
+    resistant = {}
+    for col in RESULT_COLUMNS:
+        rate = resistance_rates.get(col, 0.0)
+        resistant[col] = (pheno != "Wild") & (rng.random(n) < rate)
+    resistant["Vancomycine"] = pheno == "VRSA"
+    resistant["Oxacilline"] = pheno == "MRSA"
+    # "Other" : au moins une résistance hors Vancomycine / Oxacilline
+    others = [c for c in RESULT_COLUMNS if c not in ("Vancomycine", "Oxacilline", "Dalbavancine")]
+    none_r = (pheno == "Other") & ~np.any([resistant[c] for c in others], axis=0)
+    forced = np.array(others)[rng.integers(len(others), size=n)]
+    for col in others:
+        resistant[col] |= none_r & (forced == col)
+
+    df = pd.DataFrame({
+        "id_demand": np.char.add("ID_", ids),
+        "ipp_pastel": np.char.add("IPP_", (np.arange(start, start + n) // 3).astype(str)),
+        "uf": uf,
+        "num_specimen": specimen,
+        "semaine": semaine,
+        "unnamed: 5": np.char.add(specimen, "-Staphylococcus aureus"),
+        "nature": "*******",
+        "code_germe": "SAUR",
+        "lib_germe": "Staphylococcus aureus",
+    })
+    for col in RESULT_COLUMNS:
+        values = np.where(resistant[col], "R", "S").astype(object)
+        missing = ~resistant[col] & (rng.random(n) < MISSING_RATES.get(col, MISSING_RATE))
+        values[missing] = None
+        df[col] = values
+    return df[EXPORT_COLUMNS + RESULT_COLUMNS]
+
+
+# --------------------------------------------------
+# 2) Jeu de données complet
+# --------------------------------------------------
+def write_workbooks(state: dict[str, np.ndarray], folder: str, window: int = 8, level: float = 0.95) -> None:
+    """Classeurs d'analyse hebdomadaires calculés depuis l'état agrégé de l'export."""
+    abx_engine, pheno_engine = analytics.engines_from_state(state)
+    for col, file in WORKBOOK_FILES.items():
+        if col in abx_engine.labels:
+            frame = abx_engine.frame(col, window, level).drop(columns=[col, "Total"])
+            frame.to_excel(os.path.join(folder, file), index=False)
+    for pheno in pheno_engine.labels:
+        pheno_engine.frame(pheno, window, level).to_excel(
+            os.path.join(folder, f"{pheno}_analyse.xlsx"), index=False
+        )
+
+
+def generate_dataset(
+    folder: str,
+    rows: int,
+    weeks: int = 53,
+    n_uf: int = 375,
+    resistance_rates: dict[str, float] = RESISTANCE_RATES,
+    phenotype_mix: dict[str, float] = PHENOTYPE_MIX,
+    seed: int = 0,
+    bacteries_source: str | None = None,
+) -> dict:
+    """
+    Écrit dans folder un export de rows isolats sur weeks semaines et n_uf
+    services, ses classeurs d'analyse et le classeur des bactéries (copié
+    depuis bacteries_source, par défaut celui de data/).
+    Retourne les paramètres, enregistrés aussi dans folder/synthetic.json ;
+    un dossier déjà généré avec les mêmes paramètres est réutilisé.
+    """
+    params = {
+        "rows": rows, "weeks": weeks, "uf": n_uf, "seed": seed,
+        "resistance_rates": resistance_rates, "phenotype_mix": phenotype_mix,
+    }
+    params_path = os.path.join(folder, "synthetic.json")
+    export_path = os.path.join(folder, data_loader.EXPORT_FILENAME)
+    if os.path.exists(params_path) and os.path.exists(export_path):
+        with open(params_path, encoding="utf-8") as f:
+            if json.load(f) == params:
+                return params
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    semaine = np.repeat(np.arange(1, weeks + 1, dtype=np.int32), week_counts(rows, weeks, rng))
+    state = None
+    with open(export_path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, max(rows, 1), CHUNK_ROWS):
+            chunk = generate_chunk(
+                start, semaine[start:start + CHUNK_ROWS], n_uf, rng, resistance_rates, phenotype_mix
+            )
+            chunk.to_csv(f, index=False, header=start == 0, lineterminator="\r\n")
+            chunk_state = analytics.weekly_state(data_loader.EncodedExport.from_frame(chunk, RESULT_COLUMNS))
+            state = chunk_state if state is None else analytics.merge_weekly_state(state, chunk_state)
+
+    write_workbooks(state, folder)
+    source = bacteries_source or os.path.join(REPO_DATA_FOLDER, data_loader.BACTERIES_FILENAME)
+    shutil.copyfile(source, os.path.join(folder, data_loader.BACTERIES_FILENAME))
+
+    with open(params_path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    return params
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Génère un export synthétique et ses classeurs.")
+    parser.add_argument("folder", help="Dossier de sortie")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--weeks", type=int, default=53)
+    parser.add_argument("--uf", type=int, default=375, help="Nombre de services")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=json.loads, default=PHENOTYPE_MIX,
+                        help="Mélange de phénotypes (JSON, défaut : %(default)s)")
+    parser.add_argument("--rates", type=json.loads, default=RESISTANCE_RATES,
+                        help="Taux de résistance par antibiotique (JSON)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    generate_dataset(args.folder, args.rows, args.weeks, args.uf,
+                     {**RESISTANCE_RATES, **args.rates}, args.mix, args.seed)
+    print(f"{args.rows} isolats -> {args.folder} ({time.perf_counter() - t0:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
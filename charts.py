@@ -0,0 +1,532 @@
+# charts.py
+#
+# Construction des graphiques Plotly du tableau de bord et cache LRU
+# des figures. Aucune dépendance à Streamlit : les mêmes fonctions servent
+# à l'application et aux scripts hors ligne.
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+PHENOTYPE_COLORS = {"MRSA": "blue", "VRSA": "red", "MRS": "blue", "VRS": "red", "ERV": "red",
+                    "Wild": "green", "Other": "purple"}
+
+# Rendu allégé : au-delà de ce nombre de semaines, les courbes passent en
+# WebGL (Scattergl) et sont sous-échantillonnées côté serveur.
+FAST_RENDER_POINTS = 500
+
+
+# --------------------------------------------------
+# 1) Cache LRU des figures
+#    Une figure est identifiée par (indicateur, options d'affichage, version
+#    des données) ; revenir sur un antibiotique déjà affiché ressert la
+#    figure prête au lieu de la reconstruire trace par trace.
+# --------------------------------------------------
+class FigureCache:
+    """Cache LRU borné, partagé entre les sessions (accès protégé par un verrou)."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, go.Figure] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], go.Figure]) -> go.Figure:
+        """Retourne la figure associée à key, construite par build() si absente."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        figure = build()
+        with self._lock:
+            self._items[key] = figure
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return figure
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# --------------------------------------------------
+# 2) Rendu allégé des longues séries
+#    Sous-échantillonnage LTTB (Largest-Triangle-Three-Buckets) : conserve
+#    la forme de la courbe (pics, creux) avec un nombre de points borné.
+#    Les semaines en alerte (OUTLIER, VRSA > 0) sont toujours conservées.
+# --------------------------------------------------
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices (triés) des n_out points retenus par LTTB ; tous si n_out >= len(x)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bornes des n_out - 2 seaux intermédiaires (premier et dernier points fixés)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Sommet C : moyenne du seau suivant (ou dernier point)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # Point du seau courant qui maximise l'aire du triangle (A, B, C)
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def thin_series(df: pd.DataFrame, y: str, max_points: int | None, keep: pd.Series | None = None) -> pd.DataFrame:
+    """
+    Lignes de df retenues pour le tracé de la colonne y : toutes si max_points
+    est None ou non dépassé, sinon la sélection LTTB complétée des lignes keep.
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    values = df[y].to_numpy(dtype=float, na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    idx = valid[lttb_indices(df["Week"].to_numpy(dtype=float)[valid], values[valid], max_points)]
+    if keep is not None:
+        idx = np.union1d(idx, np.flatnonzero(keep.fillna(False).to_numpy(dtype=bool)))
+    return df.iloc[idx]
+
+def scatter_class(df: pd.DataFrame, max_points: int | None) -> type:
+    """go.Scattergl (WebGL) pour les longues séries en rendu allégé, go.Scatter sinon."""
+    if max_points is not None and len(df) > max_points:
+        return go.Scattergl
+    return go.Scatter
+
+def _outlier_mask(df: pd.DataFrame) -> pd.Series | None:
+    return df["OUTLIER"] == True if "OUTLIER" in df.columns else None
+
+
+# --------------------------------------------------
+# 3) Évolution de la résistance à un antibiotique
+# --------------------------------------------------
+def antibiotic_trend_figure(df_abx: pd.DataFrame, abx: str, ic_label: str = "Seuil IC 95%",
+                            max_points: int | None = None) -> go.Figure:
+    """
+    Courbe du % de résistance, moyenne mobile, seuil IC et semaines en alerte.
+    max_points : active le rendu allégé au-delà de ce nombre de semaines.
+    """
+    week_col = "Week"
+    Scatter = scatter_class(df_abx, max_points)
+    df_line = thin_series(df_abx, "Pourcentage", max_points, keep=_outlier_mask(df_abx))
+    fig = go.Figure()
+    fig.add_trace(Scatter(
+        x=df_line[week_col],
+        y=df_line["Pourcentage"],
+        mode="lines+markers",
+        name="% Résistance",
+        line=dict(width=3),
+        marker=dict(color="blue")
+    ))
+    if "Moyenne_mobile_8s" in df_abx.columns:
+        df_mm = thin_series(df_abx, "Moyenne_mobile_8s", max_points)
+        fig.add_trace(Scatter(
+            x=df_mm[week_col],
+            y=df_mm["Moyenne_mobile_8s"],
+            mode="lines",
+            name="Moyenne mobile",
+            line=dict(dash="dash", color="orange")
+        ))
+    if "IC_sup" in df_abx.columns:
+        df_ic = thin_series(df_abx, "IC_sup", max_points)
+        fig.add_trace(Scatter(
+            x=df_ic[week_col],
+            y=df_ic["IC_sup"],
+            mode="lines",
+            name=ic_label,
+            line=dict(dash="dot", color="gray")
+        ))
+    if "OUTLIER" in df_abx.columns:
+        outliers = df_abx[df_abx["OUTLIER"] == True]
+        fig.add_trace(Scatter(
+            x=outliers[week_col],
+            y=outliers["Pourcentage"],
+            mode="markers",
+            name="🔴 Alerte",
+            marker=dict(color="red", size=10)
+        ))
+
+    fig.update_layout(
+        title=dict(text=f"Évolution de la résistance à {abx}", font=dict(size=24, family="Arial Black")),
+        legend=dict(font=dict(size=20, family="Arial Black")),
+        xaxis=dict(
+            title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        yaxis=dict(
+            title=dict(text="% Résistance", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        hovermode="x unified"
+    )
+    return fig
+
+
+# --------------------------------------------------
+# 4) Phénotypes
+# --------------------------------------------------
+def phenotypes_overview_figure(series: dict[str, pd.DataFrame], max_points: int | None = None,
+                               count_phenotypes: tuple[str, ...] = ("VRSA",)) -> go.Figure:
+    """
+    Superpose les phénotypes (ex. MRSA, VRSA en nombre, Wild, Other) dans un seul graphique.
+    series : {phénotype: série hebdomadaire}, dans l'ordre d'affichage.
+    count_phenotypes : phénotypes tracés en nombre de souches (colonne du phénotype).
+    max_points : active le rendu allégé au-delà de ce nombre de semaines.
+    """
+    fig_all = go.Figure()
+    couleurs = PHENOTYPE_COLORS
+
+    for pheno, df_ph in series.items():
+        Scatter = scatter_class(df_ph, max_points)
+        if pheno in count_phenotypes:
+            df_v = df_ph
+            df_line = thin_series(df_v, pheno, max_points, keep=df_v[pheno] > 0)
+
+            # Tracé de la courbe “nombre” (VRSA, ...)
+            fig_all.add_trace(Scatter(
+                x=df_line["Week"],
+                y=df_line[pheno],
+                mode="lines+markers",
+                name=f"<b>Nombre {pheno}</b>",
+                line=dict(color=couleurs.get(pheno, "red"), width=3),
+                marker=dict(size=8)
+            ))
+            # Alertes rouges si nombre > 0
+            df_alert = df_v[df_v[pheno] > 0]
+            fig_all.add_trace(Scatter(
+                x=df_alert["Week"],
+                y=df_alert[pheno],
+                mode="markers",
+                name=f"<b>🔴 Alerte {pheno}</b>",
+                marker=dict(color="darkred", size=12),
+                hovertemplate=f"{pheno} > 0 (Semaine %{{x}})<extra></extra>"
+            ))
+
+        else:
+            # Affichage % pour MRSA, Wild, Other, ...
+            color = couleurs.get(pheno, "gray")
+            df_line = thin_series(df_ph, "Pourcentage", max_points, keep=_outlier_mask(df_ph))
+            fig_all.add_trace(Scatter(
+                x=df_line["Week"],
+                y=df_line["Pourcentage"],
+                mode="lines+markers",
+                name=f"<b>% {pheno}</b>",
+                line=dict(width=3, color=color),
+                marker=dict(size=8)
+            ))
+
+            if "Moyenne_mobile_8s" in df_ph.columns:
+                df_mm = thin_series(df_ph, "Moyenne_mobile_8s", max_points)
+                fig_all.add_trace(Scatter(
+                    x=df_mm["Week"],
+                    y=df_mm["Moyenne_mobile_8s"],
+                    mode="lines",
+                    name=f"<b>Moyenne {pheno}</b>",
+                    line=dict(dash="dash", color=color)
+                ))
+            if "IC_sup" in df_ph.columns:
+                df_ic = thin_series(df_ph, "IC_sup", max_points)
+                fig_all.add_trace(Scatter(
+                    x=df_ic["Week"],
+                    y=df_ic["IC_sup"],
+                    mode="lines",
+                    name=f"<b>IC sup {pheno}</b>",
+                    line=dict(dash="dot", color="lightgray")
+                ))
+            if "OUTLIER" in df_ph.columns:
+                outliers = df_ph[df_ph["OUTLIER"] == True]
+                fig_all.add_trace(Scatter(
+                    x=outliers["Week"],
+                    y=outliers["Pourcentage"],
+                    mode="markers",
+                    name=f"<b>🔴 Alerte {pheno}</b>",
+                    marker=dict(color="black", size=12, symbol="circle-open")
+                ))
+
+    fig_all.update_layout(
+        title=dict(text=f"Évolution comparée des {len(series)} phénotypes", font=dict(size=26, family="Arial Black")),
+        legend=dict(font=dict(size=20, family="Arial Black")),
+        xaxis=dict(
+            title=dict(text="Semaine", font=dict(size=24, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        yaxis=dict(
+            title=dict(text="Valeur", font=dict(size=24, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        hovermode="x unified"
+    )
+    return fig_all
+
+
+def phenotype_count_figure(df_pheno: pd.DataFrame, pheno: str, max_points: int | None = None) -> go.Figure:
+    """
+    Nombre hebdomadaire de souches d'un phénotype suivi en nombre (VRSA, ...,
+    colonne pheno), avec les semaines où il est > 0 en rouge.
+    max_points : active le rendu allégé au-delà de ce nombre de semaines.
+    """
+    # On récupère les bornes X
+    semaine_min = int(df_pheno["Week"].min())
+    semaine_max = int(df_pheno["Week"].max())
+
+    # 1) Tracé du graphique du nombre de souches
+    Scatter = scatter_class(df_pheno, max_points)
+    df_line = thin_series(df_pheno, pheno, max_points, keep=df_pheno[pheno] > 0)
+    fig_vrsa = go.Figure()
+    fig_vrsa.add_trace(Scatter(
+        x=df_line["Week"],
+        y=df_line[pheno],
+        mode="lines+markers",
+        name=f"Nombre {pheno}",
+        line=dict(color="blue", width=3),
+        marker=dict(color="blue", size=8),
+        hovertemplate=f"Semaine %{{x}}<br>Nombre {pheno} %{{y}}<extra></extra>"
+    ))
+
+    # 2) Points rouges (alerte) pour un nombre > 0
+    df_alert_vrsa = df_pheno[df_pheno[pheno] > 0]
+    if not df_alert_vrsa.empty:
+        fig_vrsa.add_trace(Scatter(
+            x=df_alert_vrsa["Week"],
+            y=df_alert_vrsa[pheno],
+            mode="markers",
+            name=f"🔴 Alerte {pheno}",
+            marker=dict(color="red", size=12),
+            hovertemplate=f"⚠ Alerte {pheno} !<br>Semaine %{{x}}<br>Nombre {pheno} %{{y}}<extra></extra>"
+        ))
+
+    # 3) Configuration de l'axe X pour 0,10,20,30,...
+    fig_vrsa.update_layout(
+        title=dict(
+            text=f"Évolution hebdomadaire du nombre de souches {pheno}",
+            font=dict(size=26, family="Arial Black")
+        ),
+        legend=dict(
+            font=dict(size=18, family="Arial Black"),
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        xaxis=dict(
+            title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black"),
+            tickmode="linear",
+            tick0=semaine_min,
+            dtick=10,
+            range=[semaine_min - 0.5, semaine_max + 0.5]
+        ),
+        yaxis=dict(
+            title=dict(text=f"Nombre de {pheno}", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black"),
+            rangemode="tozero"
+        ),
+        hovermode="x unified",
+        margin=dict(l=60, r=40, t=100, b=60),
+        height=600
+    )
+    return fig_vrsa
+
+
+def phenotype_trend_figure(df_ph: pd.DataFrame, pheno: str, ic_label: str = "Seuil IC 95 %",
+                           max_points: int | None = None) -> go.Figure:
+    """
+    Phénotype suivi en pourcentage (MRSA, Wild, Other, ...) : % du phénotype,
+    moyenne mobile, seuil IC et alertes.
+    max_points : active le rendu allégé au-delà de ce nombre de semaines.
+    """
+    semaine_min_mrsa = int(df_ph["Week"].min())
+
+    Scatter = scatter_class(df_ph, max_points)
+    df_line = thin_series(df_ph, "Pourcentage", max_points, keep=_outlier_mask(df_ph))
+    fig2 = go.Figure()
+    fig2.add_trace(Scatter(
+        x=df_line["Week"],
+        y=df_line["Pourcentage"],
+        mode="lines+markers",
+        name=f"% {pheno}",
+        line=dict(width=3, color="blue")
+    ))
+
+    if "Moyenne_mobile_8s" in df_ph.columns:
+        df_mm = thin_series(df_ph, "Moyenne_mobile_8s", max_points)
+        fig2.add_trace(Scatter(
+            x=df_mm["Week"],
+            y=df_mm["Moyenne_mobile_8s"],
+            mode="lines",
+            name="Moyenne mobile",
+            line=dict(dash="dash", color="orange")
+        ))
+    if "IC_sup" in df_ph.columns:
+        df_ic = thin_series(df_ph, "IC_sup", max_points)
+        fig2.add_trace(Scatter(
+            x=df_ic["Week"],
+            y=df_ic["IC_sup"],
+            mode="lines",
+            name=ic_label,
+            line=dict(dash="dot", color="gray")
+        ))
+    if "OUTLIER" in df_ph.columns:
+        outliers = df_ph[df_ph["OUTLIER"] == True]
+        fig2.add_trace(Scatter(
+            x=outliers["Week"],
+            y=outliers["Pourcentage"],
+            mode="markers",
+            name="🔴 Alerte",
+            marker=dict(color="red", size=10)
+        ))
+
+    fig2.update_layout(
+        title=dict(text=f"Évolution du phénotype {pheno}", font=dict(size=24, family="Arial Black")),
+        legend=dict(font=dict(size=20, family="Arial Black")),
+        xaxis=dict(
+            title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black"),
+            tickmode="linear",
+            tick0=semaine_min_mrsa,
+            dtick=10
+        ),
+        yaxis=dict(
+            title=dict(text=f"% {pheno}", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        hovermode="x unified"
+    )
+    return fig2
+
+
+# --------------------------------------------------
+# 5) Alertes par service
+# --------------------------------------------------
+def service_alert_figure(df_series: pd.DataFrame, service: str, abx: str,
+                         max_points: int | None = None) -> go.Figure:
+    """
+    Nombre hebdomadaire de R d'un service pour un antibiotique, nombre attendu
+    (ligne de base du service) et seuil d'alerte ; semaines en alerte en rouge.
+    """
+    Scatter = scatter_class(df_series, max_points)
+    df_line = thin_series(df_series, "Nb_R", max_points, keep=_outlier_mask(df_series))
+    fig = go.Figure()
+    fig.add_trace(Scatter(
+        x=df_line["Week"],
+        y=df_line["Nb_R"],
+        mode="lines+markers",
+        name="Nombre de R",
+        line=dict(width=3),
+        marker=dict(color="blue"),
+        customdata=df_line["Nb_testes"],
+        hovertemplate="Semaine %{x}<br>%{y} R sur %{customdata} testés<extra></extra>"
+    ))
+    for col, name, dash, color in (("Attendu", "Attendu", "dash", "orange"), ("Seuil", "Seuil d'alerte", "dot", "gray")):
+        df_ref = thin_series(df_series, col, max_points)
+        fig.add_trace(Scatter(
+            x=df_ref["Week"],
+            y=df_ref[col],
+            mode="lines",
+            name=name,
+            line=dict(dash=dash, color=color)
+        ))
+    outliers = df_series[df_series["OUTLIER"] == True]
+    fig.add_trace(Scatter(
+        x=outliers["Week"],
+        y=outliers["Nb_R"],
+        mode="markers",
+        name="🔴 Alerte",
+        marker=dict(color="red", size=10)
+    ))
+
+    fig.update_layout(
+        title=dict(text=f"{abx} : résistants dans le service {service}", font=dict(size=24, family="Arial Black")),
+        legend=dict(font=dict(size=20, family="Arial Black")),
+        xaxis=dict(
+            title=dict(text="Semaine", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black")
+        ),
+        yaxis=dict(
+            title=dict(text="Nombre de R", font=dict(size=22, family="Arial Black")),
+            tickfont=dict(size=18, family="Arial Black"),
+            rangemode="tozero"
+        ),
+        hovermode="x unified"
+    )
+    return fig
+
+
+# --------------------------------------------------
+# 6) Co-résistances
+# --------------------------------------------------
+def co_resistance_figure(matrix: pd.DataFrame, counts: pd.DataFrame, title: str) -> go.Figure:
+    """
+    Carte de chaleur antibiotique (ligne) x antibiotique (colonne) des % de
+    co-résistance ; le survol donne aussi le nombre d'isolats R aux deux.
+    """
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=list(matrix.columns),
+        y=list(matrix.index),
+        customdata=counts.to_numpy(),
+        text=matrix.to_numpy(),
+        texttemplate="%{text:.0f}",
+        colorscale="Reds",
+        zmin=0,
+        zmax=100,
+        colorbar=dict(title="% R"),
+        hovertemplate="R à %{y}<br>%{z:.1f} % R à %{x}<br>(%{customdata} isolats)<extra></extra>"
+    ))
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=24, family="Arial Black")),
+        xaxis=dict(
+            title=dict(text="R à (colonne)", font=dict(size=20, family="Arial Black")),
+            tickfont=dict(size=16, family="Arial Black"),
+            side="bottom"
+        ),
+        yaxis=dict(
+            title=dict(text="Parmi les R à (ligne)", font=dict(size=20, family="Arial Black")),
+            tickfont=dict(size=16, family="Arial Black"),
+            autorange="reversed"
+        ),
+        height=650
+    )
+    return fig
+
+
+# --------------------------------------------------
+# 7) Séries prêtes à tracer et camemberts
+#    Utilisés par l'application et par le bulletin hebdomadaire (report.py).
+# --------------------------------------------------
+def prepare_trend_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Série en pourcentage : semaines numériques, lignes sans semaine ou sans % écartées, % arrondi."""
+    df = df.assign(Week=pd.to_numeric(df["Week"], errors="coerce"))
+    df = df.dropna(subset=["Week", "Pourcentage"])
+    return df.assign(Pourcentage=df["Pourcentage"].round(2))
+
+
+def prepare_count_frame(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Série en nombre de souches (colonne column) : semaines et nombres entiers."""
+    df = df.assign(Week=pd.to_numeric(df["Week"], errors="coerce").astype("Int64"))
+    df = df.dropna(subset=["Week", column])
+    return df.assign(**{column: df[column].astype(int)})
+
+
+def pie_figure(counts: pd.Series, names: str, title: str) -> go.Figure:
+    """Camembert des effectifs counts ({libellé: nombre}), libellés nommés names au survol."""
+    fig = go.Figure(go.Pie(
+        labels=list(counts.index),
+        values=counts.to_numpy(),
+        hovertemplate=f"{names}=%{{label}}<br>Nombre=%{{value}}<extra></extra>"
+    ))
+    fig.update_layout(title=dict(text=title), legend=dict(tracegroupgap=0))
+    return fig
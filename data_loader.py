@@ -0,0 +1,1198 @@
+# data_loader.py
+#
+# Couche d'accès aux données du tableau de bord.
+# Aucune dépendance à Streamlit : le module peut être utilisé depuis un
+# script, un notebook ou un service, et app.py y ajoute son propre cache.
+
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import unicodedata
+import uuid
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Dossier des données (variable SURVEILLANCE_DATA : jeu de données de test ou de banc d'essai)
+DATA_FOLDER = os.environ.get("SURVEILLANCE_DATA", "data")
+BACTERIES_FILENAME = "TOUS les bacteries a etudier.xlsx"
+EXPORT_FILENAME = "Export_StaphAureus_COMPLET.csv"
+
+# Magasin colonnaire dérivé de l'export (reconstruit à la demande, non versionné)
+STORE_FOLDER = os.path.join(DATA_FOLDER, ".store")
+STORE_FORMAT_VERSION = 2
+# Noms des instantanés de démarrage à chaud (voir section 10)
+ENCODED_SNAPSHOT = "encoded"
+BACTERIES_SNAPSHOT = "bacteries"
+
+# Valeurs possibles d'un résultat d'antibiogramme
+RESULT_VALUES = ("S", "I", "R", "F")
+# Identifiants d'un isolat (dédoublonnage des lots ajoutés) ; le site
+# n'intervient que dans les exports fusionnés de plusieurs sites
+KEY_COLUMNS = ("site", "id_demand", "num_specimen")
+# Identifiant du patient (dédoublonnage « premier isolat par patient »)
+PATIENT_COLUMN = "ipp_pastel"
+# Colonnes textuelles répétitives stockées en catégories
+CATEGORY_COLUMNS = ("site", "uf", "nature", "code_germe", "lib_germe")
+
+
+# --------------------------------------------------
+# 1) Signature des fichiers (clé de cache)
+# --------------------------------------------------
+def file_signature(path: str) -> tuple[str, int, int]:
+    """
+    Retourne (chemin absolu, mtime en ns, taille en octets) d'un fichier.
+    Deux signatures égales désignent la même version du fichier ;
+    un fichier absent a une signature (chemin, 0, -1).
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        st = os.stat(abs_path)
+    except FileNotFoundError:
+        return (abs_path, 0, -1)
+    return (abs_path, st.st_mtime_ns, st.st_size)
+
+
+def folder_signature(folder: str) -> tuple[tuple[str, int, int], ...]:
+    """
+    Signature d'un dossier : signatures de tous ses fichiers, triées par nom.
+    Elle change dès qu'un fichier est ajouté, supprimé ou modifié.
+    """
+    if not os.path.isdir(folder):
+        return ()
+    return tuple(
+        file_signature(os.path.join(folder, name))
+        for name in sorted(os.listdir(folder))
+        if os.path.isfile(os.path.join(folder, name))
+    )
+
+
+# --------------------------------------------------
+# 2) Utilitaires sur les noms de colonnes
+# --------------------------------------------------
+def normalize_column_name(col_name: str) -> str:
+    """
+    Enlève les accents et met en minuscules pour comparer aux noms attendus
+    (ex. 'Phénotype' -> 'phenotype', '  Phenotype ' -> 'phenotype').
+    """
+    nfkd = unicodedata.normalize('NFKD', col_name)
+    no_accent = "".join(c for c in nfkd if not unicodedata.combining(c))
+    return no_accent.strip().lower()
+
+
+def detect_phenotype_column(df: pd.DataFrame) -> str | None:
+    """
+    Parcourt toutes les colonnes de df et retourne le nom exact
+    de la colonne qui correspond à 'phenotype' (après normalisation),
+    ou None si aucune colonne n'est trouvée.
+    """
+    for col in df.columns:
+        if normalize_column_name(col) == "phenotype":
+            return col
+    return None
+
+
+def read_only(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copie superficielle d'un DataFrame partagé : les pages peuvent ajouter
+    ou remplacer des colonnes sans modifier l'objet mis en cache.
+    """
+    return df.copy(deep=False)
+
+
+# --------------------------------------------------
+# 3) Lecture des sources
+# --------------------------------------------------
+def read_bacteries(path: str) -> pd.DataFrame:
+    """Lit le classeur de référence des bactéries à surveiller."""
+    return pd.read_excel(path)
+
+
+def read_export(path: str) -> pd.DataFrame:
+    """
+    Lit l'export CSV des isolats, nettoie les noms de colonnes
+    et convertit 'semaine' en entier (Int64).
+    """
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    if 'semaine' in df.columns:
+        df['semaine'] = pd.to_numeric(df['semaine'], errors='coerce').astype('Int64')
+    return df
+
+
+def read_workbook(path: str) -> pd.DataFrame:
+    """Lit un classeur d'analyse hebdomadaire (pct*_analyse.xlsx, MRSA_analyse.xlsx, ...)."""
+    return pd.read_excel(path)
+
+
+# --------------------------------------------------
+# 4) Découverte des classeurs d'analyse
+# --------------------------------------------------
+def discover_antibiotiques(folder: str = DATA_FOLDER) -> dict[str, str]:
+    """
+    Associe un nom d'antibiotique (ex. 'Oxacillin_analyse_2024')
+    au chemin de son classeur pct*_analyse.xlsx.
+    """
+    antibiotiques = {}
+    if not os.path.isdir(folder):
+        return antibiotiques
+    for file in sorted(os.listdir(folder)):
+        if file.startswith("pct") and file.endswith(".xlsx"):
+            abx_name = (
+                file.replace("pctR_", "")
+                    .replace("pct_R_", "")
+                    .replace("pct", "")
+                    .replace(".xlsx", "")
+                    .capitalize()
+            )
+            antibiotiques[abx_name] = os.path.join(folder, file)
+    return antibiotiques
+
+
+def discover_phenotypes(folder: str = DATA_FOLDER,
+                        labels: list[str] | tuple[str, ...] = ("MRSA", "VRSA", "Wild", "Other")) -> dict[str, str]:
+    """
+    Chemins vers les fichiers de phénotypes (<phénotype>_analyse.xlsx)
+    (pour VRSA, le classeur donne surtout le nombre de souches par semaine).
+    """
+    return {pheno: os.path.join(folder, f"{pheno}_analyse.xlsx") for pheno in labels}
+
+
+# --------------------------------------------------
+# 5) Magasin colonnaire de l'export (Arrow IPC, lu par memory-mapping)
+#    Le CSV est converti une fois en fichier Arrow typé : catégories pour
+#    'uf', 'code_germe' et les résultats S/I/R, entier pour 'semaine'.
+#    Les lectures ne chargent que les colonnes demandées et s'appuient sur
+#    le cache de pages du système, partagé entre les processus.
+# --------------------------------------------------
+def detect_result_columns(df: pd.DataFrame) -> list[str]:
+    """
+    Retourne les colonnes de résultats d'antibiogramme : colonnes non vides
+    dont toutes les valeurs renseignées appartiennent à RESULT_VALUES.
+    """
+    result_cols = []
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS or col == "semaine":
+            continue
+        uniques = set(df[col].dropna().astype(str).str.strip().unique())
+        if uniques and uniques <= set(RESULT_VALUES):
+            result_cols.append(col)
+    return result_cols
+
+
+def store_paths(source_path: str, store_folder: str = STORE_FOLDER) -> tuple[str, str]:
+    """Chemins (fichier Arrow de base, manifeste JSON) du magasin associé à un export."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return (
+        os.path.join(store_folder, f"{stem}.arrow"),
+        os.path.join(store_folder, f"{stem}.json"),
+    )
+
+
+def state_path(source_path: str, store_folder: str = STORE_FOLDER) -> str:
+    """Chemin de l'état agrégé persistant (comptages hebdomadaires) d'un export."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(store_folder, f"{stem}.state.npz")
+
+
+def typed_export(df: pd.DataFrame, result_cols: list[str] | None = None) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Convertit un export brut (tel que retourné par read_export) en types compacts.
+    Retourne le DataFrame typé et la liste des colonnes de résultats
+    (détectées si result_cols n'est pas fourni).
+    """
+    if result_cols is None:
+        result_cols = detect_result_columns(df)
+    typed = {}
+    for col in df.columns:
+        if col == "semaine":
+            typed[col] = df[col].astype("Int32")
+        elif col in result_cols:
+            typed[col] = pd.Categorical(
+                df[col].astype("string").str.strip(), categories=list(RESULT_VALUES)
+            )
+        elif col in CATEGORY_COLUMNS:
+            typed[col] = df[col].astype("category")
+        else:
+            typed[col] = df[col].astype("string")
+    return pd.DataFrame(typed), result_cols
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    Empreintes (uint64) des identifiants d'isolat (KEY_COLUMNS) de chaque ligne,
+    utilisées pour dédoublonner les lots ajoutés au magasin.
+    """
+    key_cols = [c for c in KEY_COLUMNS if c in df.columns]
+    keys = df[key_cols].astype("string").fillna("")
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64)
+
+
+def read_manifest(manifest_path: str) -> dict | None:
+    """Lit le manifeste d'un magasin, ou None s'il est absent ou illisible."""
+    try:
+        with open(manifest_path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(manifest_path: str, manifest: dict) -> None:
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _write_part(table: pa.Table, keys: np.ndarray, arrow_path: str) -> None:
+    """Écrit une partie du magasin (fichier Arrow + empreintes triées), atomiquement."""
+    feather.write_feather(table, arrow_path + ".tmp", compression="uncompressed")
+    os.replace(arrow_path + ".tmp", arrow_path)
+    with open(arrow_path + ".keys.tmp", "wb") as fh:
+        np.save(fh, np.sort(keys))
+    os.replace(arrow_path + ".keys.tmp", arrow_path + ".keys.npy")
+
+
+def build_export_store(source_path: str, store_folder: str = STORE_FOLDER) -> dict:
+    """
+    Convertit l'export CSV en fichier Arrow typé et écrit son manifeste
+    (signature du CSV source, colonnes, colonnes de résultats, nombre de lignes,
+    parties du magasin et jeton de génération, renouvelé à chaque écriture).
+    L'écriture passe par un fichier temporaire puis un renommage atomique ;
+    les parties ajoutées auparavant par append_export_batch sont supprimées,
+    le CSV étant la source de référence.
+    """
+    os.makedirs(store_folder, exist_ok=True)
+    arrow_path, manifest_path = store_paths(source_path, store_folder)
+    for old_part in (read_manifest(manifest_path) or {}).get("parts", [])[1:]:
+        for path in (os.path.join(store_folder, old_part["file"]),
+                     os.path.join(store_folder, old_part["file"]) + ".keys.npy"):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    df, result_cols = typed_export(read_export(source_path))
+    _write_part(pa.Table.from_pandas(df, preserve_index=False), row_keys(df), arrow_path)
+
+    manifest = {
+        "format": STORE_FORMAT_VERSION,
+        "source": list(file_signature(source_path)),
+        "columns": list(df.columns),
+        "result_columns": result_cols,
+        "phenotype_column": detect_phenotype_column(df),
+        "rows": len(df),
+        "parts": [{"file": os.path.basename(arrow_path), "rows": len(df)}],
+        "generation": uuid.uuid4().hex,
+    }
+    _write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def ensure_export_store(source_path: str, store_folder: str = STORE_FOLDER) -> dict:
+    """
+    Retourne le manifeste du magasin, en le reconstruisant si le CSV source
+    a changé depuis la dernière conversion (ou si le format a évolué).
+    """
+    arrow_path, manifest_path = store_paths(source_path, store_folder)
+    manifest = read_manifest(manifest_path)
+    if (
+        manifest is None
+        or manifest.get("format") != STORE_FORMAT_VERSION
+        or tuple(manifest.get("source", ())) != file_signature(source_path)
+        or not all(os.path.isfile(os.path.join(store_folder, part["file"]))
+                   for part in manifest.get("parts", [{"file": os.path.basename(arrow_path)}]))
+    ):
+        manifest = build_export_store(source_path, store_folder)
+    return manifest
+
+
+def load_export(
+    source_path: str,
+    columns: list[str] | None = None,
+    store_folder: str = STORE_FOLDER,
+) -> pd.DataFrame:
+    """
+    Lit l'export depuis son magasin colonnaire, limité aux colonnes demandées
+    (toutes si columns est None). Les colonnes absentes sont ignorées.
+    """
+    manifest = ensure_export_store(source_path, store_folder)
+    if columns is not None:
+        columns = [c for c in columns if c in manifest["columns"]]
+    tables = [
+        feather.read_table(os.path.join(store_folder, part["file"]), columns=columns, memory_map=True)
+        for part in manifest["parts"]
+    ]
+    return pa.concat_tables(tables).to_pandas()
+
+
+def load_export_rows(
+    source_path: str,
+    rows: np.ndarray,
+    columns: list[str] | None = None,
+    store_folder: str = STORE_FOLDER,
+) -> pd.DataFrame:
+    """
+    Lignes de rang rows du magasin (voir EncodedExport.rows), dans cet ordre,
+    limitées aux colonnes demandées : seules les parties qui les contiennent
+    sont ouvertes, et seules ces lignes sont converties.
+    """
+    manifest = ensure_export_store(source_path, store_folder)
+    if columns is not None:
+        columns = [c for c in columns if c in manifest["columns"]]
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.cumsum([0] + [part["rows"] for part in manifest["parts"]])
+    which = np.searchsorted(starts, rows, side="right") - 1
+    tables, order = [], []
+    for i in np.unique(which) if len(rows) else [0]:
+        in_part = np.flatnonzero(which == i)
+        part = manifest["parts"][i]
+        table = feather.read_table(os.path.join(store_folder, part["file"]), columns=columns, memory_map=True)
+        tables.append(table.take(pa.array(rows[in_part] - starts[i])))
+        order.append(in_part)
+    df = pa.concat_tables(tables).to_pandas()
+    return df.iloc[np.argsort(np.concatenate(order), kind="stable")].reset_index(drop=True)
+
+
+# --------------------------------------------------
+# 6) Ajout incrémental d'un lot hebdomadaire
+#    Chaque lot devient une nouvelle partie du magasin ; les lignes déjà
+#    présentes (même id_demand / num_specimen) sont écartées par recherche
+#    dichotomique dans les empreintes triées des parties existantes.
+#    Le coût est proportionnel au lot, pas à l'historique.
+# --------------------------------------------------
+def _known_keys_mask(keys: np.ndarray, manifest: dict, store_folder: str) -> np.ndarray:
+    """Masque des empreintes déjà présentes dans une partie du magasin."""
+    known = np.zeros(len(keys), dtype=bool)
+    for part in manifest["parts"]:
+        part_keys = np.load(os.path.join(store_folder, part["file"]) + ".keys.npy", mmap_mode="r")
+        if len(part_keys) == 0:
+            continue
+        pos = np.searchsorted(part_keys, keys)
+        pos = np.minimum(pos, len(part_keys) - 1)
+        known |= part_keys[pos] == keys
+    return known
+
+
+def append_export_batch(
+    source_path: str,
+    batch: pd.DataFrame,
+    store_folder: str = STORE_FOLDER,
+) -> tuple[dict, pd.DataFrame]:
+    """
+    Ajoute un lot (au format de read_export) au magasin de l'export :
+    dédoublonnage sur KEY_COLUMNS, écriture d'une nouvelle partie Arrow,
+    ajout des lignes en fin du CSV source et mise à jour du manifeste.
+    Retourne (manifeste, lignes réellement ajoutées, typées).
+    """
+    manifest = ensure_export_store(source_path, store_folder)
+    arrow_path, manifest_path = store_paths(source_path, store_folder)
+
+    batch = batch.reindex(columns=manifest["columns"])
+    keys = row_keys(batch)
+    keep = ~pd.Series(keys).duplicated().to_numpy() & ~_known_keys_mask(keys, manifest, store_folder)
+    new_rows, _ = typed_export(batch[keep].reset_index(drop=True), manifest["result_columns"])
+    if new_rows.empty:
+        return manifest, new_rows
+
+    # Nouvelle partie, au schéma de la partie de base
+    schema = pa.ipc.open_file(pa.memory_map(arrow_path)).schema
+    part_file = f"{os.path.splitext(os.path.basename(arrow_path))[0]}.part-{len(manifest['parts']):05d}.arrow"
+    table = pa.Table.from_pandas(new_rows, schema=schema, preserve_index=False)
+    _write_part(table, keys[keep], os.path.join(store_folder, part_file))
+
+    # Le CSV reste la source de référence : on y ajoute les mêmes lignes
+    # (en conservant ses fins de ligne, CRLF ou LF)
+    with open(source_path, "rb+") as fh:
+        fh.seek(0, os.SEEK_END)
+        fh.seek(max(fh.tell() - 2, 0))
+        tail = fh.read()
+        newline = "\r\n" if tail.endswith(b"\r\n") else "\n"
+        if tail and not tail.endswith(b"\n"):
+            fh.write(newline.encode())
+    batch[keep].to_csv(source_path, mode="a", header=False, index=False, lineterminator=newline)
+
+    manifest = dict(manifest)
+    manifest["source"] = list(file_signature(source_path))
+    manifest["rows"] += len(new_rows)
+    manifest["parts"] = manifest["parts"] + [{"file": part_file, "rows": len(new_rows)}]
+    manifest["generation"] = uuid.uuid4().hex
+    _write_manifest(manifest_path, manifest)
+    return manifest, new_rows
+
+
+# --------------------------------------------------
+# 7) État agrégé persistant (comptages hebdomadaires)
+#    Stocké à côté du magasin et rattaché à sa génération : un état dont la
+#    génération ne correspond plus au manifeste est ignoré.
+# --------------------------------------------------
+def write_state(source_path: str, state: dict[str, np.ndarray], generation: str,
+                store_folder: str = STORE_FOLDER) -> None:
+    """Enregistre l'état agrégé (tableaux NumPy) pour la génération donnée."""
+    path = state_path(source_path, store_folder)
+    with open(path + ".tmp", "wb") as fh:
+        np.savez(fh, generation=np.array(generation), **state)
+    os.replace(path + ".tmp", path)
+
+
+def read_state(source_path: str, generation: str,
+               store_folder: str = STORE_FOLDER) -> dict[str, np.ndarray] | None:
+    """Lit l'état agrégé s'il correspond à la génération donnée, sinon None."""
+    try:
+        with np.load(state_path(source_path, store_folder)) as data:
+            if str(data["generation"]) != generation:
+                return None
+            return {name: data[name] for name in data.files if name != "generation"}
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+# --------------------------------------------------
+# 8) Classeurs d'analyse consolidés
+#    Tous les classeurs (antibiotiques et phénotypes) sont lus en parallèle
+#    et normalisés en une seule table longue, enregistrée comme instantané
+#    Arrow. L'instantané n'est reconstruit que si un classeur change, et
+#    seuls les classeurs modifiés sont alors relus.
+# --------------------------------------------------
+SERIES_COLUMNS = ["Indicateur", "Famille", "Week", "Nombre", "Total", "Pourcentage",
+                  "Moyenne_mobile_8s", "Ecart_type_8s", "IC_sup", "IC_inf", "OUTLIER"]
+WORKBOOKS_SNAPSHOT = "workbooks"
+
+
+def normalize_workbook(df: pd.DataFrame, indicator: str, family: str) -> pd.DataFrame:
+    """
+    Met un classeur d'analyse au format long : 'Week'/'Semaine' -> 'Week',
+    colonne d'effectif (ex. 'MRSA') -> 'Nombre', colonnes absentes à NaN.
+    Lève ValueError si la semaine ou la valeur principale manque.
+    """
+    week_col = "Week" if "Week" in df.columns else "Semaine"
+    if week_col not in df.columns:
+        raise ValueError("colonne 'Week' ou 'Semaine' absente")
+    if "Pourcentage" not in df.columns and indicator not in df.columns:
+        raise ValueError(f"colonnes '{week_col}' et 'Pourcentage' attendues")
+
+    out = pd.DataFrame({"Week": pd.to_numeric(df[week_col], errors="coerce")})
+    out["Nombre"] = pd.to_numeric(df[indicator], errors="coerce") if indicator in df.columns else np.nan
+    for col in SERIES_COLUMNS[4:]:
+        out[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else np.nan
+    out["OUTLIER"] = (df["OUTLIER"] == True) if "OUTLIER" in df.columns else False
+    out = out.dropna(subset=["Week"])
+    out.insert(0, "Famille", family)
+    out.insert(0, "Indicateur", indicator)
+    return out[SERIES_COLUMNS].reset_index(drop=True)
+
+
+def _read_normalized(item: tuple[str, str, str]) -> tuple[str, pd.DataFrame | None, str | None]:
+    indicator, family, path = item
+    try:
+        return indicator, normalize_workbook(read_workbook(path), indicator, family), None
+    except (OSError, ValueError, KeyError) as exc:
+        return indicator, None, f"{os.path.basename(path)} : {exc}"
+
+
+def load_workbook_series(
+    antibiotiques: dict[str, str],
+    phenotypes: dict[str, str],
+    store_folder: str = STORE_FOLDER,
+    max_workers: int = 8,
+    processes: bool = False,
+) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Table longue de toutes les séries des classeurs d'analyse
+    (colonnes SERIES_COLUMNS ; Famille = 'antibiotique' ou 'phenotype'),
+    et dictionnaire {indicateur: message} des classeurs illisibles ou absents.
+    Les classeurs sont lus par un pool de threads, ou de processus si
+    processes=True (openpyxl étant en pur Python, seuls les processus
+    exploitent plusieurs cœurs).
+    """
+    sources = [(abx, "antibiotique", path) for abx, path in antibiotiques.items()]
+    sources += [(pheno, "phenotype", path) for pheno, path in phenotypes.items()]
+    signatures = {indicator: list(file_signature(path)) for indicator, _, path in sources}
+
+    snapshot_path = os.path.join(store_folder, f"{WORKBOOKS_SNAPSHOT}.arrow")
+    manifest_path = os.path.join(store_folder, f"{WORKBOOKS_SNAPSHOT}.json")
+    manifest = read_manifest(manifest_path) or {}
+    if manifest.get("signatures") == signatures and os.path.isfile(snapshot_path):
+        table = feather.read_table(snapshot_path, memory_map=True)
+        return table.to_pandas(), manifest.get("errors", {})
+
+    # On reprend les séries inchangées de l'instantané précédent
+    previous = {}
+    old_signatures = manifest.get("signatures", {})
+    if os.path.isfile(snapshot_path):
+        old = feather.read_table(snapshot_path).to_pandas()
+        previous = {
+            indicator: frame for indicator, frame in old.groupby("Indicateur", sort=False)
+            if old_signatures.get(indicator) == signatures.get(indicator)
+        }
+
+    frames, errors = {}, {}
+    to_read = []
+    for indicator, family, path in sources:
+        if indicator in previous:
+            frames[indicator] = previous[indicator]
+        elif signatures[indicator][2] < 0:
+            errors[indicator] = f"Impossible de trouver le fichier `{path}`."
+        else:
+            to_read.append((indicator, family, path))
+    executor = ProcessPoolExecutor if processes and len(to_read) > 1 else ThreadPoolExecutor
+    with executor(max_workers=max(1, min(max_workers, len(to_read)))) as pool:
+        for indicator, frame, error in pool.map(_read_normalized, to_read):
+            if frame is None:
+                errors[indicator] = error
+            else:
+                frames[indicator] = frame
+
+    ordered = [frames[ind] for ind, _, _ in sources if ind in frames]
+    series = pd.concat(ordered, ignore_index=True) if ordered else pd.DataFrame(columns=SERIES_COLUMNS)
+    os.makedirs(store_folder, exist_ok=True)
+    feather.write_feather(pa.Table.from_pandas(series, preserve_index=False),
+                          snapshot_path + ".tmp", compression="uncompressed")
+    os.replace(snapshot_path + ".tmp", snapshot_path)
+    _write_manifest(manifest_path, {"signatures": signatures, "errors": errors})
+    return series, errors
+
+
+# --------------------------------------------------
+# 9) Modèle encodé des isolats
+#    Ce dont les calculs ont besoin, sans chaîne de caractères : semaine et
+#    service en entiers, résultats en matrice uint8 (isolats x antibiotiques)
+#    et masques R compactés bit à bit (8 isolats par octet). Les identifiants
+#    ne sont pas chargés ; load_export les lit à la demande.
+#    Le modèle chargé depuis le magasin est trié par (semaine, service) :
+#    les isolats d'une plage de semaines, ou d'un service pendant une
+#    semaine, forment une tranche contiguë, retrouvée par recherche
+#    dichotomique dans un index des débuts de semaine (week_offsets). Le
+#    coût d'une sélection ne dépend pas de la longueur de l'historique.
+# --------------------------------------------------
+class EncodedExport:
+    """
+    weeks          : semaine de chaque isolat (int32, -1 si absente)
+    uf_codes       : code du service (int32, -1 si absent), libellés uf_labels
+    codes          : résultats, matrice uint8 n x antibiotiques
+                     (0 = non renseigné, 1 + indice dans RESULT_VALUES)
+    result_columns : noms des antibiotiques (colonnes de codes)
+    phenotypes     : codes du phénotype lu dans l'export (int32, -1 si absent)
+                     et libellés phenotype_labels, ou None s'il est à déduire
+    r_bits         : masques R compactés, antibiotiques x ceil(n / 8) octets
+                     (calculés depuis codes s'ils ne sont pas fournis)
+    rows           : rang de chaque isolat dans le magasin (int64) si le modèle
+                     est trié par (semaine, service), None s'il suit l'ordre
+                     des lignes lues
+    week_offsets   : modèle trié : début de chaque semaine first_week.. dans
+                     les tableaux (le dernier élément est n)
+    """
+
+    def __init__(self, weeks, uf_codes, uf_labels, codes, result_columns,
+                 phenotypes=None, phenotype_labels=None, r_bits=None, rows=None):
+        self.weeks = np.asarray(weeks, dtype=np.int32)
+        self.uf_codes = np.asarray(uf_codes, dtype=np.int32)
+        self.uf_labels = list(uf_labels)
+        self.codes = np.asarray(codes, dtype=np.uint8).reshape(len(self.weeks), len(result_columns))
+        self.result_columns = list(result_columns)
+        self.phenotypes = None if phenotypes is None else np.asarray(phenotypes, dtype=np.int32)
+        self.phenotype_labels = None if phenotype_labels is None else list(phenotype_labels)
+        if r_bits is None:
+            r_code = RESULT_VALUES.index("R") + 1
+            r_bits = np.packbits(self.codes.T == r_code, axis=1)
+        self.r_bits = np.asarray(r_bits, dtype=np.uint8)
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self.first_week = 0
+        self.week_offsets = None
+        if self.rows is not None:
+            # les semaines absentes (-1) sont en tête : l'index commence à la première semaine datée
+            start = int(np.searchsorted(self.weeks, 0))
+            if start < len(self.weeks):
+                self.first_week = int(self.weeks[start])
+                bounds = np.arange(self.first_week, int(self.weeks[-1]) + 2)
+                self.week_offsets = np.searchsorted(self.weeks, bounds).astype(np.int64)
+            else:
+                self.week_offsets = np.array([start], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.weeks)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.weeks, self.uf_codes, self.codes, self.r_bits]
+        if self.phenotypes is not None:
+            arrays.append(self.phenotypes)
+        return sum(a.nbytes for a in arrays)
+
+    def unpack(self, bits: np.ndarray) -> np.ndarray:
+        """Masque booléen (longueur n) d'un masque compacté."""
+        return np.unpackbits(bits, count=len(self)).view(bool)
+
+    def column(self, name: str) -> int:
+        return self.result_columns.index(name)
+
+    def uf_code(self, service: str) -> int:
+        """Code d'un service (-2 s'il est inconnu : aucun isolat)."""
+        return self.uf_labels.index(service) if service in self.uf_labels else -2
+
+    @property
+    def is_sorted(self) -> bool:
+        return self.rows is not None
+
+    def sorted_by_week_service(self) -> "EncodedExport":
+        """
+        Modèle trié par (semaine, service) ; à égalité, l'ordre des lignes est
+        conservé (tri stable). Retourne le modèle lui-même s'il est déjà trié.
+        """
+        if self.is_sorted:
+            return self
+        order = np.lexsort((self.uf_codes, self.weeks))
+        return EncodedExport(
+            self.weeks[order], self.uf_codes[order], self.uf_labels, self.codes[order],
+            self.result_columns,
+            None if self.phenotypes is None else self.phenotypes[order],
+            self.phenotype_labels, rows=order,
+        )
+
+    def extend_sorted(self, batch: "EncodedExport", first_row: int) -> "EncodedExport":
+        """
+        Modèle trié augmenté d'un lot (lignes first_row.. du magasin, dans
+        l'ordre) : le lot seul est trié, puis ses isolats sont insérés à leur
+        place par recherche dichotomique ; l'historique n'est pas retrié.
+        Même résultat que le tri de l'ensemble.
+        """
+        n, k = len(self), len(batch)
+        uf_labels, (uf_codes, batch_uf) = _unify_codes([self.uf_labels, batch.uf_labels],
+                                                       [self.uf_codes, batch.uf_codes])
+        n_uf = len(uf_labels) + 1
+        batch_order = np.lexsort((batch_uf, batch.weeks))
+        key = self.weeks.astype(np.int64) * n_uf + uf_codes + 1  # croissante sur le modèle trié
+        batch_key = (batch.weeks.astype(np.int64) * n_uf + batch_uf + 1)[batch_order]
+        # à clé égale, le lot suit l'historique (rangs plus grands dans le magasin)
+        batch_at = np.searchsorted(key, batch_key, side="right") + np.arange(k)
+        from_history = np.ones(n + k, dtype=bool)
+        from_history[batch_at] = False
+
+        def place(history: np.ndarray, added: np.ndarray) -> np.ndarray:
+            out = np.empty((n + k,) + history.shape[1:], dtype=history.dtype)
+            out[from_history] = history
+            out[batch_at] = added[batch_order]
+            return out
+
+        phenotypes = labels = None
+        if self.phenotypes is not None and batch.phenotypes is not None:
+            labels, (old, new) = _unify_codes([self.phenotype_labels, batch.phenotype_labels],
+                                              [self.phenotypes, batch.phenotypes])
+            phenotypes = place(old, new)
+        return EncodedExport(
+            place(self.weeks, batch.weeks), place(uf_codes, batch_uf), uf_labels,
+            place(self.codes, batch.codes), self.result_columns, phenotypes, labels,
+            rows=place(self.rows, first_row + np.arange(k, dtype=np.int64)),
+        )
+
+    def week_slice(self, week_min: int, week_max: int) -> slice:
+        """Tranche des isolats des semaines week_min..week_max (modèle trié)."""
+        if not self.is_sorted:
+            raise ValueError("Modèle non trié : voir sorted_by_week_service.")
+        last = len(self.week_offsets) - 1
+        lo = min(max(week_min - self.first_week, 0), last)
+        hi = min(max(week_max + 1 - self.first_week, lo), last)
+        return slice(int(self.week_offsets[lo]), int(self.week_offsets[hi]))
+
+    def week_service_slice(self, week: int, service: str) -> slice:
+        """Tranche des isolats d'un service pendant une semaine (modèle trié)."""
+        rows = self.week_slice(week, week)
+        uf_codes = self.uf_codes[rows]
+        code = self.uf_code(service)
+        return slice(rows.start + int(np.searchsorted(uf_codes, code, side="left")),
+                     rows.start + int(np.searchsorted(uf_codes, code, side="right")))
+
+    def selection_slices(self, week_min: int, week_max: int, service: str | None = None) -> list[slice]:
+        """
+        Tranches des isolats des semaines week_min..week_max, limités au service
+        s'il est donné (une tranche par semaine) ; modèle trié.
+        """
+        if service is None:
+            return [self.week_slice(week_min, week_max)]
+        first = max(week_min, self.first_week)
+        last = min(week_max, self.first_week + len(self.week_offsets) - 2)
+        slices = [self.week_service_slice(week, service) for week in range(first, last + 1)]
+        return [rows for rows in slices if rows.stop > rows.start]
+
+    def r_slice(self, rows: slice) -> np.ndarray:
+        """Masques R décompactés (antibiotiques x isolats, booléens) d'une tranche."""
+        first = rows.start // 8
+        offset = rows.start - first * 8
+        bits = self.r_bits[:, first:(rows.stop + 7) // 8]
+        return np.unpackbits(bits, axis=1, count=offset + rows.stop - rows.start)[:, offset:].view(bool)
+
+    def subset(self, mask: np.ndarray) -> "EncodedExport":
+        """Isolats retenus par le masque booléen mask (mêmes libellés, même ordre)."""
+        return EncodedExport(
+            self.weeks[mask], self.uf_codes[mask], self.uf_labels, self.codes[mask],
+            self.result_columns,
+            None if self.phenotypes is None else self.phenotypes[mask],
+            self.phenotype_labels,
+            rows=None if self.rows is None else self.rows[mask],
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, result_columns: list[str],
+                   phenotype_column: str | None = None) -> "EncodedExport":
+        """Encode un export (brut ou typé) ; les colonnes de résultats absentes sont ignorées."""
+        result_columns = [c for c in result_columns if c in df.columns]
+        weeks = pd.to_numeric(df["semaine"], errors="coerce").fillna(-1).to_numpy(dtype=np.int32)
+        uf = pd.Categorical(df["uf"]) if "uf" in df.columns else pd.Categorical([None] * len(df))
+        codes = np.empty((len(df), len(result_columns)), dtype=np.uint8)
+        for j, col in enumerate(result_columns):
+            values = df[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("string").str.strip()
+            codes[:, j] = pd.Categorical(values, categories=list(RESULT_VALUES)).codes + 1
+        phenotypes = labels = None
+        if phenotype_column and phenotype_column in df.columns:
+            pheno = pd.Categorical(df[phenotype_column])
+            phenotypes, labels = pheno.codes, list(pheno.categories)
+        return cls(weeks, uf.codes, list(uf.categories), codes, result_columns, phenotypes, labels)
+
+    def to_arrays(self) -> tuple[dict[str, np.ndarray], dict]:
+        """Tableaux et libellés, pour write_snapshot."""
+        arrays = {"weeks": self.weeks, "uf_codes": self.uf_codes, "codes": self.codes, "r_bits": self.r_bits}
+        if self.phenotypes is not None:
+            arrays["phenotypes"] = self.phenotypes
+        if self.rows is not None:
+            arrays["rows"] = self.rows
+        meta = {
+            "uf_labels": self.uf_labels,
+            "result_columns": self.result_columns,
+            "phenotype_labels": self.phenotype_labels,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray], meta: dict) -> "EncodedExport":
+        """Inverse de to_arrays (les tableaux projetés en mémoire ne sont pas copiés)."""
+        return cls(
+            arrays["weeks"], arrays["uf_codes"], meta["uf_labels"], arrays["codes"],
+            meta["result_columns"], arrays.get("phenotypes"), meta["phenotype_labels"],
+            arrays["r_bits"], arrays.get("rows"),
+        )
+
+    @classmethod
+    def concat(cls, parts: list["EncodedExport"]) -> "EncodedExport":
+        """Assemble des parties encodées séparément (libellés de services unifiés)."""
+        uf_labels, uf_codes = _unify_codes([part.uf_labels for part in parts], [part.uf_codes for part in parts])
+        phenotypes = labels = None
+        if all(part.phenotypes is not None for part in parts):
+            labels, codes = _unify_codes([part.phenotype_labels for part in parts],
+                                         [part.phenotypes for part in parts])
+            phenotypes = np.concatenate(codes)
+        return cls(
+            np.concatenate([part.weeks for part in parts]),
+            np.concatenate(uf_codes),
+            uf_labels,
+            np.concatenate([part.codes for part in parts]),
+            parts[0].result_columns,
+            phenotypes,
+            labels,
+        )
+
+
+def _unify_codes(labels: list[list[str]], codes: list[np.ndarray]) -> tuple[list[str], list[np.ndarray]]:
+    """
+    Libellés de plusieurs parties réunis dans l'ordre d'apparition (ceux de la
+    première partie gardent leur code) et codes de chaque partie recodés ; -1 reste -1.
+    """
+    unified = list(dict.fromkeys(label for part in labels for label in part))
+    index = pd.Index(unified)
+    recoded = [
+        np.append(index.get_indexer(part_labels), -1).astype(np.int32)[part_codes]  # -1 -> dernier élément
+        for part_labels, part_codes in zip(labels, codes)
+    ]
+    return unified, recoded
+
+
+def load_encoded_export(source_path: str, store_folder: str = STORE_FOLDER) -> EncodedExport:
+    """
+    Modèle encodé de l'export, trié par (semaine, service). Il est relu
+    depuis l'instantané de la génération courante du magasin s'il existe
+    (voir section 10) ; sinon il est construit depuis le magasin colonnaire
+    (seules les colonnes semaine, uf, phénotype et résultats sont lues,
+    partie par partie), trié puis enregistré.
+    """
+    manifest = ensure_export_store(source_path, store_folder)
+    snapshot = read_snapshot(source_path, ENCODED_SNAPSHOT, manifest["generation"], store_folder)
+    if snapshot is not None and "rows" in snapshot[0]:
+        return EncodedExport.from_arrays(*snapshot)
+    parts = [encode_part(manifest, part, store_folder) for part in manifest["parts"]]
+    export = parts[0] if len(parts) == 1 else EncodedExport.concat(parts)
+    export = export.sorted_by_week_service()
+    if snapshot is not None:  # instantané antérieur au tri : remplacé
+        shutil.rmtree(snapshot_path(source_path, ENCODED_SNAPSHOT, manifest["generation"], store_folder),
+                      ignore_errors=True)
+    write_snapshot(source_path, ENCODED_SNAPSHOT, manifest["generation"], *export.to_arrays(),
+                   store_folder=store_folder)
+    return export
+
+
+def encode_part(manifest: dict, part: dict, store_folder: str = STORE_FOLDER) -> EncodedExport:
+    """Modèle encodé (non trié) d'une partie du magasin : colonnes semaine, uf, phénotype et résultats."""
+    result_cols = manifest["result_columns"]
+    pheno_col = manifest["phenotype_column"]
+    columns = [c for c in ["semaine", "uf", pheno_col] + result_cols if c and c in manifest["columns"]]
+    df = feather.read_table(
+        os.path.join(store_folder, part["file"]), columns=columns, memory_map=True
+    ).to_pandas()
+    return EncodedExport.from_frame(df, result_cols, pheno_col)
+
+
+def extend_encoded_snapshot(source_path: str, manifest: dict, previous_generation: str,
+                            batch: EncodedExport, store_folder: str = STORE_FOLDER) -> bool:
+    """
+    Après l'ajout d'une partie (batch : son modèle encodé), écrit l'instantané
+    du modèle encodé de la génération courante à partir de celui de la
+    génération précédente, sans relire ni réencoder l'historique. Retourne
+    False si cet instantané manque : il sera reconstruit à la première lecture.
+    """
+    snapshot = read_snapshot(source_path, ENCODED_SNAPSHOT, previous_generation, store_folder)
+    first_row = manifest["rows"] - len(batch)
+    if snapshot is None or "rows" not in snapshot[0] or len(snapshot[0]["weeks"]) != first_row:
+        return False
+    export = EncodedExport.from_arrays(*snapshot).extend_sorted(batch, first_row)
+    write_snapshot(source_path, ENCODED_SNAPSHOT, manifest["generation"], *export.to_arrays(),
+                   store_folder=store_folder)
+    return True
+
+
+def load_patient_codes(source_path: str, store_folder: str = STORE_FOLDER) -> np.ndarray | None:
+    """
+    Code entier du patient (PATIENT_COLUMN) de chaque isolat, dans l'ordre du
+    magasin (-1 si non renseigné ; EncodedExport.rows y renvoie), ou None si
+    l'export n'a pas cette colonne.
+    """
+    manifest = ensure_export_store(source_path, store_folder)
+    if PATIENT_COLUMN not in manifest["columns"]:
+        return None
+    tables = [
+        feather.read_table(os.path.join(store_folder, part["file"]), columns=[PATIENT_COLUMN], memory_map=True)
+        for part in manifest["parts"]
+    ]
+    codes, _ = pd.factorize(pa.concat_tables(tables).column(PATIENT_COLUMN).to_pandas())
+    return codes.astype(np.int32)
+
+
+# --------------------------------------------------
+# 10) Instantanés pour un démarrage à chaud
+#     Les tableaux NumPy dérivés d'une génération du magasin (modèle encodé,
+#     agrégats) sont enregistrés en fichiers .npy dans un dossier propre à
+#     cette génération, puis relus par projection en mémoire : un processus
+#     redémarré les retrouve sans relire ni recalculer quoi que ce soit.
+#     Les dossiers des générations précédentes sont supprimés à l'écriture.
+# --------------------------------------------------
+def snapshot_path(source_path: str, name: str, generation: str, store_folder: str = STORE_FOLDER) -> str:
+    """Dossier de l'instantané `name` d'une génération du magasin d'un export."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(store_folder, f"{stem}.{name}-{generation}")
+
+
+def write_snapshot(source_path: str, name: str, generation: str, arrays: dict[str, np.ndarray],
+                   meta: dict, store_folder: str = STORE_FOLDER) -> None:
+    """
+    Enregistre les tableaux (un .npy chacun) et leurs métadonnées JSON. Le
+    dossier est écrit sous un nom temporaire puis renommé : un lecteur ne
+    voit jamais d'instantané incomplet.
+    """
+    folder = snapshot_path(source_path, name, generation, store_folder)
+    if not os.path.isdir(folder):
+        tmp = f"{folder}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        for key, values in arrays.items():
+            np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(values))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(dict(meta, arrays=list(arrays)), fh, ensure_ascii=False)
+        try:
+            os.rename(tmp, folder)
+        except OSError:  # écrit entre-temps par un autre processus
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    prefix = os.path.basename(snapshot_path(source_path, name, "", store_folder))
+    for entry in os.listdir(store_folder):
+        if entry.startswith(prefix) and entry != os.path.basename(folder):
+            shutil.rmtree(os.path.join(store_folder, entry), ignore_errors=True)
+
+
+def read_snapshot(source_path: str, name: str, generation: str,
+                  store_folder: str = STORE_FOLDER) -> tuple[dict[str, np.ndarray], dict] | None:
+    """(tableaux projetés en mémoire, métadonnées) de l'instantané, ou None s'il manque."""
+    folder = snapshot_path(source_path, name, generation, store_folder)
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        arrays = {
+            key: np.load(os.path.join(folder, f"{key}.npy"), mmap_mode="r")
+            for key in meta.pop("arrays")
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays, meta
+
+
+def load_bacteries(path: str, store_folder: str = STORE_FOLDER) -> pd.DataFrame:
+    """
+    Classeur de référence des bactéries, relu depuis son instantané Arrow
+    tant que le classeur n'a pas changé (la lecture Excel est la plus lente).
+    """
+    snapshot = os.path.join(store_folder, f"{BACTERIES_SNAPSHOT}.arrow")
+    manifest_path = os.path.join(store_folder, f"{BACTERIES_SNAPSHOT}.json")
+    signature = list(file_signature(path))
+    if (read_manifest(manifest_path) or {}).get("signature") == signature and os.path.isfile(snapshot):
+        return feather.read_table(snapshot, memory_map=True).to_pandas()
+
+    df = read_bacteries(path)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, ValueError):  # colonnes de types mêlés : pas d'instantané
+        return df
+    os.makedirs(store_folder, exist_ok=True)
+    feather.write_feather(table, snapshot + ".tmp", compression="uncompressed")
+    os.replace(snapshot + ".tmp", snapshot)
+    _write_manifest(manifest_path, {"signature": signature})
+    return df
+
+
+# --------------------------------------------------
+# 11) Exports de plusieurs sites
+#     Chaque site produit un export au format légèrement différent
+#     (séparateur, encodage, en-têtes accentués ou espacés, 'Week' au lieu
+#     de 'semaine', libellés de résultats). EXPORT_SCHEMA décrit une fois
+#     pour toutes les colonnes attendues ; chaque fichier y est ramené, puis
+#     validé et converti colonne par colonne (opérations vectorisées). Les
+#     lignes rejetées sont retournées avec leur motif.
+#     La semaine de l'export est un numéro sans année (1..53, ou au-delà
+#     pour un historique de plusieurs années). Une semaine datée d'un site
+#     ('2024-W12', '12/2024') est ramenée à ce numéro à partir de l'année de
+#     la semaine 1 de l'export (reference_year) ; sans elle, elle est
+#     rejetée plutôt que confondue avec la semaine 12 d'une autre année.
+# --------------------------------------------------
+SITE_COLUMN = "site"
+DEFAULT_SITE = "local"  # site des lignes d'un export antérieur à la fusion
+
+# Colonne canonique : (type, obligatoire, autres noms rencontrés). Les
+# noms sont comparés après schema_key (sans accents, casse, espaces).
+EXPORT_SCHEMA = {
+    "id_demand": ("texte", True, ("id_demande", "iddemande", "num_demande", "demande")),
+    "ipp_pastel": ("texte", False, ("ipp", "num_ipp", "patient")),
+    "uf": ("texte", True, ("service", "unite_fonctionnelle", "code_uf")),
+    "num_specimen": ("texte", True, ("specimen", "num_prelevement", "prelevement")),
+    "semaine": ("semaine", True, ("week", "sem", "num_semaine", "semaine_prelevement")),
+    "nature": ("texte", False, ("nature_prelevement", "type_prelevement")),
+    "code_germe": ("texte", False, ("germe_code",)),
+    "lib_germe": ("texte", False, ("germe", "libelle_germe", "organisme")),
+}
+# Libellés de résultats rencontrés -> RESULT_VALUES
+RESULT_ALIASES = {"SENSIBLE": "S", "INTERMEDIAIRE": "I", "RESISTANT": "R", "SUSCEPTIBLE": "S",
+                  "INTERMEDIATE": "I", "RESISTANCE": "R", "SDD": "I"}
+REJECT_COLUMN = "motif_rejet"
+
+
+def schema_key(col_name: str) -> str:
+    """Clé de comparaison d'un en-tête : normalize_column_name, espaces et tirets -> '_'."""
+    return re.sub(r"[\s\-]+", "_", normalize_column_name(str(col_name)))
+
+
+def sniff_csv(path: str) -> tuple[str, str]:
+    """(encodage, séparateur) d'un export : UTF-8 sinon cp1252 ; ',', ';' ou tabulation."""
+    with open(path, "rb") as fh:
+        head = fh.read(1 << 16)
+    try:
+        text, encoding = head.decode("utf-8-sig"), "utf-8-sig"
+    except UnicodeDecodeError:
+        text, encoding = head.decode("cp1252", errors="replace"), "cp1252"
+    header = text.splitlines()[0] if text else ""
+    sep = max((",", ";", "\t"), key=header.count)
+    return encoding, sep
+
+
+def schema_mapping(columns, reference_columns: list[str]) -> dict[str, str]:
+    """
+    {en-tête du fichier: colonne canonique} : colonnes de EXPORT_SCHEMA (par
+    leurs noms et alias) et colonnes de l'export de référence (antibiotiques,
+    ...), reconnues à schema_key près. Les en-têtes inconnus sont absents.
+    """
+    targets = {schema_key(col): col for col in list(reference_columns) + [SITE_COLUMN]}
+    for col, (_, _, aliases) in EXPORT_SCHEMA.items():
+        for alias in (col,) + aliases:
+            targets[schema_key(alias)] = col
+    mapping = {}
+    for col in columns:
+        target = targets.get(schema_key(col))
+        if target is not None and target not in mapping.values():
+            mapping[col] = target
+    return mapping
+
+
+_PLAIN_WEEK = re.compile(r"^(?:SEMAINE|SEM|S|W)?\s*(\d{1,3})(?:\.0+)?$")
+_YEAR_WEEK = re.compile(r"^(\d{4})\s*[-/ ]?\s*(?:SEMAINE|SEM|S|W)?\s*(\d{1,2})$")
+_WEEK_YEAR = re.compile(r"^(?:SEMAINE|SEM|S|W)?\s*(\d{1,2})\s*[-/ ]\s*(\d{4})$")
+
+
+def parse_week(text: str, reference_year: int | None = None) -> tuple[int | None, str | None]:
+    """
+    (semaine de l'export, motif de rejet) d'une valeur de semaine :
+      '12', '12.0', 'S12', '104'  -> numéro tel quel (1 à 999) ;
+      '2024-W12', '2024-12', '202412', '12/2024', 'S12-2024' -> semaine ISO de l'année,
+        numérotée depuis la semaine 1 de reference_year (2025-W01 -> 53 si
+        reference_year vaut 2024, qui compte 52 semaines).
+    """
+    value = str(text).strip().upper()
+    match = _PLAIN_WEEK.match(value)
+    if match:
+        week = int(match.group(1))
+        return (week, None) if week >= 1 else (None, "semaine invalide")
+    match = _YEAR_WEEK.match(value)
+    year_week = (int(match.group(1)), int(match.group(2))) if match else None
+    match = _WEEK_YEAR.match(value)
+    if match:
+        year_week = (int(match.group(2)), int(match.group(1)))
+    if year_week is None:
+        return None, "semaine illisible"
+    year, week = year_week
+    try:
+        monday = date.fromisocalendar(year, week, 1)
+    except ValueError:
+        return None, f"semaine hors de 1-53 pour {year}"
+    if reference_year is None:
+        return None, "semaine datée sans année de référence (--year)"
+    week = (monday - date.fromisocalendar(reference_year, 1, 1)).days // 7 + 1
+    if week < 1:
+        return None, f"semaine antérieure à {reference_year}"
+    return week, None
+
+
+def normalize_site_export(
+    raw: pd.DataFrame,
+    site: str,
+    reference_columns: list[str],
+    result_columns: list[str],
+    reference_year: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Ramène un export brut (toutes colonnes en texte) au schéma de
+    l'export de référence ; reference_year : année de sa semaine 1 (voir
+    parse_week). Retourne :
+      - les lignes valides, au format de read_export, avec la colonne site ;
+      - les lignes rejetées (colonnes d'origine + REJECT_COLUMN) ;
+      - un bilan : colonnes reconnues, ignorées et manquantes, nombre de
+        résultats illisibles remis à vide.
+    Une ligne est rejetée s'il lui manque une colonne obligatoire de
+    EXPORT_SCHEMA ou si sa semaine est illisible ou ne peut être ramenée à
+    la numérotation de l'export.
+    """
+    mapping = schema_mapping(raw.columns, reference_columns)
+    df = raw[list(mapping)].rename(columns=mapping)
+    df = df.apply(lambda col: col.str.strip()).replace("", pd.NA)
+
+    reasons = pd.Series(pd.NA, index=df.index, dtype="string")
+    missing = []
+    for col, (kind, required, _) in EXPORT_SCHEMA.items():
+        if col not in df.columns:
+            if required:
+                missing.append(col)
+            continue
+        if kind == "semaine":
+            # conversion calculée sur les valeurs distinctes
+            parsed = {v: parse_week(v, reference_year) for v in df[col].dropna().unique()}
+            why = df[col].map({v: reason for v, (_, reason) in parsed.items()})
+            reasons = reasons.mask(reasons.isna() & why.notna(), why)
+            df[col] = pd.to_numeric(df[col].map({v: week for v, (week, _) in parsed.items()})).astype("Int64")
+        if required:
+            reasons = reasons.mask(reasons.isna() & df[col].isna(), f"{col} manquant")
+    if missing:
+        reasons[:] = f"colonnes absentes : {', '.join(missing)}"
+
+    bad_results = 0
+    for col in result_columns:
+        if col in df.columns:
+            # conversion calculée sur les valeurs distinctes ('Résistant' -> 'R')
+            labels = {v: normalize_column_name(v).upper() for v in df[col].dropna().unique()}
+            values = df[col].map({v: RESULT_ALIASES.get(k, k) for v, k in labels.items()})
+            invalid = values.notna() & ~values.isin(RESULT_VALUES)
+            bad_results += int(invalid.sum())
+            df[col] = values.where(~invalid)
+
+    if SITE_COLUMN in df.columns:  # export déjà multi-site : site du fichier par défaut
+        df[SITE_COLUMN] = df[SITE_COLUMN].fillna(site)
+    else:
+        df.insert(0, SITE_COLUMN, site)
+    rejected = reasons.notna()
+    rejects = raw[rejected.to_numpy()].assign(**{REJECT_COLUMN: reasons[rejected]})
+    report = {
+        "columns": len(mapping),
+        "ignored_columns": [col for col in raw.columns if col not in mapping],
+        "missing_columns": [col for col in reference_columns if col not in df.columns and col != SITE_COLUMN],
+        "invalid_results": bad_results,
+    }
+    return df[~rejected].reset_index(drop=True), rejects.reset_index(drop=True), report
+
+
+def read_site_export(
+    item: tuple[str, str, list[str], list[str], int | None],
+) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Lit et normalise l'export d'un site ; item = (site, chemin, colonnes,
+    colonnes de résultats et année de la semaine 1 de l'export de référence).
+    Le bilan de normalize_site_export est complété par le volume lu et la durée.
+    """
+    site, path, reference_columns, result_columns, reference_year = item
+    t0 = time.perf_counter()
+    encoding, sep = sniff_csv(path)
+    raw = pd.read_csv(path, sep=sep, encoding=encoding, dtype=str, keep_default_na=False)
+    rows, rejects, report = normalize_site_export(raw, site, reference_columns, result_columns, reference_year)
+    report.update({
+        "site": site,
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "rows": len(raw),
+        "accepted": len(rows),
+        "rejected": len(rejects),
+        "reasons": rejects[REJECT_COLUMN].value_counts().to_dict() if len(rejects) else {},
+        "seconds": time.perf_counter() - t0,
+    })
+    return rows, rejects, report
+
+
+def load_site_exports(
+    sources: list[tuple[str, str]],
+    reference_columns: list[str],
+    result_columns: list[str],
+    max_workers: int | None = None,
+    reference_year: int | None = None,
+) -> list[tuple[pd.DataFrame, pd.DataFrame, dict]]:
+    """
+    Lit les exports [(site, chemin), ...] par un pool de processus (lecture
+    CSV et normalisation se partagent alors les cœurs), dans l'ordre des
+    sources. Avec un seul fichier ou max_workers=1, la lecture reste dans le
+    processus courant.
+    """
+    items = [(site, path, list(reference_columns), list(result_columns), reference_year)
+             for site, path in sources]
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(items)))
+    if workers == 1:
+        return [read_site_export(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(read_site_export, items))
+
+
+def add_site_column(source_path: str, site: str = DEFAULT_SITE) -> bool:
+    """
+    Ajoute la colonne site (valeur site) en tête d'un export qui n'en a pas,
+    sans modifier les autres valeurs ; le fichier est remplacé atomiquement
+    et son magasin sera reconstruit. Retourne False si la colonne existait.
+    """
+    df = pd.read_csv(source_path, dtype=str, keep_default_na=False)
+    if SITE_COLUMN in df.columns.str.strip():
+        return False
+    with open(source_path, "rb") as fh:
+        newline = "\r\n" if b"\r\n" in fh.readline() else "\n"
+    df.insert(0, SITE_COLUMN, site)
+    df.to_csv(source_path + ".tmp", index=False, lineterminator=newline)
+    os.replace(source_path + ".tmp", source_path)
+    return True
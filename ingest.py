@@ -0,0 +1,286 @@
+# ingest.py
+#
+# Préparation des données hors de l'application :
+#   python ingest.py [--organism staph_aureus] build
+#       convertit l'export CSV de l'organisme en magasin colonnaire
+#       (data/.store/<organisme>/) lu par app.py et calcule l'état agrégé
+#       hebdomadaire ;
+#   python ingest.py [--organism ...] append lot_semaine.csv
+#       ajoute un lot hebdomadaire (dédoublonné sur id_demand / num_specimen)
+#       et met à jour l'état agrégé des seules semaines concernées ;
+#   python ingest.py partition export_multi_organismes.csv
+#       répartit un export de plusieurs organismes (code_germe / lib_germe,
+#       voir organisms.py) entre les exports et magasins de chaque organisme ;
+#   python ingest.py [--organism ...] sites nord=export_nord.csv sud.csv ...
+#       lit en parallèle les exports de plusieurs sites, les ramène au schéma
+#       de l'export (data_loader.EXPORT_SCHEMA) et les fusionne avec une
+#       colonne site (site = nom du fichier à défaut de « site= ») ; --year
+#       donne l'année de la semaine 1 de l'export, pour les semaines datées
+#       des sites ('2024-W12').
+#
+# --csv et --store remplacent l'export et le magasin de l'organisme.
+# Les commandes enregistrent aussi les instantanés de démarrage à chaud
+# (modèle encodé, séries par service) de la nouvelle génération du magasin ;
+# un ajout les déduit de ceux de la génération précédente et du seul lot.
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_loader
+import organisms
+
+SERVICE_CUBE_SNAPSHOT = "services"
+
+
+def _rules_key(phenotype_rules: list[tuple[str, list[str]]] | None) -> str:
+    """Règles de phénotype enregistrées avec l'état agrégé (le changer invalide l'état)."""
+    rules = analytics.PHENOTYPE_RULES if phenotype_rules is None else phenotype_rules
+    return json.dumps([[name, list(columns)] for name, columns in rules])
+
+
+def ensure_store(
+    source_path: str,
+    store_folder: str = data_loader.STORE_FOLDER,
+    phenotype_rules: list[tuple[str, list[str]]] | None = None,
+) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Retourne (manifeste, état agrégé) du magasin de l'export, en reconstruisant
+    le magasin si le CSV a changé et l'état s'il ne correspond plus au magasin
+    ou aux règles de phénotype.
+    """
+    manifest = data_loader.ensure_export_store(source_path, store_folder)
+    state = data_loader.read_state(source_path, manifest["generation"], store_folder)
+    rules_key = _rules_key(phenotype_rules)
+    if state is None or str(state.get("phenotype_rules", "")) != rules_key:
+        export = data_loader.load_encoded_export(source_path, store_folder)
+        state = analytics.weekly_state(export, phenotype_rules)
+        state["phenotype_rules"] = np.array(rules_key)
+        data_loader.write_state(source_path, state, manifest["generation"], store_folder)
+    return manifest, state
+
+
+def load_service_cube(
+    source_path: str,
+    store_folder: str = data_loader.STORE_FOLDER,
+) -> analytics.ServiceCube:
+    """Séries par service de tous les isolats, relues depuis l'instantané de la génération courante."""
+    generation = data_loader.ensure_export_store(source_path, store_folder)["generation"]
+    snapshot = data_loader.read_snapshot(source_path, SERVICE_CUBE_SNAPSHOT, generation, store_folder)
+    if snapshot is not None:
+        return analytics.ServiceCube.from_arrays(*snapshot)
+    cube = analytics.ServiceCube.from_export(data_loader.load_encoded_export(source_path, store_folder))
+    data_loader.write_snapshot(source_path, SERVICE_CUBE_SNAPSHOT, generation, *cube.to_arrays(),
+                               store_folder=store_folder)
+    return cube
+
+
+def ensure_snapshots(source_path: str, store_folder: str = data_loader.STORE_FOLDER) -> None:
+    """Écrit les instantanés de démarrage à chaud manquants pour la génération courante."""
+    data_loader.load_encoded_export(source_path, store_folder)
+    load_service_cube(source_path, store_folder)
+
+
+def extend_snapshots(source_path: str, manifest: dict, previous_generation: str,
+                     batch: data_loader.EncodedExport, store_folder: str = data_loader.STORE_FOLDER) -> None:
+    """
+    Instantanés de la génération créée par l'ajout du lot batch, déduits de
+    ceux de la génération précédente en temps proportionnel au lot (hors
+    recopie des tableaux). Un instantané précédent absent n'est pas
+    reconstruit ici : il le sera à la première lecture (app, build).
+    """
+    data_loader.extend_encoded_snapshot(source_path, manifest, previous_generation, batch, store_folder)
+    snapshot = data_loader.read_snapshot(source_path, SERVICE_CUBE_SNAPSHOT, previous_generation, store_folder)
+    if snapshot is not None:
+        cube = analytics.ServiceCube.from_arrays(*snapshot).merge(analytics.ServiceCube.from_export(batch))
+        data_loader.write_snapshot(source_path, SERVICE_CUBE_SNAPSHOT, manifest["generation"],
+                                   *cube.to_arrays(), store_folder=store_folder)
+
+
+def append_batch(
+    source_path: str,
+    batch: pd.DataFrame,
+    store_folder: str = data_loader.STORE_FOLDER,
+    phenotype_rules: list[tuple[str, list[str]]] | None = None,
+) -> tuple[dict, pd.DataFrame, dict[str, np.ndarray], np.ndarray]:
+    """
+    Ajoute un lot à l'export et met à jour l'état agrégé des seules semaines
+    du lot. Retourne (manifeste, lignes ajoutées, état, semaines touchées).
+    """
+    manifest, state = ensure_store(source_path, store_folder, phenotype_rules)
+    if data_loader.SITE_COLUMN in manifest["columns"] and data_loader.SITE_COLUMN not in batch.columns:
+        batch = batch.assign(**{data_loader.SITE_COLUMN: data_loader.DEFAULT_SITE})
+    previous_generation = manifest["generation"]
+    manifest, new_rows = data_loader.append_export_batch(source_path, batch, store_folder)
+    if new_rows.empty:
+        return manifest, new_rows, state, np.array([], dtype=int)
+
+    batch_export = data_loader.encode_part(manifest, manifest["parts"][-1], store_folder)
+    batch_state = analytics.weekly_state(batch_export, phenotype_rules)
+    state = analytics.merge_weekly_state(state, batch_state)
+    data_loader.write_state(source_path, state, manifest["generation"], store_folder)
+    extend_snapshots(source_path, manifest, previous_generation, batch_export, store_folder)
+    return manifest, new_rows, state, batch_state["weeks"]
+
+
+def cmd_build(args: argparse.Namespace) -> None:
+    t0 = time.perf_counter()
+    data_loader.build_export_store(args.csv, args.store)
+    manifest, state = ensure_store(args.csv, args.store, args.rules)
+    ensure_snapshots(args.csv, args.store)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{manifest['rows']} lignes, {len(manifest['result_columns'])} antibiotiques, "
+        f"{len(state['weeks'])} semaines -> {data_loader.store_paths(args.csv, args.store)[0]} "
+        f"({elapsed:.2f} s)"
+    )
+
+
+def cmd_append(args: argparse.Namespace) -> None:
+    t0 = time.perf_counter()
+    batch = data_loader.read_export(args.batch)
+    _, new_rows, state, affected = append_batch(args.csv, batch, args.store, args.rules)
+    n_dup = len(batch) - len(new_rows)
+    if new_rows.empty:
+        print(f"Aucune nouvelle ligne ({n_dup} doublons écartés).")
+        return
+    elapsed = time.perf_counter() - t0
+
+    print(
+        f"{len(new_rows)} lignes ajoutées, {n_dup} doublons écartés, "
+        f"semaines mises à jour : {', '.join(str(w) for w in affected)} ({elapsed:.2f} s)"
+    )
+
+    # Alertes des semaines touchées, recalculées depuis l'état agrégé
+    abx_engine, _ = analytics.engines_from_state(state)
+    outliers = abx_engine.outlier_weeks(args.window, args.level)
+    outliers = outliers[outliers["Semaine"].isin(affected)]
+    for row in outliers.itertuples(index=False):
+        print(f"  Semaine {row.Semaine} : semaine aberrante pour {row.Antibiotique}")
+
+
+def cmd_partition(args: argparse.Namespace) -> None:
+    t0 = time.perf_counter()
+    df = data_loader.read_export(args.source)
+    parts, unmatched = organisms.partition(df, args.organisms)
+    for slug, part in parts.items():
+        org = args.organisms[slug]
+        if org.has_data():
+            _, new_rows, _, affected = append_batch(org.export_file, part, org.store_folder, org.phenotype_rules)
+            print(f"{org.name} : {len(new_rows)} lignes ajoutées, {len(part) - len(new_rows)} doublons écartés, "
+                  f"semaines : {', '.join(str(w) for w in affected) or '-'}")
+        else:
+            part.to_csv(org.export_file, index=False)
+            data_loader.build_export_store(org.export_file, org.store_folder)
+            ensure_store(org.export_file, org.store_folder, org.phenotype_rules)
+            ensure_snapshots(org.export_file, org.store_folder)
+            print(f"{org.name} : nouvel export de {len(part)} lignes -> {org.export_file}")
+    for label, count in unmatched.items():
+        print(f"  Non attribué (organisme à configurer dans organisms.json) : {label} ({count} lignes)")
+    print(f"{len(df)} lignes réparties en {len(parts)} organismes ({time.perf_counter() - t0:.2f} s)")
+
+
+def site_source(arg: str) -> tuple[str, str]:
+    """'site=chemin' ou 'chemin' (le site est alors le nom du fichier sans extension)."""
+    site, sep, path = arg.partition("=")
+    if not sep:
+        path = arg
+        site = os.path.splitext(os.path.basename(arg))[0]
+    return site, path
+
+
+def cmd_sites(args: argparse.Namespace) -> None:
+    t0 = time.perf_counter()
+    if not os.path.isfile(args.csv):
+        raise SystemExit(f"Export de référence absent : {args.csv} (commandes build ou partition).")
+    if data_loader.add_site_column(args.csv, args.default_site):
+        print(f"Colonne {data_loader.SITE_COLUMN} ajoutée à {args.csv} (site {args.default_site})")
+    manifest = data_loader.ensure_export_store(args.csv, args.store)
+
+    results = data_loader.load_site_exports(
+        args.sources, manifest["columns"], manifest["result_columns"], args.workers, args.year
+    )
+    t_read = time.perf_counter() - t0
+    for _, rejects, report in results:
+        seconds = max(report["seconds"], 1e-9)
+        print(
+            f"{report['site']} ({os.path.basename(report['path'])}) : {report['rows']} lignes, "
+            f"{report['accepted']} retenues, {report['rejected']} rejetées - "
+            f"{report['bytes'] / seconds / 1e6:.1f} Mo/s, {report['rows'] / seconds:,.0f} lignes/s"
+        )
+        for reason, count in report["reasons"].items():
+            print(f"  Rejet : {reason} ({count} lignes)")
+        if report["invalid_results"]:
+            print(f"  Résultats illisibles remis à vide : {report['invalid_results']}")
+        if report["ignored_columns"]:
+            print(f"  Colonnes ignorées : {', '.join(report['ignored_columns'])}")
+        if args.rejects and len(rejects):
+            os.makedirs(args.rejects, exist_ok=True)
+            rejects.to_csv(os.path.join(args.rejects, f"rejets_{report['site']}.csv"), index=False)
+
+    batch = pd.concat([rows for rows, _, _ in results], ignore_index=True)
+    _, new_rows, _, affected = append_batch(args.csv, batch, args.store, args.rules)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{len(new_rows)} lignes ajoutées, {len(batch) - len(new_rows)} doublons écartés, "
+        f"semaines mises à jour : {', '.join(str(w) for w in affected) or '-'} "
+        f"(lecture {t_read:.2f} s, total {elapsed:.2f} s)"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Ingestion de l'export des isolats.")
+    parser.add_argument(
+        "--organism", default=organisms.DEFAULT_ORGANISM,
+        help="Organisme (slug de organisms.json, défaut : %(default)s)"
+    )
+    parser.add_argument("--store", help="Dossier du magasin colonnaire (défaut : celui de l'organisme)")
+    parser.add_argument("--csv", help="Export CSV de référence (défaut : celui de l'organisme)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Convertit l'export CSV en magasin colonnaire")
+    p_build.set_defaults(func=cmd_build)
+
+    p_append = sub.add_parser("append", help="Ajoute un lot hebdomadaire à l'export")
+    p_append.add_argument("batch", help="Fichier CSV du lot, au format de l'export")
+    p_append.add_argument("--window", type=int, default=8,
+                          help="Fenêtre de la moyenne mobile (défaut : %(default)s)")
+    p_append.add_argument("--level", type=float, default=0.95,
+                          help="Niveau de confiance du seuil (défaut : %(default)s)")
+    p_append.set_defaults(func=cmd_append)
+
+    p_partition = sub.add_parser("partition", help="Répartit un export multi-organismes par organisme")
+    p_partition.add_argument("source", help="Fichier CSV au format de l'export, tous organismes confondus")
+    p_partition.set_defaults(func=cmd_partition)
+
+    p_sites = sub.add_parser("sites", help="Fusionne les exports de plusieurs sites")
+    p_sites.add_argument("sources", nargs="+", type=site_source, metavar="[SITE=]CSV",
+                         help="Exports des sites (site = nom du fichier par défaut)")
+    p_sites.add_argument("--workers", type=int, default=None,
+                         help="Processus de lecture (défaut : nombre de cœurs)")
+    p_sites.add_argument("--rejects", help="Dossier où écrire les lignes rejetées (rejets_<site>.csv)")
+    p_sites.add_argument("--default-site", default=data_loader.DEFAULT_SITE,
+                         help="Site des lignes déjà présentes dans l'export (défaut : %(default)s)")
+    p_sites.add_argument("--year", type=int, default=None,
+                         help="Année de la semaine 1 de l'export : les semaines datées des sites "
+                              "('2024-W12') y sont ramenées, et rejetées sans cette option")
+    p_sites.set_defaults(func=cmd_sites)
+
+    args = parser.parse_args(argv)
+    args.organisms = organisms.load_organisms()
+    if args.organism not in args.organisms:
+        parser.error(f"Organisme inconnu : {args.organism} (attendu : {', '.join(args.organisms)})")
+    org = args.organisms[args.organism]
+    args.csv = args.csv or org.export_file
+    args.store = args.store or org.store_folder
+    args.rules = org.phenotype_rules
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
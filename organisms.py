@@ -0,0 +1,123 @@
+# organisms.py
+#
+# Organismes surveillés, décrits dans organisms.json (et, pour un jeu de
+# données particulier, dans <dossier de données>/organisms.json, dont les
+# entrées complètent ou remplacent celles du dépôt) :
+#   name             : nom tel qu'il figure dans la colonne Category du
+#                      classeur des bactéries à surveiller
+#   slug             : identifiant court (dossiers, clés de cache)
+#   codes            : valeurs de code_germe de l'organisme (lib_germe = name
+#                      est aussi reconnu)
+#   export           : CSV des isolats, dans le dossier des données
+#   workbooks        : sous-dossier des classeurs d'analyse ("" : le dossier
+#                      des données ; par défaut : slug)
+#   phenotypes       : règles de phénotype par priorité croissante
+#                      ({"name": ..., "resistant": [colonnes]} : R à l'une
+#                      des colonnes) ; Wild et Other sont implicites
+#   count_phenotypes : phénotypes suivis en nombre de souches (tolérance zéro)
+#
+# Chaque organisme a son propre magasin (data/.store/<slug>/) : ses
+# données ne sont lues qu'à l'ouverture de sa page. Aucune dépendance à
+# Streamlit.
+
+import json
+import os
+
+import pandas as pd
+
+import data_loader
+
+CONFIG_FILE = os.environ.get(
+    "SURVEILLANCE_ORGANISMS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "organisms.json")
+)
+DEFAULT_ORGANISM = "staph_aureus"
+BASE_PHENOTYPES = ("Wild", "Other")
+
+
+def normalize_name(name) -> str:
+    """Nom comparable : espaces et retours à la ligne réduits, casse ignorée."""
+    return " ".join(str(name).split()).casefold()
+
+
+class Organism:
+    """Configuration d'un organisme (voir l'en-tête du module)."""
+
+    def __init__(self, config: dict, data_folder: str = data_loader.DATA_FOLDER):
+        self.name = config["name"]
+        self.slug = config["slug"]
+        self.codes = [str(code) for code in config.get("codes", [])]
+        self.icon = config.get("icon", "🦠")
+        self.phenotype_rules = [(rule["name"], list(rule["resistant"])) for rule in config.get("phenotypes", [])]
+        self.count_phenotypes = list(config.get("count_phenotypes", []))
+        self.export_file = os.path.join(data_folder, config["export"])
+        self.workbook_folder = os.path.join(data_folder, config.get("workbooks", self.slug))
+        self.store_folder = os.path.join(data_folder, os.path.basename(data_loader.STORE_FOLDER), self.slug)
+
+    @property
+    def phenotype_labels(self) -> list[str]:
+        """Phénotypes de l'organisme, dans l'ordre d'affichage."""
+        return [name for name, _ in self.phenotype_rules] + list(BASE_PHENOTYPES)
+
+    @property
+    def title(self) -> str:
+        return f"{self.icon} Surveillance : {self.name}"
+
+    def has_data(self) -> bool:
+        return os.path.isfile(self.export_file)
+
+    def phenotype_workbooks(self) -> dict[str, str]:
+        """Chemins des classeurs d'analyse des phénotypes de l'organisme."""
+        return data_loader.discover_phenotypes(self.workbook_folder, self.phenotype_labels)
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        """Lignes d'un export qui concernent l'organisme (code_germe ou lib_germe)."""
+        mask = pd.Series(False, index=df.index)
+        if "code_germe" in df.columns and self.codes:
+            mask |= df["code_germe"].astype("string").str.strip().isin(self.codes).fillna(False)
+        if "lib_germe" in df.columns:
+            mask |= df["lib_germe"].map(normalize_name, na_action="ignore") == normalize_name(self.name)
+        return mask
+
+
+def load_organisms(config_file: str = CONFIG_FILE,
+                   data_folder: str = data_loader.DATA_FOLDER) -> dict[str, Organism]:
+    """{slug: organisme} de la configuration du dépôt, complétée par celle du dossier de données."""
+    entries = {}
+    for path in (config_file, os.path.join(data_folder, "organisms.json")):
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as fh:
+                for config in json.load(fh)["organisms"]:
+                    entries[config["slug"]] = config
+    return {slug: Organism(config, data_folder) for slug, config in entries.items()}
+
+
+def config_signature(config_file: str = CONFIG_FILE, data_folder: str = data_loader.DATA_FOLDER) -> tuple:
+    """Signature des fichiers de configuration (clé de cache)."""
+    return (data_loader.file_signature(config_file),
+            data_loader.file_signature(os.path.join(data_folder, "organisms.json")))
+
+
+def in_reference_order(organisms: dict[str, Organism], categories) -> list[Organism]:
+    """
+    Organismes dans l'ordre du classeur des bactéries à surveiller (colonne
+    Category) ; ceux qui n'y figurent pas viennent ensuite.
+    """
+    order = {normalize_name(name): i for i, name in enumerate(categories)}
+    return sorted(organisms.values(), key=lambda org: order.get(normalize_name(org.name), len(order)))
+
+
+def partition(df: pd.DataFrame, organisms: dict[str, Organism]) -> tuple[dict[str, pd.DataFrame], pd.Series]:
+    """
+    Répartit un export multi-organismes : {slug: lignes de l'organisme} et
+    nombre de lignes non attribuées par lib_germe (organismes à configurer).
+    Une ligne est attribuée au premier organisme qui la reconnaît.
+    """
+    remaining = pd.Series(True, index=df.index)
+    parts = {}
+    for slug, org in organisms.items():
+        mask = org.mask(df) & remaining
+        if mask.any():
+            parts[slug] = df[mask]
+            remaining &= ~mask
+    label = df["lib_germe"] if "lib_germe" in df.columns else pd.Series("?", index=df.index)
+    return parts, label[remaining].fillna("?").value_counts()
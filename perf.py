@@ -0,0 +1,161 @@
+# perf.py
+#
+# Mesure des temps de chaque page du tableau de bord : chronomètres par étape
+# (chargement, calcul, rendu), nombre de lignes traitées, défauts de cache et
+# pic mémoire du processus. Chaque exécution d'une page produit un
+# enregistrement, ajouté en JSON lines au journal de performance.
+# Aucune dépendance à Streamlit.
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PERF_LOG = os.environ.get("PERF_LOG", os.path.join("logs", "perf.jsonl"))
+
+_current: contextvars.ContextVar["PageTimer | None"] = contextvars.ContextVar("perf_page", default=None)
+_log_lock = threading.Lock()
+
+
+def peak_rss_mb() -> float | None:
+    """Pic de mémoire résidente du processus (Mo), None si indisponible."""
+    # VmHWM (Linux) : propre au programme en cours, alors que ru_maxrss
+    # conserve le pic du processus parent à travers fork/exec
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --------------------------------------------------
+# 1) Chronométrage d'une page
+# --------------------------------------------------
+class PageTimer:
+    """Étapes chronométrées et défauts de cache d'une exécution de page."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.stages: list[dict] = []
+        self.cache_misses: Counter[str] = Counter()
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[dict]:
+        """
+        Chronomètre le bloc ; le dictionnaire retourné permet de renseigner
+        le nombre de lignes une fois connu (info["rows"] = ...).
+        """
+        info = {"rows": rows}
+        t = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.stages.append({
+                "stage": name,
+                "ms": round((time.perf_counter() - t) * 1000, 2),
+                "rows": info["rows"],
+            })
+
+    def record(self) -> dict:
+        return {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "page": self.page,
+            "total_ms": round((time.perf_counter() - self.t0) * 1000, 2),
+            "stages": self.stages,
+            "cache_misses": dict(self.cache_misses),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+@contextmanager
+def page_timer(
+    page: str,
+    log_path: str | None = PERF_LOG,
+    counters: Callable[[], dict[str, int]] | None = None,
+    sink: Callable[[dict], None] | None = None,
+) -> Iterator[PageTimer]:
+    """
+    Chronomètre une page. À la sortie, l'enregistrement (complété des
+    variations de counters, ex. succès/défauts du cache des figures) est
+    ajouté au journal log_path et transmis à sink.
+    """
+    timer = PageTimer(page)
+    before = counters() if counters else {}
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+        record = timer.record()
+        if counters:
+            after = counters()
+            record["counters"] = {k: after[k] - before.get(k, 0) for k in after}
+        if log_path:
+            write_record(record, log_path)
+        if sink:
+            sink(record)
+
+
+def stage(name: str, rows: int | None = None):
+    """Étape de la page en cours (sans effet hors d'un page_timer)."""
+    timer = _current.get()
+    if timer is None:
+        return _noop_stage(rows)
+    return timer.stage(name, rows)
+
+
+@contextmanager
+def _noop_stage(rows: int | None) -> Iterator[dict]:
+    yield {"rows": rows}
+
+
+def cache_miss(name: str) -> None:
+    """À appeler dans le corps d'une fonction mise en cache : compte un défaut."""
+    timer = _current.get()
+    if timer is not None:
+        timer.cache_misses[name] += 1
+
+
+# --------------------------------------------------
+# 2) Journal JSON lines
+# --------------------------------------------------
+def write_record(record: dict, log_path: str = PERF_LOG) -> None:
+    folder = os.path.dirname(log_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False)
+    with _log_lock, open(log_path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def read_log(log_path: str = PERF_LOG) -> list[dict]:
+    """Enregistrements du journal (lignes illisibles ignorées)."""
+    if not os.path.exists(log_path):
+        return []
+    records = []
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
@@ -0,0 +1,160 @@
+# refresh.py
+#
+# Rafraîchissement des données en arrière-plan (stale-while-revalidate) :
+# un fil d'exécution surveille les signatures des fichiers de données et,
+# lorsqu'elles changent, prépare la nouvelle version (lecture, magasin,
+# agrégats) hors des requêtes. Les sessions continuent d'être servies avec
+# la version précédente jusqu'à ce que la nouvelle soit prête, puis la
+# bascule est atomique. Au démarrage, la première version peut être servie
+# aussitôt et préparée en arrière-plan (lazy_start) : la première page ne
+# charge que ce dont elle a besoin. Aucune dépendance à Streamlit.
+
+import atexit
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable
+
+_local = threading.local()
+EXIT_TIMEOUT = 120.0  # secondes accordées à une construction en cours à la sortie
+
+
+class DataVersion:
+    """Version des données servie : signatures des sources et date de construction."""
+
+    def __init__(self, signatures: dict, built_at: datetime, build_seconds: float):
+        self.signatures = signatures
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.token = uuid.uuid4().hex[:8]
+
+
+def building_signatures() -> dict | None:
+    """Signatures en cours de construction dans ce fil d'exécution (None hors construction)."""
+    return getattr(_local, "signatures", None)
+
+
+class BackgroundRefresher:
+    """
+    probe()           : signatures actuelles des fichiers (dict comparable)
+    build(signatures) : prépare tout ce qui dépend de ces signatures ; pendant
+                        l'appel, building_signatures() les retourne, de sorte
+                        que les accès aux données visent la version en construction
+    interval          : période de surveillance (secondes)
+    lazy_start        : la première version est publiée sans attendre build,
+                        qui est exécuté par le fil de surveillance dès son démarrage
+
+    Une modification n'est prise en compte qu'une fois les signatures stables
+    sur deux relevés consécutifs (fichier en cours de copie).
+    """
+
+    def __init__(self, probe: Callable[[], dict], build: Callable[[dict], None], interval: float = 10.0,
+                 lazy_start: bool = False):
+        self.probe = probe
+        self.build = build
+        self.interval = interval
+        self.lazy_start = lazy_start
+        self.building: dict | None = None
+        self.last_error: str | None = None
+        self._current: DataVersion | None = None
+        self._pending: dict | None = None
+        self._failed: dict | None = None
+        self._warm: DataVersion | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def current(self) -> DataVersion:
+        """Version servie ; la première est construite dans l'appel s'il n'y en a pas encore."""
+        with self._lock:
+            if self._current is None:
+                if self.lazy_start:
+                    self._current = self._warm = DataVersion(self.probe(), datetime.now(), 0.0)
+                else:
+                    self._current = self._build(self.probe())
+            return self._current
+
+    def retained(self) -> list[dict]:
+        """Signatures de la version servie et de celle en construction, lues ensemble."""
+        with self._lock:
+            served = self._current.signatures if self._current is not None else None
+            return [s for s in (served, self.building) if s is not None]
+
+    def start(self) -> "BackgroundRefresher":
+        if self._thread is None:
+            # une construction interrompue par la fin du processus peut bloquer
+            # sa finalisation (pools de threads d'Arrow) : on la laisse se terminer
+            atexit.register(self.stop, EXIT_TIMEOUT)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="data-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait: float | None = None) -> None:
+        """Arrête la surveillance ; avec wait, attend au plus wait secondes la construction en cours."""
+        self._stop.set()
+        if wait is not None and self._thread is not None:
+            self._thread.join(wait)
+
+    def check(self) -> bool:
+        """
+        Un relevé : construit puis publie une nouvelle version si les fichiers
+        ont changé et sont stables. Retourne True si une version a été publiée.
+        """
+        signatures = self.probe()
+        current = self.current()
+        if signatures == current.signatures or signatures == self._failed:
+            self._pending = None
+            return False
+        if signatures != self._pending:
+            self._pending = signatures  # attendre un relevé identique
+            return False
+
+        self._pending = None
+        with self._lock:
+            self.building = signatures
+        try:
+            version = self._build(signatures)
+        except Exception as exc:  # la version précédente reste servie
+            with self._lock:
+                self.building = None
+            self._failed = signatures
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            return False
+        # publication et fin de construction ensemble : retained() voit
+        # toujours la nouvelle version, servie ou en construction
+        with self._lock:
+            self._current = version
+            self.building = None
+        self._failed = None
+        self.last_error = None
+        return True
+
+    def _build(self, signatures: dict) -> DataVersion:
+        t0 = time.perf_counter()
+        _local.signatures = signatures
+        try:
+            self.build(signatures)
+        finally:
+            _local.signatures = None
+        return DataVersion(signatures, datetime.now(), time.perf_counter() - t0)
+
+    def warm(self) -> None:
+        """Prépare la première version publiée sans construction (lazy_start)."""
+        version, self._warm = self._warm, None
+        if version is None:
+            return
+        try:
+            built = self._build(version.signatures)
+        except Exception as exc:  # les pages chargeront elles-mêmes les données
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            return
+        version.build_seconds = built.build_seconds
+
+    def _run(self) -> None:
+        self.current()
+        self.warm()
+        while not self._stop.wait(self.interval):
+            self.check()
@@ -0,0 +1,381 @@
+# report.py
+#
+# Bulletin hebdomadaire d'hygiène, produit hors de l'application :
+#   python report.py [--organism staph_aureus ...] [--out reports]
+#                    [--source export|classeurs] [--window 8] [--level 0.95]
+#                    [--dedup tous] [--weeks 1-53] [--workers N]
+#
+# Pour chaque organisme (par défaut : tous ceux dont l'export existe), un
+# rapport HTML autonome (plotly.js inclus) avec les tendances de tous les
+# antibiotiques et phénotypes, les camemberts et les tables d'alertes, ainsi
+# que les CSV correspondants, dans <out>/<organisme>/. Les données et les
+# figures sont celles de l'application (ingest, analytics, charts).
+#
+# Les figures sont construites par un pool de processus. Chacune est
+# identifiée par l'empreinte de ses données et de ses options : une figure
+# dont l'empreinte n'a pas changé depuis le rapport précédent est reprise
+# du dossier figures/ sans être reconstruite.
+
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+import charts
+import data_loader
+import ingest
+import organisms
+
+SOURCES = ("export", "classeurs")
+FIGURES_FOLDER = "figures"
+FIGURES_MANIFEST = "figures.json"
+REPORT_FILENAME = "rapport.html"
+FIGURE_FORMAT = 1  # à incrémenter si le rendu des figures change
+
+
+def _file_name(text: str) -> str:
+    """Nom de fichier sûr dérivé d'un libellé (accents et ponctuation retirés)."""
+    return re.sub(r"[^a-z0-9]+", "_", data_loader.normalize_column_name(text)).strip("_")
+
+
+# --------------------------------------------------
+# 1) Données d'un organisme
+# --------------------------------------------------
+class ReportData:
+    """
+    Séries, comptages et alertes d'un organisme pour les réglages du
+    rapport, calculés comme dans l'application.
+    """
+
+    def __init__(self, organism: organisms.Organism, source: str, window: int, level: float, dedup: str):
+        self.organism = organism
+        self.source = source
+        self.window = window
+        self.level = level
+        self.dedup = dedup
+        rules = organism.phenotype_rules
+        self.manifest, state = ingest.ensure_store(organism.export_file, organism.store_folder, rules)
+        export = data_loader.load_encoded_export(organism.export_file, organism.store_folder)
+        if dedup != "tous":
+            patients = data_loader.load_patient_codes(organism.export_file, organism.store_folder)
+            export = analytics.deduplicate(export, patients, dedup, rules)
+            state = analytics.weekly_state(export, rules)
+        self.export = export
+        self.abx_engine, self.pheno_engine = analytics.engines_from_state(state)
+        self.abx_cube, self.pheno_cube = analytics.cubes_from_state(state)
+        self.series, self.series_errors = None, {}
+        if source == "classeurs":
+            self.series, self.series_errors = data_loader.load_workbook_series(
+                data_loader.discover_antibiotiques(organism.workbook_folder), organism.phenotype_workbooks(),
+                store_folder=organism.store_folder
+            )
+
+    def _workbook_series(self, indicator: str, family: str) -> pd.DataFrame | None:
+        if indicator in self.series_errors:
+            return None
+        series = self.series[(self.series["Indicateur"] == indicator) & (self.series["Famille"] == family)]
+        return series.reset_index(drop=True)
+
+    def antibiotic_series(self) -> dict[str, pd.DataFrame]:
+        """{antibiotique: série en % prête à tracer}."""
+        if self.source == "export":
+            frames = {abx: self.abx_engine.frame(abx, self.window, self.level) for abx in self.abx_engine.labels}
+        else:
+            abx_names = sorted(self.series.loc[self.series["Famille"] == "antibiotique", "Indicateur"].unique())
+            frames = {abx: self._workbook_series(abx, "antibiotique") for abx in abx_names}
+        return {abx: charts.prepare_trend_frame(df) for abx, df in frames.items() if df is not None}
+
+    def phenotype_series(self) -> dict[str, pd.DataFrame]:
+        """{phénotype: série prête à tracer}, en nombre pour les phénotypes suivis en nombre."""
+        series = {}
+        for pheno in self.organism.phenotype_labels:
+            if self.source == "export":
+                if pheno not in self.pheno_engine.labels:
+                    continue
+                df = self.pheno_engine.frame(pheno, self.window, self.level)
+            else:
+                df = self._workbook_series(pheno, "phenotype")
+                if df is None:
+                    continue
+                df = df.rename(columns={"Nombre": pheno})
+            if pheno in self.organism.count_phenotypes:
+                series[pheno] = charts.prepare_count_frame(df, pheno)
+            else:
+                series[pheno] = charts.prepare_trend_frame(df)
+        return series
+
+    def alertes(self) -> pd.DataFrame:
+        if self.source == "export":
+            outlier_weeks = self.abx_engine.outlier_weeks(self.window, self.level)
+        else:
+            outlier_weeks = analytics.outlier_weeks_from_series(self.series)
+        return analytics.compute_alertes(self.export, outlier_weeks)
+
+    def service_alertes(self, min_r: int = 3) -> pd.DataFrame:
+        if self.dedup == "tous":
+            cube = ingest.load_service_cube(self.organism.export_file, self.organism.store_folder)
+        else:
+            cube = analytics.ServiceCube.from_export(self.export)
+        return cube.anomalies(self.window, self.level, min_r)
+
+
+# --------------------------------------------------
+# 2) Figures : empreintes et rendu parallèle
+#    Une figure est décrite par (nom, fonction de charts.py, arguments) ;
+#    son empreinte couvre les données (hash des DataFrame) et les options.
+# --------------------------------------------------
+def figure_key(builder: str, kwargs: dict) -> str:
+    digest = hashlib.sha1(f"{FIGURE_FORMAT}|{builder}".encode())
+    for name in sorted(kwargs):
+        value = kwargs[name]
+        digest.update(name.encode())
+        if isinstance(value, dict):  # {libellé: DataFrame} (vue d'ensemble des phénotypes)
+            value = tuple((label, frame_hash(df)) for label, df in value.items())
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            value = frame_hash(value)
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def frame_hash(df: pd.DataFrame | pd.Series) -> str:
+    """Empreinte du contenu d'un DataFrame (valeurs, index et noms de colonnes)."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr(list(df.columns) if isinstance(df, pd.DataFrame) else df.name).encode())
+    return digest.hexdigest()
+
+
+def render_figure(job: tuple[str, str, dict]) -> tuple[str, str]:
+    """(nom, fragment HTML) d'une figure ; exécuté dans un processus du pool."""
+    import plotly.io as pio
+
+    name, builder, kwargs = job
+    fig = getattr(charts, builder)(**kwargs)
+    return name, pio.to_html(fig, full_html=False, include_plotlyjs=False, div_id=name)
+
+
+def render_figures(jobs: list[tuple[str, str, dict]], folder: str,
+                   max_workers: int | None = None) -> tuple[dict[str, str], int]:
+    """
+    Fragments HTML {nom: html} des figures, dans l'ordre des jobs, et nombre
+    de figures reconstruites. Les figures dont l'empreinte figure dans le
+    manifeste du dossier sont relues ; les autres sont rendues par un pool de
+    processus neufs (le processus courant a déjà lancé les threads d'Arrow).
+    """
+    figures_folder = os.path.join(folder, FIGURES_FOLDER)
+    os.makedirs(figures_folder, exist_ok=True)
+    manifest_path = os.path.join(folder, FIGURES_MANIFEST)
+    previous = data_loader.read_manifest(manifest_path) or {}
+
+    keys = {name: figure_key(builder, kwargs) for name, builder, kwargs in jobs}
+    fragments, to_render = {}, []
+    for job in jobs:
+        path = os.path.join(figures_folder, f"{job[0]}.html")
+        if previous.get(job[0]) == keys[job[0]] and os.path.isfile(path):
+            with open(path, encoding="utf-8") as fh:
+                fragments[job[0]] = fh.read()
+        else:
+            to_render.append(job)
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(to_render)))
+    if workers == 1:
+        rendered = map(render_figure, to_render)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        rendered = pool.map(render_figure, to_render)
+    try:
+        for name, fragment in rendered:
+            with open(os.path.join(figures_folder, f"{name}.html"), "w", encoding="utf-8") as fh:
+                fh.write(fragment)
+            fragments[name] = fragment
+    finally:
+        if workers > 1:
+            pool.shutdown()
+
+    for entry in os.listdir(figures_folder):  # figures qui ne font plus partie du rapport
+        if entry.endswith(".html") and entry[:-5] not in keys:
+            os.remove(os.path.join(figures_folder, entry))
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(keys, fh, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return {name: fragments[name] for name, _, _ in jobs}, len(to_render)
+
+
+# --------------------------------------------------
+# 3) Rapport d'un organisme
+# --------------------------------------------------
+def figure_jobs(data: ReportData, phenotypes: dict[str, pd.DataFrame],
+                week_min: int, week_max: int) -> list[tuple[str, str, str, dict]]:
+    """(section, nom, fonction de charts.py, arguments) de chaque figure du rapport."""
+    ic_label = f"Seuil IC {data.level:.0%}"
+    jobs = []
+    for abx, df in data.antibiotic_series().items():
+        jobs.append(("Antibiotiques", f"antibiotique_{_file_name(abx)}", "antibiotic_trend_figure",
+                     {"df_abx": df, "abx": abx, "ic_label": ic_label}))
+
+    count_phenotypes = tuple(data.organism.count_phenotypes)
+    if phenotypes:
+        jobs.append(("Phénotypes", "phenotypes", "phenotypes_overview_figure",
+                     {"series": phenotypes, "count_phenotypes": count_phenotypes}))
+    for pheno, df in phenotypes.items():
+        if pheno in count_phenotypes:
+            jobs.append(("Phénotypes", f"phenotype_{_file_name(pheno)}", "phenotype_count_figure",
+                         {"df_pheno": df, "pheno": pheno}))
+        else:
+            jobs.append(("Phénotypes", f"phenotype_{_file_name(pheno)}", "phenotype_trend_figure",
+                         {"df_ph": df, "pheno": pheno, "ic_label": ic_label}))
+
+    for abx in data.abx_cube.axes[0]:
+        counts = data.abx_cube.value_counts(week_min, week_max, abx)
+        jobs.append(("Répartition", f"camembert_{_file_name(abx)}", "pie_figure",
+                     {"counts": counts, "names": "Résultat", "title": f"Distribution de {abx}"}))
+    if data.pheno_cube.axes[0]:
+        jobs.append(("Répartition", "camembert_phenotypes", "pie_figure",
+                     {"counts": data.pheno_cube.value_counts(week_min, week_max), "names": "Phénotype",
+                      "title": "Distribution des phénotypes"}))
+    return jobs
+
+
+def write_csv_files(data: ReportData, phenotypes: dict[str, pd.DataFrame], folder: str, week_min: int,
+                    week_max: int, alertes: pd.DataFrame, service_alertes: pd.DataFrame) -> list[str]:
+    """CSV du bulletin (alertes, décomptes, répartitions) ; retourne leurs noms."""
+    tables = {
+        "alertes_detectees.csv": alertes,
+        "alertes_services.csv": service_alertes,
+        f"repartition_resultats_S{week_min}-S{week_max}.csv": pd.DataFrame({
+            abx: data.abx_cube.value_counts(week_min, week_max, abx) for abx in data.abx_cube.axes[0]
+        }).T.rename_axis("Antibiotique").reset_index(),
+    }
+    if data.pheno_cube.axes[0]:
+        tables[f"repartition_phenotypes_S{week_min}-S{week_max}.csv"] = (
+            data.pheno_cube.value_counts(week_min, week_max).rename("Nombre")
+            .rename_axis("Phénotype").reset_index()
+        )
+    for pheno, df in phenotypes.items():
+        if pheno in data.organism.count_phenotypes:
+            tables[f"decompte_{pheno}_par_semaine.csv"] = (
+                df[["Week", pheno]].rename(columns={"Week": "Semaine", pheno: f"Nb {pheno}"})
+                .sort_values("Semaine")
+            )
+    for file_name, df in tables.items():
+        df.to_csv(os.path.join(folder, file_name), index=False)
+    return list(tables)
+
+
+def _table_html(df: pd.DataFrame, empty: str) -> str:
+    if df.empty:
+        return f"<p>{html.escape(empty)}</p>"
+    return df.to_html(index=False, border=0, classes="table", na_rep="")
+
+
+def write_report(organism: organisms.Organism, out: str, source: str = "export", window: int = 8,
+                 level: float = 0.95, dedup: str = "tous", weeks: tuple[int, int] | None = None,
+                 max_workers: int | None = None) -> dict:
+    """
+    Écrit le rapport HTML et les CSV d'un organisme dans <out>/<slug>/.
+    Retourne un bilan (chemin, figures reconstruites et reprises, durée).
+    """
+    import plotly.offline
+
+    t0 = time.perf_counter()
+    folder = os.path.join(out, organism.slug)
+    os.makedirs(folder, exist_ok=True)
+    data = ReportData(organism, source, window, level, dedup)
+    valid = data.abx_cube.weeks
+    week_min, week_max = weeks or (int(valid.min()), int(valid.max()))
+
+    phenotypes = data.phenotype_series()
+    jobs = figure_jobs(data, phenotypes, week_min, week_max)
+    fragments, n_built = render_figures([job[1:] for job in jobs], folder, max_workers)
+    alertes = data.alertes()
+    service_alertes = data.service_alertes()
+    csv_files = write_csv_files(data, phenotypes, folder, week_min, week_max, alertes, service_alertes)
+
+    sections = {}
+    for section, name, _, _ in jobs:
+        sections.setdefault(section, []).append(fragments[name])
+    sections["Alertes semaine/service"] = [_table_html(alertes, "Aucune alerte.")]
+    sections["Alertes par service"] = [_table_html(service_alertes, "Aucune alerte par service.")]
+
+    source_label = "calcul direct depuis l'export" if source == "export" else "classeurs d'analyse"
+    settings = (f"Source : {source_label} · fenêtre {window} semaines · seuil {level:.0%} · "
+                f"isolats : {analytics.DEDUP_MODES[dedup]} · répartition des semaines {week_min}–{week_max}")
+    body = [
+        f"<h1>{html.escape(organism.title)}</h1>",
+        f"<p class='meta'>Bulletin généré le {datetime.now():%d/%m/%Y à %H:%M} · "
+        f"{data.manifest['rows']} isolats (version {data.manifest['generation'][:8]})<br>{html.escape(settings)}</p>",
+        "<nav>" + " · ".join(f"<a href='#{_file_name(s)}'>{html.escape(s)}</a>" for s in sections) + "</nav>",
+    ]
+    for section, parts in sections.items():
+        body.append(f"<h2 id='{_file_name(section)}'>{html.escape(section)}</h2>")
+        body.extend(f"<div class='figure'>{part}</div>" for part in parts)
+    body.append("<h2>Fichiers CSV</h2><ul>"
+                + "".join(f"<li><a href='{name}'>{name}</a></li>" for name in csv_files) + "</ul>")
+
+    page = (
+        "<!DOCTYPE html>\n<html lang='fr'><head><meta charset='utf-8'>"
+        f"<title>Bulletin - {html.escape(organism.name)}</title>"
+        f"<script>{plotly.offline.get_plotlyjs()}</script>"
+        "<style>body{font-family:Arial,sans-serif;margin:2em}.meta{color:#555}"
+        ".figure{margin:1em 0}.table{border-collapse:collapse}"
+        ".table td,.table th{padding:4px 8px;border-bottom:1px solid #ddd}</style>"
+        "</head><body>\n" + "\n".join(body) + "\n</body></html>\n"
+    )
+    path = os.path.join(folder, REPORT_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        fh.write(page)
+    os.replace(path + ".tmp", path)
+    return {"path": path, "built": n_built, "reused": len(jobs) - n_built, "alertes": len(alertes),
+            "seconds": time.perf_counter() - t0}
+
+
+def _week_range(text: str) -> tuple[int, int]:
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulletin hebdomadaire (HTML et CSV) hors de l'application.")
+    parser.add_argument("--organism", action="append",
+                        help="Organisme (slug de organisms.json), répétable ; défaut : tous ceux qui ont un export")
+    parser.add_argument("--out", default="reports", help="Dossier des rapports (défaut : %(default)s)")
+    parser.add_argument("--source", choices=SOURCES, default="export",
+                        help="Séries calculées depuis l'export ou lues dans les classeurs (défaut : %(default)s)")
+    parser.add_argument("--window", type=int, default=8,
+                        help="Fenêtre de la moyenne mobile (défaut : %(default)s)")
+    parser.add_argument("--level", type=float, default=0.95,
+                        help="Niveau de confiance du seuil (défaut : %(default)s)")
+    parser.add_argument("--dedup", choices=list(analytics.DEDUP_MODES), default="tous",
+                        help="Isolats comptés (défaut : %(default)s)")
+    parser.add_argument("--weeks", type=_week_range,
+                        help="Plage de semaines des camemberts, ex. 10-20 (défaut : toutes)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processus de rendu des figures (défaut : nombre de cœurs)")
+    args = parser.parse_args(argv)
+
+    available = organisms.load_organisms()
+    unknown = [slug for slug in args.organism or [] if slug not in available]
+    if unknown:
+        parser.error(f"Organisme inconnu : {', '.join(unknown)} (attendu : {', '.join(available)})")
+    selected = [available[slug] for slug in args.organism] if args.organism else \
+        [org for org in available.values() if org.has_data()]
+
+    for org in selected:
+        summary = write_report(org, args.out, args.source, args.window, args.level, args.dedup,
+                               args.weeks, args.workers)
+        print(
+            f"{org.name} : {summary['path']} - figures reconstruites {summary['built']}, "
+            f"reprises {summary['reused']}, {summary['alertes']} alertes ({summary['seconds']:.2f} s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
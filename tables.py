@@ -0,0 +1,122 @@
+# tables.py
+#
+# Tables paginées côté serveur : le DataFrame reste sur le serveur, le tri,
+# les filtres et la recherche s'appuient sur des index précalculés, et seule
+# la page visible est envoyée au navigateur. Aucune dépendance à Streamlit.
+
+import io
+import threading
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+# Colonnes proposées en filtre : au plus ce nombre de valeurs distinctes
+MAX_FILTER_VALUES = 200
+CSV_CHUNK_ROWS = 5000
+
+
+# --------------------------------------------------
+# 1) Index d'une table
+# --------------------------------------------------
+class TableIndex:
+    """
+    Index d'un DataFrame pour l'affichage paginé :
+      - codes (pd.factorize) des colonnes filtrables (peu de valeurs distinctes) ;
+      - texte de recherche de chaque ligne (toutes colonnes, en minuscules) ;
+      - ordre de tri de chaque colonne, calculé à la première demande.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_filter_values: int = MAX_FILTER_VALUES):
+        self.df = df
+        self.codes: dict[str, np.ndarray] = {}
+        self.values: dict[str, list] = {}
+        for col in df.columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            if 1 < len(uniques) <= max_filter_values:
+                self.codes[col] = codes
+                self.values[col] = uniques.tolist()
+        text = df.astype(str)
+        self.search_text = (
+            text.iloc[:, 0].str.cat([text[c] for c in text.columns[1:]], sep="\x1f")
+            if len(df.columns) else pd.Series("", index=df.index)
+        ).str.lower().reset_index(drop=True)
+        self._orders: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def sort_order(self, column: str) -> np.ndarray:
+        """Positions des lignes triées (croissant, stable, NA en fin) sur column."""
+        with self._lock:
+            if column not in self._orders:
+                col = self.df[column]
+                self._orders[column] = np.asarray(
+                    col.reset_index(drop=True).sort_values(kind="stable", na_position="last").index
+                )
+            return self._orders[column]
+
+    def query(
+        self,
+        search: str = "",
+        filters: dict[str, list] | None = None,
+        sort_by: str | None = None,
+        ascending: bool = True,
+    ) -> np.ndarray:
+        """Positions des lignes retenues (filtres ET recherche), dans l'ordre demandé."""
+        mask = np.ones(len(self.df), dtype=bool)
+        for col, selected in (filters or {}).items():
+            if selected and col in self.codes:
+                wanted = [self.values[col].index(v) for v in selected if v in self.values[col]]
+                mask &= np.isin(self.codes[col], wanted)
+        search = search.strip().lower()
+        if search:
+            mask &= self.search_text.str.contains(search, regex=False).to_numpy(dtype=bool)
+
+        if sort_by is None:
+            return np.flatnonzero(mask)
+        order = self.sort_order(sort_by)
+        if not ascending:
+            # Ordre décroissant, NA toujours en fin
+            n_na = int(self.df[sort_by].isna().sum())
+            order = np.concatenate([order[:len(order) - n_na][::-1], order[len(order) - n_na:]])
+        return order[mask[order]]
+
+    def page(self, positions: np.ndarray, page: int, page_size: int) -> pd.DataFrame:
+        """Lignes de la page (numérotée à partir de 1) parmi positions."""
+        start = (page - 1) * page_size
+        return self.df.iloc[positions[start:start + page_size]]
+
+
+def page_count(n_rows: int, page_size: int) -> int:
+    return max(1, -(-n_rows // page_size))
+
+
+# --------------------------------------------------
+# 2) Export CSV par blocs
+# --------------------------------------------------
+def csv_chunks(
+    df: pd.DataFrame,
+    positions: np.ndarray | None = None,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+    encoding: str = "utf-8",
+) -> Iterator[bytes]:
+    """
+    CSV (en-tête compris) des lignes positions de df, produit par blocs de
+    chunk_rows lignes encodés au fil de l'eau.
+    """
+    if positions is None:
+        positions = np.arange(len(df))
+    yield df.iloc[:0].to_csv(index=False).encode(encoding)
+    for start in range(0, len(positions), chunk_rows):
+        block = df.iloc[positions[start:start + chunk_rows]]
+        yield block.to_csv(index=False, header=False).encode(encoding)
+
+
+def csv_bytes(df: pd.DataFrame, positions: np.ndarray | None = None, chunk_rows: int = CSV_CHUNK_ROWS) -> bytes:
+    """CSV complet assemblé à partir de csv_chunks (un seul tampon)."""
+    buffer = io.BytesIO()
+    for chunk in csv_chunks(df, positions, chunk_rows):
+        buffer.write(chunk)
+    return buffer.getvalue()
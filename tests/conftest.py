@@ -0,0 +1,9 @@
+# conftest.py
+#
+# Les modules de l'application sont à la racine du dépôt (pas de paquet) :
+# elle est ajoutée au chemin d'import des tests.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
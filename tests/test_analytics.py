@@ -0,0 +1,155 @@
+# test_analytics.py
+#
+# Calculs vectorisés d'analytics.py comparés à un calcul direct en pandas.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from data_loader import EncodedExport
+
+RESULT_COLUMNS = ["Oxacilline", "Vancomycine"]
+
+
+def random_export(n: int, seed: int) -> tuple[pd.DataFrame, np.ndarray]:
+    """Export brut aléatoire (semaines, services, phénotypes, résultats) et codes patients."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "semaine": rng.integers(1, 12, n).astype(str),
+        "uf": rng.choice(["U1", "U2", "U3"], n),
+        "Phenotype": rng.choice(["MRSA", "Wild", "Other"], n),
+        "Oxacilline": rng.choice(["S", "R", None], n),
+        "Vancomycine": rng.choice(["S", "I", "R"], n),
+    })
+    df.loc[rng.random(n) < 0.05, "semaine"] = ""  # semaines absentes (-1)
+    patients = rng.integers(-1, n // 4, n).astype(np.int32)  # -1 : patient non renseigné
+    return df, patients
+
+
+# --------------------------------------------------
+# 1) Dédoublonnage : premier isolat par patient
+# --------------------------------------------------
+def naive_first_isolates(patients, weeks, mode: str, phenotypes=None) -> np.ndarray:
+    """Même sélection que first_isolate_mask, par groupby sur les isolats triés par (semaine, rang)."""
+    df = pd.DataFrame({"patient": patients, "week": weeks, "rank": np.arange(len(patients))})
+    if phenotypes is not None:
+        df["phenotype"] = phenotypes
+    df = df.sort_values(["week", "rank"], kind="stable")
+    known = df[df["patient"] >= 0]
+    if mode == "patient_semaine":
+        kept = known.groupby(["patient", "week"]).head(1).index
+    elif mode == "patient":
+        kept = known.groupby("patient").head(1).index
+    else:  # phenotype : premier isolat du patient, puis chaque changement de phénotype
+        previous = known.groupby("patient")["phenotype"].shift()
+        kept = known.index[previous.isna() | (previous != known["phenotype"])]
+    keep = np.zeros(len(patients), dtype=bool)
+    keep[kept] = True
+    keep[np.asarray(patients) < 0] = True
+    return keep
+
+
+@pytest.mark.parametrize("mode", ["patient_semaine", "patient", "phenotype"])
+@pytest.mark.parametrize("seed", range(5))
+def test_first_isolate_mask_matches_groupby(mode, seed):
+    rng = np.random.default_rng(seed)
+    n = 500
+    patients = rng.integers(-1, 60, n)
+    weeks = rng.integers(-1, 10, n)
+    phenotypes = rng.integers(0, 3, n)
+    expected = naive_first_isolates(patients, weeks, mode, phenotypes)
+    assert np.array_equal(analytics.first_isolate_mask(patients, weeks, mode, phenotypes), expected)
+
+
+def test_first_isolate_mask_ranks_break_ties():
+    # deux isolats du patient 7 la même semaine : le rang dans l'export
+    # départage, pas la position dans les tableaux
+    patients = np.array([7, 7, 3])
+    weeks = np.array([5, 5, 5])
+    ranks = np.array([10, 2, 0])
+    keep = analytics.first_isolate_mask(patients, weeks, "patient_semaine", ranks=ranks)
+    assert keep.tolist() == [False, True, True]
+
+
+def test_first_isolate_mask_modes():
+    patients = np.array([1, 1, -1, -1])
+    weeks = np.array([1, 1, 1, 1])
+    assert analytics.first_isolate_mask(patients, weeks, "tous").all()
+    assert analytics.first_isolate_mask(patients, weeks, "patient").tolist() == [True, False, True, True]
+    with pytest.raises(ValueError):
+        analytics.first_isolate_mask(patients, weeks, "inconnu")
+    with pytest.raises(ValueError):
+        analytics.first_isolate_mask(patients, weeks, "phenotype")
+
+
+@pytest.mark.parametrize("mode", ["patient_semaine", "patient", "phenotype"])
+@pytest.mark.parametrize("sort", [False, True])
+def test_deduplicate_keeps_first_isolates(mode, sort):
+    df, patients = random_export(400, seed=3)
+    weeks = pd.to_numeric(df["semaine"], errors="coerce").fillna(-1).to_numpy()
+    expected = np.flatnonzero(naive_first_isolates(patients, weeks, mode, df["Phenotype"].to_numpy()))
+
+    export = EncodedExport.from_frame(df, RESULT_COLUMNS, "Phenotype")
+    if sort:
+        export = export.sorted_by_week_service()
+        kept = analytics.deduplicate(export, patients, mode)
+        assert np.array_equal(np.sort(kept.rows), expected)
+    else:
+        kept = analytics.deduplicate(export, patients, mode)
+        assert np.array_equal(kept.weeks, export.weeks[expected])
+        assert np.array_equal(kept.codes, export.codes[expected])
+
+
+def test_deduplicate_without_patients_is_identity():
+    df, _ = random_export(50, seed=1)
+    export = EncodedExport.from_frame(df, RESULT_COLUMNS, "Phenotype")
+    assert analytics.deduplicate(export, None, "patient") is export
+
+
+# --------------------------------------------------
+# 2) Mise à jour incrémentale : état hebdomadaire et séries par service
+# --------------------------------------------------
+def split_export(seed: int) -> tuple[EncodedExport, EncodedExport]:
+    """Historique et lot : le lot ajoute des semaines, un service et un phénotype."""
+    history, _ = random_export(300, seed)
+    batch, _ = random_export(60, seed + 50)
+    batch["semaine"] = (pd.to_numeric(batch["semaine"], errors="coerce") + 6).astype("Int64").astype(str)
+    batch.loc[:9, "uf"] = "U9"
+    batch.loc[:4, "Phenotype"] = "VRSA"
+    return (EncodedExport.from_frame(history, RESULT_COLUMNS, "Phenotype"),
+            EncodedExport.from_frame(batch, RESULT_COLUMNS, "Phenotype"))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_merge_weekly_state_matches_full_state(seed):
+    history, batch = split_export(seed)
+    merged = analytics.merge_weekly_state(analytics.weekly_state(history), analytics.weekly_state(batch))
+    full = analytics.weekly_state(EncodedExport.concat([history, batch]))
+    assert np.array_equal(merged["weeks"], full["weeks"])
+    assert np.array_equal(merged["results"], full["results"])
+    # phénotypes : mêmes comptages, colonnes dans l'ordre d'apparition
+    assert sorted(merged["phenotype_labels"]) == sorted(full["phenotype_labels"])
+    columns = [list(merged["phenotype_labels"]).index(p) for p in full["phenotype_labels"]]
+    assert np.array_equal(merged["phenotypes"][:, columns], full["phenotypes"])
+
+
+def test_merge_weekly_state_rejects_other_columns():
+    history, batch = split_export(0)
+    state = analytics.weekly_state(batch)
+    state["result_columns"] = state["result_columns"][::-1]
+    with pytest.raises(ValueError):
+        analytics.merge_weekly_state(analytics.weekly_state(history), state)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_service_cube_merge_matches_full_cube(seed):
+    history, batch = split_export(seed)
+    merged = analytics.ServiceCube.from_export(history).merge(analytics.ServiceCube.from_export(batch))
+    full = analytics.ServiceCube.from_export(EncodedExport.concat([history, batch]))
+    assert np.array_equal(merged.weeks, full.weeks)
+    assert merged.labels == full.labels
+    columns = [merged.services.index(service) for service in full.services]
+    assert sorted(merged.services) == sorted(full.services)
+    assert np.array_equal(merged.resistant[:, columns], full.resistant)
+    assert np.array_equal(merged.tested[:, columns], full.tested)
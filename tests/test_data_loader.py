@@ -0,0 +1,139 @@
+# test_data_loader.py
+#
+# Lecture et encodage de data_loader.py : semaines des exports de sites,
+# insertion d'un lot dans le modèle encodé trié.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+
+REFERENCE_COLUMNS = ["id_demand", "uf", "num_specimen", "semaine", "Oxacilline"]
+RESULT_COLUMNS = ["Oxacilline"]
+
+
+# --------------------------------------------------
+# 1) Semaines des exports de sites
+# --------------------------------------------------
+@pytest.mark.parametrize("text, week", [
+    ("12", 12), ("12.0", 12), ("S12", 12), ("s 12", 12), ("W7", 7), ("Semaine 3", 3),
+    ("104", 104),  # historique de plusieurs années (banc d'essai)
+])
+def test_parse_week_plain_numbers(text, week):
+    assert data_loader.parse_week(text) == (week, None)
+    assert data_loader.parse_week(text, 2024) == (week, None)
+
+
+@pytest.mark.parametrize("text, week", [
+    ("2024-W05", 5), ("2024-05", 5), ("2024 W5", 5), ("202405", 5),
+    ("S5/2024", 5), ("5/2024", 5), ("S05-2024", 5),
+    ("2024-W52", 52),
+    ("2025-W01", 53),  # 2024 compte 52 semaines ISO
+    ("2026-W01", 105),
+    ("2020-W53", 53),  # 2020 compte 53 semaines ISO
+])
+def test_parse_week_year_qualified(text, week):
+    reference = 2020 if text.startswith("2020") else 2024
+    assert data_loader.parse_week(text, reference) == (week, None)
+
+
+def test_parse_week_keeps_the_year():
+    # la semaine 12 de deux années ne se confond pas
+    assert data_loader.parse_week("2024-W12", 2024) != data_loader.parse_week("2025-W12", 2024)
+
+
+@pytest.mark.parametrize("text, reference, reason", [
+    ("2024-W05", None, "semaine datée sans année de référence (--year)"),
+    ("2023-W52", 2024, "semaine antérieure à 2024"),
+    ("2024-W53", 2024, "semaine hors de 1-53 pour 2024"),
+    ("2024-W00", 2024, "semaine hors de 1-53 pour 2024"),
+    ("0", 2024, "semaine invalide"),
+    ("", 2024, "semaine illisible"),
+    ("abc", 2024, "semaine illisible"),
+    ("12a", 2024, "semaine illisible"),
+    ("-3", 2024, "semaine illisible"),
+    ("1234", 2024, "semaine illisible"),
+])
+def test_parse_week_rejects(text, reference, reason):
+    assert data_loader.parse_week(text, reference) == (None, reason)
+
+
+def site_frame(weeks: list[str]) -> pd.DataFrame:
+    n = len(weeks)
+    return pd.DataFrame({
+        "Id Demande": [f"D{i}" for i in range(n)],
+        "Service": ["U1"] * n,
+        "Specimen": [f"S{i}" for i in range(n)],
+        "Week": weeks,
+        "Oxacilline": ["Résistant"] * n,
+    })
+
+
+def test_normalize_site_export_weeks():
+    raw = site_frame(["2024-W10", "S11/2024", "12", "2023-W52", "n/a"])
+    rows, rejects, _ = data_loader.normalize_site_export(raw, "nord", REFERENCE_COLUMNS, RESULT_COLUMNS, 2024)
+    assert rows["semaine"].tolist() == [10, 11, 12]
+    assert rows["id_demand"].tolist() == ["D0", "D1", "D2"]
+    assert (rows["site"] == "nord").all()
+    assert rows["Oxacilline"].tolist() == ["R", "R", "R"]
+    assert rejects[data_loader.REJECT_COLUMN].tolist() == ["semaine antérieure à 2024", "semaine illisible"]
+
+
+def test_normalize_site_export_rejects_dated_weeks_without_year():
+    raw = site_frame(["2024-W10", "10"])
+    rows, rejects, _ = data_loader.normalize_site_export(raw, "sud", REFERENCE_COLUMNS, RESULT_COLUMNS)
+    assert rows["semaine"].tolist() == [10]
+    assert rejects["Week"].tolist() == ["2024-W10"]
+    assert rejects[data_loader.REJECT_COLUMN].tolist() == ["semaine datée sans année de référence (--year)"]
+
+
+# --------------------------------------------------
+# 2) Modèle encodé trié : insertion d'un lot
+# --------------------------------------------------
+def encoded_frame(n: int, seed: int, weeks: tuple[int, int], services: list[str],
+                  phenotypes: list[str]) -> data_loader.EncodedExport:
+    """Modèle encodé (non trié) d'un export aléatoire."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "semaine": rng.integers(*weeks, n).astype(float),
+        "uf": rng.choice(services, n),
+        "Phenotype": rng.choice(phenotypes, n),
+        "Oxacilline": rng.choice(["S", "R", None], n),
+        "Vancomycine": rng.choice(["S", "I", "R"], n),
+    })
+    df.loc[rng.random(n) < 0.05, "semaine"] = np.nan  # semaines absentes
+    df.loc[rng.random(n) < 0.05, "uf"] = None  # services absents
+    return data_loader.EncodedExport.from_frame(df, ["Oxacilline", "Vancomycine"], "Phenotype")
+
+
+def assert_same_export(actual: data_loader.EncodedExport, expected: data_loader.EncodedExport):
+    assert actual.uf_labels == expected.uf_labels
+    assert actual.phenotype_labels == expected.phenotype_labels
+    for name in ("weeks", "uf_codes", "codes", "phenotypes", "r_bits", "rows", "week_offsets"):
+        assert np.array_equal(getattr(actual, name), getattr(expected, name)), name
+    assert actual.first_week == expected.first_week
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_extend_sorted_matches_full_sort(seed):
+    history = encoded_frame(300, seed, (3, 15), ["U1", "U2", "U3"], ["MRSA", "Wild"])
+    # le lot touche des semaines anciennes et nouvelles, avec un service et un phénotype inédits
+    batch = encoded_frame(40, seed + 100, (1, 20), ["U3", "U9", "U1"], ["Other", "MRSA"])
+    expected = data_loader.EncodedExport.concat([history, batch]).sorted_by_week_service()
+
+    extended = history.sorted_by_week_service().extend_sorted(batch, len(history))
+    assert_same_export(extended, expected)
+    # un second lot sur le modèle déjà étendu
+    again = encoded_frame(25, seed + 200, (18, 25), ["U4"], ["Wild"])
+    expected = data_loader.EncodedExport.concat([history, batch, again]).sorted_by_week_service()
+    assert_same_export(extended.extend_sorted(again, len(history) + len(batch)), expected)
+
+
+def test_extend_sorted_slices():
+    history = encoded_frame(200, 7, (1, 10), ["U1", "U2"], ["MRSA", "Wild"])
+    batch = encoded_frame(30, 8, (5, 12), ["U2", "U5"], ["Wild"])
+    extended = history.sorted_by_week_service().extend_sorted(batch, len(history))
+    rows = extended.week_service_slice(6, "U2")
+    expected = (extended.weeks == 6) & (extended.uf_codes == extended.uf_code("U2"))
+    assert np.flatnonzero(expected).tolist() == list(range(rows.start, rows.stop))
@@ -0,0 +1,48 @@
+# test_ingest.py
+#
+# Ajout d'un lot : les instantanés déduits de la génération précédente
+# sont ceux d'une reconstruction complète.
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_loader
+import ingest
+
+EXPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "data", data_loader.EXPORT_FILENAME)
+
+
+def test_append_extends_snapshots_like_a_rebuild(tmp_path):
+    rows = pd.read_csv(EXPORT, dtype=str, keep_default_na=False)
+    source, store = str(tmp_path / "export.csv"), str(tmp_path / "store")
+    rows.iloc[:5000].to_csv(source, index=False)
+    rows.iloc[5000:].to_csv(tmp_path / "lot.csv", index=False)
+    ingest.ensure_store(source, store)
+    ingest.ensure_snapshots(source, store)
+
+    manifest, new_rows, state, _ = ingest.append_batch(source, data_loader.read_export(str(tmp_path / "lot.csv")),
+                                                       store)
+    assert len(new_rows) > 0
+    for name in (data_loader.ENCODED_SNAPSHOT, ingest.SERVICE_CUBE_SNAPSHOT):  # écrits par l'ajout
+        assert os.path.isdir(data_loader.snapshot_path(source, name, manifest["generation"], store))
+    extended = data_loader.load_encoded_export(source, store)
+    cube = ingest.load_service_cube(source, store)
+
+    # reconstruction depuis le magasin, sans les instantanés
+    shutil.rmtree(data_loader.snapshot_path(source, data_loader.ENCODED_SNAPSHOT, manifest["generation"], store))
+    shutil.rmtree(data_loader.snapshot_path(source, ingest.SERVICE_CUBE_SNAPSHOT, manifest["generation"], store))
+    rebuilt = data_loader.load_encoded_export(source, store)
+    assert extended.uf_labels == rebuilt.uf_labels
+    for name in ("weeks", "uf_codes", "codes", "r_bits", "rows", "week_offsets"):
+        assert np.array_equal(getattr(extended, name), getattr(rebuilt, name)), name
+
+    full = analytics.ServiceCube.from_export(rebuilt)
+    assert cube.services == full.services
+    assert np.array_equal(cube.resistant, full.resistant) and np.array_equal(cube.tested, full.tested)
+    full_state = analytics.weekly_state(rebuilt)
+    assert np.array_equal(state["results"], full_state["results"])